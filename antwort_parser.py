@@ -0,0 +1,270 @@
+# antwort_parser.py
+# Robustes Einlesen der JSON-Antworten des Tutors
+
+"""
+Das Modell soll im JSON-Format antworten, hält sich aber nicht immer daran:
+Code-Zäune, Prosa vor oder nach dem Objekt, fehlende Felder, "true" als
+String. Statt bei jedem Ausreißer einen 500er zu werfen (und die bezahlte
+Antwort wegzuwerfen), wird hier:
+
+1. das erste vollständige JSON-Objekt aus dem Text geschnitten,
+2. bei Bedarf einmal günstig lokal repariert (keine Neugenerierung),
+3. gegen das Schema des Tutors geprüft und normalisiert.
+
+Außerdem liegt hier der NachrichtExtraktor, der "nachricht" schon aus einem
+unvollständig gestreamten Objekt herausliest.
+"""
+
+import json
+import re
+
+
+class AntwortUngueltig(ValueError):
+    """Die Modell-Antwort ließ sich auch nach der Reparatur nicht verwenden."""
+
+
+# Felder der Tutor-Antwort mit Standardwerten (siehe TUTOR_SYSTEM_PROMPT)
+SCHEMA_STANDARD = {
+    "hilfe_stufe": 1,
+    "zeige_bild": False,
+    "bild_thema": None,
+    "konzept_verstanden": False,
+    "gebe_quellen": False,
+    "frustration_erkannt": False
+}
+
+WAHR = {'true', 'ja', 'yes', '1'}
+FALSCH = {'false', 'nein', 'no', '0', '', 'null', 'none'}
+
+
+def _objekt_ausschneiden(text):
+    """Gibt das erste ausbalancierte {...} zurück (Strings werden beachtet) oder den Rest ab '{'."""
+    start = text.find('{')
+    if start == -1:
+        return None
+    tiefe = 0
+    im_string = False
+    escape = False
+    for i in range(start, len(text)):
+        zeichen = text[i]
+        if im_string:
+            if escape:
+                escape = False
+            elif zeichen == '\\':
+                escape = True
+            elif zeichen == '"':
+                im_string = False
+        elif zeichen == '"':
+            im_string = True
+        elif zeichen == '{':
+            tiefe += 1
+        elif zeichen == '}':
+            tiefe -= 1
+            if tiefe == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def _reparieren(text):
+    """Ein einziger, billiger Reparaturversuch für typische Fehler."""
+    text = re.sub(r',\s*([}\]])', r'\1', text)               # Komma vor schließender Klammer
+    text = re.sub(r'\bTrue\b', 'true', text)                  # Python-Literale
+    text = re.sub(r'\bFalse\b', 'false', text)
+    text = re.sub(r'\bNone\b', 'null', text)
+    text = text.replace('“', '"').replace('”', '"')  # typografische Anführungszeichen
+    text = re.sub(r'(?<!\\)((?:\\\\)*)\\u(?![0-9a-fA-F]{4})', r'\1\\\\u', text)  # kaputtes \u-Escape wörtlich
+    # Abgeschnittene Antwort (max_tokens): offene Strings und Klammern schließen
+    im_string = False
+    escape = False
+    tiefe = 0
+    for zeichen in text:
+        if im_string:
+            if escape:
+                escape = False
+            elif zeichen == '\\':
+                escape = True
+            elif zeichen == '"':
+                im_string = False
+        elif zeichen == '"':
+            im_string = True
+        elif zeichen == '{':
+            tiefe += 1
+        elif zeichen == '}':
+            tiefe -= 1
+    if im_string:
+        text += '"'
+    return text + '}' * max(0, tiefe)
+
+
+def _als_bool(wert):
+    if isinstance(wert, bool):
+        return wert
+    if isinstance(wert, (int, float)):
+        return wert != 0
+    if isinstance(wert, str):
+        wert = wert.strip().lower()
+        if wert in WAHR:
+            return True
+        if wert in FALSCH:
+            return False
+    raise AntwortUngueltig(f'Kein Wahrheitswert: {wert!r}')
+
+
+def validieren(daten):
+    """Prüft und normalisiert die Felder einer Tutor-Antwort."""
+    if not isinstance(daten, dict):
+        raise AntwortUngueltig('Antwort ist kein JSON-Objekt')
+    nachricht = daten.get('nachricht')
+    if not isinstance(nachricht, str) or not nachricht.strip():
+        raise AntwortUngueltig('Feld "nachricht" fehlt oder ist leer')
+
+    antwort = dict(SCHEMA_STANDARD)
+    antwort.update(daten)
+    # Einzelne Surrogate (\ud83d ohne zweite Hälfte) ließen sich nicht als UTF-8 senden
+    antwort['nachricht'] = re.sub('[\ud800-\udfff]', '\ufffd', nachricht.strip())
+
+    try:
+        stufe = int(antwort['hilfe_stufe'] or 1)
+    except (TypeError, ValueError):
+        stufe = 1
+    antwort['hilfe_stufe'] = min(4, max(1, stufe))
+
+    for feld in ('zeige_bild', 'konzept_verstanden', 'gebe_quellen', 'frustration_erkannt'):
+        try:
+            antwort[feld] = _als_bool(antwort[feld])
+        except AntwortUngueltig:
+            antwort[feld] = SCHEMA_STANDARD[feld]
+
+    bild_thema = antwort['bild_thema']
+    if isinstance(bild_thema, str) and bild_thema.strip().lower() not in FALSCH:
+        antwort['bild_thema'] = bild_thema.strip().strip('[]')
+    else:
+        antwort['bild_thema'] = None
+    if antwort['bild_thema'] is None:
+        antwort['zeige_bild'] = False
+
+    return antwort
+
+
+def parse_antwort(text):
+    """
+    Liest eine Tutor-Antwort aus dem Modell-Text.
+
+    Args:
+        text (str): Rohtext der Completion
+
+    Returns:
+        dict: Validierte Antwort mit allen Schema-Feldern
+
+    Raises:
+        AntwortUngueltig: Wenn weder JSON noch verwertbare Prosa vorliegt
+    """
+    text = (text or '').strip()
+    if not text:
+        raise AntwortUngueltig('Leere Antwort')
+
+    objekt = _objekt_ausschneiden(text)
+    if objekt is not None:
+        try:
+            return validieren(json.loads(objekt))
+        except ValueError:
+            pass
+        try:
+            return validieren(json.loads(_reparieren(objekt)))
+        except ValueError:
+            pass
+
+    # Keine JSON-Struktur: reine Prosa ist immer noch eine brauchbare Nachricht
+    if objekt is None:
+        prosa = text.replace('```json', '').replace('```', '').strip()
+        if prosa:
+            return validieren({'nachricht': prosa})
+    raise AntwortUngueltig('JSON-Antwort nicht lesbar')
+
+
+NACHRICHT_START = re.compile(r'["\']nachricht["\']\s*:\s*"')
+
+ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+HEX4 = re.compile(r'[0-9a-fA-F]{4}')
+
+
+def _hex4(text):
+    """Wert von vier Hex-Ziffern, None bei allem anderen (auch "+1f", "0x1f")"""
+    return int(text, 16) if HEX4.fullmatch(text) else None
+
+
+class NachrichtExtraktor:
+    """Liest den String-Wert von "nachricht" aus einem JSON-Text, der stückweise ankommt."""
+
+    def __init__(self):
+        self.puffer = ''
+        self.position = None  # Index hinter dem öffnenden Anführungszeichen
+        self.fertig = False
+
+    def fuettern(self, stueck):
+        """
+        Nimmt das nächste Textstück entgegen.
+
+        Returns:
+            str: Neu dekodierter Text der Nachricht (evtl. leer)
+        """
+        self.puffer += stueck
+        if self.fertig:
+            return ''
+
+        if self.position is None:
+            treffer = NACHRICHT_START.search(self.puffer)
+            if not treffer:
+                return ''
+            self.position = treffer.end()
+
+        neu = []
+        i = self.position
+        while i < len(self.puffer):
+            zeichen = self.puffer[i]
+            if zeichen == '"':
+                self.fertig = True
+                i += 1
+                break
+            if zeichen == '\\':
+                if i + 1 >= len(self.puffer):
+                    break  # Escape noch unvollständig
+                folge = self.puffer[i + 1]
+                if folge == 'u':
+                    if i + 6 > len(self.puffer):
+                        break
+                    code = _hex4(self.puffer[i + 2:i + 6])
+                    if code is None or 0xDC00 <= code < 0xE000:
+                        # Kaputtes Escape (z.B. \u00zz) roh weitergeben; die fertige Antwort
+                        # prüft antwort_lesen mit Reparatur und Prosa-Ersatz
+                        neu.append(self.puffer[i:i + 2])
+                        i += 2
+                        continue
+                    if 0xD800 <= code < 0xDC00:
+                        # Surrogat-Paar (z.B. Emoji) braucht das zweite \uXXXX
+                        zweites = self.puffer[i + 6:i + 12]
+                        if len(zweites) < 6 and '\\u'.startswith(zweites[:2]):
+                            break
+                        zweiter = _hex4(zweites[2:]) if zweites.startswith('\\u') else None
+                        if zweiter is None or not 0xDC00 <= zweiter < 0xE000:
+                            neu.append(self.puffer[i:i + 6])
+                            i += 6
+                            continue
+                        code = 0x10000 + ((code - 0xD800) << 10) + (zweiter - 0xDC00)
+                        i += 6
+                    neu.append(chr(code))
+                    i += 6
+                else:
+                    neu.append(ESCAPES.get(folge, folge))
+                    i += 2
+                continue
+            neu.append(zeichen)
+            i += 1
+
+        self.position = i
+        return ''.join(neu)
+
+    @property
+    def text(self):
+        """Gesamter bisher empfangener Rohtext."""
+        return self.puffer
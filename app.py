@@ -1,72 +1,91 @@
-from flask import Flask, render_template, request, jsonify, session
-import openai
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context, has_request_context, send_file
+import functools
+import hmac
+import mimetypes
 import os
+import re
 import secrets
-import json
-from image_resources import finde_passendes_bild, BILDER
+import threading
+import time
+from image_resources import finde_passendes_bild, bild_eintrag, bilder_setzen, vorab_bilder, BUILD_VERZEICHNIS
+from session_store import erstelle_store, ServerSessionInterface, SitzungBelegt
+from streaming import sse_ereignis
+from kanal import (
+    Sock, Verbindungen, nachricht, nachricht_lesen, gleiche_herkunft, zug_ausliefern,
+    KANAL_AKTIV, KANAL_LEERLAUF, SERVER_OPTIONEN, ERSETZT, ZU_LANGSAM
+)
+from antwort_parser import parse_antwort, AntwortUngueltig, NachrichtExtraktor
+from intro_cache import IntroCache, prompt_version
+from lehrplan import LehrplanQuelle, LEHRPLAN_DATEI
+from semantik_cache import SemantikCache, versuchs_stufe, normalisieren
+from vorauslader import Vorauslader, ist_zustimmung
+from schnellpfad import erstelle_schnellpfad
+from fortschritt import erstelle_fortschritt_store, lernender_id
+from frontend import (
+    Startseite, assets_bauen, kodierung_waehlen, komprimieren, vorkomprimierte_datei,
+    KOMPRIMIERBAR, KOMPRIMIERUNG_MIN_BYTES
+)
+from kontext_fenster import KontextFenster
+from llm_client import erstelle_llm_client, LLMNichtVerfuegbar, FALLBACK_ANTWORT
+from scheduler import PRIORITAET_START, PRIORITAET_CHAT, PRIORITAET_HINTERGRUND
+import metriken
+
+
+def signierschluessel():
+    """
+    SECRET_KEY aus der Umgebung, sonst ein zufälliger Schlüssel in einer Datei.
+
+    Alle Worker-Prozesse (auch nach einem Neustart) lesen dieselbe Datei und
+    können so die Session-Cookies der anderen prüfen.
+    """
+    if os.environ.get('SECRET_KEY'):
+        return os.environ['SECRET_KEY']
+    pfad = os.environ.get('SECRET_KEY_DATEI', '.secret_key')
+    if not os.path.exists(pfad):
+        tmp = f"{pfad}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(secrets.token_hex(32))
+        os.chmod(tmp, 0o600)
+        try:
+            # Atomar und ohne Überschreiben: bei gleichzeitigem Start gewinnt ein Worker
+            os.link(tmp, pfad)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
+    with open(pfad) as f:
+        return f.read().strip()
+
 
 app = Flask(__name__)
-app.secret_key = os.environ.get('SECRET_KEY', secrets.token_hex(16))
-
-# OpenAI API Key
-openai.api_key = os.environ.get('OPENAI_API_KEY')
-
-# Themen-Definitionen
-THEMEN = {
-    '1_grundlagen': {
-        'name': 'DNA-Grundlagen',
-        'beschreibung': 'Aufbau und Struktur der DNA',
-        'konzepte': [
-            'Nukleotide als Bausteine',
-            'Die vier Basen (A, T, G, C)',
-            'Basenpaarungsregeln',
-            'Doppelhelix-Struktur'
-        ],
-        'quellen': [
-            'https://www.biologie-schule.de/dna.php',
-            'https://www.lernhelfer.de/schuelerlexikon/biologie/artikel/desoxyribonucleinsaeure-dna'
-        ]
-    },
-    '2_aufbau': {
-        'name': 'Chromosomen und Gene',
-        'beschreibung': 'Von Chromosomen zu Genen',
-        'konzepte': [
-            'Chromosomenstruktur',
-            'Gene als DNA-Abschnitte',
-            'Zellkern und Chromatin'
-        ],
-        'quellen': [
-            'https://www.biologie-schule.de/chromosom.php',
-            'https://www.lernhelfer.de/schuelerlexikon/biologie/artikel/gene-und-chromosomen'
-        ]
-    },
-    '3_replikation': {
-        'name': 'DNA-Replikation',
-        'beschreibung': 'Verdopplung der DNA',
-        'konzepte': [
-            'Semikonservative Replikation',
-            'Enzyme (Helikase, Polymerase)',
-            'Replikationsgabel'
-        ],
-        'quellen': [
-            'https://www.biologie-schule.de/replikation.php',
-            'https://www.lernhelfer.de/schuelerlexikon/biologie/artikel/replikation-der-dna'
-        ]
-    },
-    '4_vererbung': {
-        'name': 'Vererbung und Merkmale',
-        'beschreibung': 'Wie Merkmale vererbt werden',
-        'konzepte': [
-            'Phänotyp und Genotyp',
-            'Allele (dominant, rezessiv)',
-            'Mendelsche Regeln'
-        ],
-        'quellen': [
-            'https://www.biologie-schule.de/mendelsche-regeln.php',
-            'https://www.lernhelfer.de/schuelerlexikon/biologie/artikel/vererbung'
-        ]
-    }
-}
+app.secret_key = signierschluessel()
+
+# Session-Zustand und Gesprächsverlauf liegen serverseitig, im Cookie nur die Session-ID
+session_store = erstelle_store()
+app.session_interface = ServerSessionInterface(session_store)
+
+# Anfragen derselben Session laufen nacheinander; erledigte Antworten bleiben
+# kurz unter der Nachrichten-ID des Browsers stehen (Doppelklick, Retry)
+SITZUNG_SPERRE_WARTEN = float(os.environ.get('SITZUNG_SPERRE_WARTEN', 90))
+IDEMPOTENZ_TTL = float(os.environ.get('IDEMPOTENZ_TTL', 300))
+IDEMPOTENZ_MAX = 5
+
+# Dauerhafter Lernfortschritt (Klassencode + Name), gepuffert geschrieben
+fortschritt = erstelle_fortschritt_store()
+
+# Schnellstart für Hosting, das im Leerlauf herunterfährt: openai wird erst
+# nach dem Start im Hintergrund geladen (samt erster Upstream-Verbindung)
+SCHNELLSTART = os.environ.get('SCHNELLSTART', '0') == '1'
+
+# Zugang zur OpenAI-API (Key, Timeouts, Retries über Umgebungsvariablen)
+llm = erstelle_llm_client()
+if not SCHNELLSTART:
+    # Im gunicorn-Master vor dem fork, die Worker teilen sich die Seiten
+    with metriken.startphase('openai'):
+        llm.vorladen()
+
+# JSON-Modus der API erzwingt ein gültiges JSON-Objekt als Antwort
+JSON_MODUS = {'response_format': {'type': 'json_object'}} if os.environ.get('LLM_JSON_MODUS', '1') != '0' else {}
 
 # Verbesserter System-Prompt mit Frustrationserkennung
 TUTOR_SYSTEM_PROMPT = """Du bist ein geduldiger, einfühlsamer sokratischer Biologie-Tutor für Schüler der Klassen 9-10.
@@ -136,14 +155,205 @@ ANTWORT-FORMAT (JSON):
     "frustration_erkannt": true/false
 }"""
 
+# Intro-Prompts für /start und /thema_wechseln. Statt des Namens steht ein
+# Platzhalter im Prompt, damit die Antworten für alle Schüler wiederverwendbar sind.
+NAME_PLATZHALTER = '{{NAME}}'
+
+INTRO_PROMPTS = {
+    'start': """Thema: {thema}
+Erstes Konzept: {konzept}
+
+Der Schüler heißt {name} und startet gerade.
+Schreibe den Namen genau so ({name}), er wird später ersetzt.
+
+Begrüße ihn kurz und beginne mit einer offenen Frage, um sein VORWISSEN zu erkunden.
+Sei freundlich, motivierend und ermutigend!
+
+Antworte im JSON-Format.""",
+    'wechsel': """Thema: {thema}
+Erstes Konzept: {konzept}
+
+Der Schüler wechselt zu einem neuen Thema.
+
+Begrüße ihn kurz für dieses neue Thema und erkunde sein Vorwissen zum ersten Konzept.
+Sei motivierend!
+
+Antworte im JSON-Format."""
+}
+
+ZUSAMMENFASSUNG_PROMPT = """Du fasst einen Tutor-Dialog mit einem Schüler knapp zusammen (max. 5 Sätze).
+Ergänze die bisherige Zusammenfassung um die neuen Dialog-Runden.
+Behalte: was der Schüler schon weiß, typische Fehler/Missverständnisse, welche Hilfe-Stufen und Bilder schon verwendet wurden.
+Antworte nur mit der neuen Zusammenfassung als Fließtext."""
+
+# Dialog-Prompt pro Chat-Zug; wird beim Laden des Lehrplans pro Konzept
+# vorab gefüllt, nur {versuche} wird pro Anfrage eingesetzt
+DIALOG_PROMPT = """Thema: {thema}
+Aktuelles Konzept: {konzept}
+Anzahl Versuche zu diesem Konzept: {versuche}
+
+Verfügbare Bilder: {bilder}
+
+WICHTIG:
+- Der Schüler hat bereits {versuche} Versuche gemacht
+- Wenn Versuche >= 3: Erkenne FRUSTRATION und gib mehr Hilfe
+- Verwende GESTUFTE HILFE (Stufe 1 → 2 → 3 → 4)
+- NIEMALS die komplette Antwort geben
+
+Führe den Dialog empathisch weiter.
+
+Antworte im JSON-Format."""
+
+# Themen, Konzepte, Quellen und Bilder aus lehrplan.yaml; Änderungen an der
+# Datei werden ohne Neustart übernommen
+with metriken.startphase('lehrplan'):
+    lehrplan_quelle = LehrplanQuelle(
+        LEHRPLAN_DATEI,
+        dialog_vorlage=DIALOG_PROMPT,
+        pruef_intervall=float(os.environ.get('LEHRPLAN_PRUEFINTERVALL', 2))
+    )
+lehrplan_quelle.bei_wechsel(lambda lehrplan: bilder_setzen(lehrplan.bilder()))
+
+INTRO_PROMPT_VERSION = prompt_version(TUTOR_SYSTEM_PROMPT, *INTRO_PROMPTS.values())
+
+INTRO_CACHE_AKTIV = os.environ.get('INTRO_CACHE', '1') != '0'
+intro_cache = IntroCache(
+    pool_groesse=int(os.environ.get('INTRO_CACHE_POOL', 5)),
+    ttl=int(os.environ.get('INTRO_CACHE_TTL', 7 * 24 * 3600)),
+    # Gemeinsam für alle Worker und den Aufwärm-Lauf beim Deploy; leer = nur im Speicher
+    datei=os.environ.get('INTRO_CACHE_DATEI', 'intro_cache.json') or None
+)
+
+# Fast gleiche Schülerfragen zum selben Konzept und zur selben Versuchs-Stufe
+# bekommen die gespeicherte Tutor-Antwort (SEMANTIK_CACHE_AUS: Konzepte mit ';' getrennt)
+SEMANTIK_CACHE_AKTIV = os.environ.get('SEMANTIK_CACHE', '1') != '0'
+semantik_cache = SemantikCache(
+    schwelle=float(os.environ.get('SEMANTIK_CACHE_SCHWELLE', 0.85)),
+    max_eintraege=int(os.environ.get('SEMANTIK_CACHE_MAX', 5000)),
+    ttl=int(os.environ.get('SEMANTIK_CACHE_TTL', 24 * 3600)),
+    gesperrte_konzepte=[k.strip() for k in os.environ.get('SEMANTIK_CACHE_AUS', '').split(';') if k.strip()],
+    kontextabhaengig=ist_zustimmung
+)
+
+# Triviale Züge ("keine Ahnung", "sag's mir", "zeig ein Bild") mit gestufter
+# Vorlagen-Antwort statt Upstream-Aufruf (SCHNELLPFAD=0 schaltet ab)
+with metriken.startphase('schnellpfad'):
+    schnellpfad = erstelle_schnellpfad()
+
+# Nach einem verstandenen Konzept die Eröffnungsfrage zum nächsten Konzept
+# schon im Hintergrund erzeugen (opt-in, mit Token-Budget pro Stunde)
+PREFETCH_AKTIV = os.environ.get('PREFETCH', '0') == '1'
+PREFETCH_WARTEN = float(os.environ.get('PREFETCH_WARTEN', 3))
+vorauslader = Vorauslader(
+    max_parallel=int(os.environ.get('PREFETCH_PARALLEL', 4)),
+    max_offen=int(os.environ.get('PREFETCH_MAX_OFFEN', 50)),
+    budget_tokens_pro_stunde=int(os.environ.get('PREFETCH_BUDGET', 100000))
+)
+
+
+# CSS/JS minifiziert mit Inhalts-Hash in static/build/, die Startseite wird
+# pro Lehrplan-Version nur einmal gerendert
+with metriken.startphase('startseite'):
+    ASSET_URLS = assets_bauen()
+    startseite = Startseite(lambda lehrplan: render_template(
+        'index.html', themen=lehrplan.values(), start_thema=lehrplan.start_thema, assets=ASSET_URLS,
+        websocket=KANAL_AKTIV
+    ))
+    with app.app_context():
+        startseite.fuer(lehrplan_quelle.aktuell())
+# Als Link-Header der Startseite; ein vorgeschaltetes CDN macht daraus 103 Early Hints
+STARTSEITE_LINKS = f"<{ASSET_URLS['css']}>; rel=preload; as=style, <{ASSET_URLS['js']}>; rel=preload; as=script"
+
+# Bilder zum aktuellen und nächsten Konzept gehen als Liste mit jeder Antwort
+# mit, der Browser lädt sie in Ruhezeiten vor (VORAB_BILDER=0 schaltet ab)
+VORAB_BILDER = int(os.environ.get('VORAB_BILDER', 3))
+# Vom Browser gemeldet: angezeigte Bilder und wie viele davon schon vorab geladen waren
+bilder_statistik = {'angezeigt': 0, 'vorab': 0}
+
 
 @app.route('/')
 def index():
-    """Hauptseite"""
-    return render_template('index.html')
+    """Hauptseite (vorab gerendert, mit ETag und 304 bei wiederholtem Besuch)"""
+    seite = startseite.fuer(lehrplan_quelle.aktuell())
+    kodierung = kodierung_waehlen(request.accept_encodings)
+    daten, etag = seite.variante(kodierung)
+    if any(request.if_none_match.contains_weak(e) for e in seite.etags()):
+        response = Response(status=304)
+    else:
+        response = Response(daten, mimetype='text/html')
+        if kodierung:
+            response.headers['Content-Encoding'] = kodierung
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Link'] = STARTSEITE_LINKS
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def sitzung_frisch_laden():
+    """Übernimmt den gespeicherten Stand, den eine vorige Anfrage eben geschrieben haben kann"""
+    if session.new:
+        return
+    frisch = session_store.lade(session.sid)
+    if frisch is not None:
+        session.clear()
+        session.update(frisch)
+
+
+def sitzung_sichern():
+    """Speichert die Session noch unter der Sperre; save_session schreibt danach nicht mehr"""
+    if session.modified:
+        session_store.speichere(session.sid, dict(session))
+        session.modified = False
+
+
+def sitzung_exklusiv(view):
+    """Route nur mit exklusivem Zugriff auf die Session ausführen (409, wenn sie zu lange belegt ist)"""
+    @functools.wraps(view)
+    def mit_sperre(*args, **kwargs):
+        try:
+            with session_store.sperre(session.sid, timeout=SITZUNG_SPERRE_WARTEN):
+                sitzung_frisch_laden()
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    sitzung_sichern()
+        except SitzungBelegt:
+            return jsonify({'success': False, 'error': 'Deine vorige Nachricht wird noch bearbeitet'}), 409
+    return mit_sperre
+
+
+def nachricht_id_lesen(data):
+    """Vom Browser pro Nachricht erzeugte ID; ohne ID gibt es keine Duplikat-Erkennung"""
+    nachricht_id = data.get('nachricht_id')
+    if isinstance(nachricht_id, str) and 0 < len(nachricht_id) <= 64:
+        return nachricht_id
+    return None
+
+
+def erledigte_antwort(nachricht_id):
+    """Antwortdaten zu einer schon bearbeiteten Nachricht, sonst None"""
+    if nachricht_id is None:
+        return None
+    for eintrag_id, zeit, response_data in session.get('erledigt', ()):
+        if eintrag_id == nachricht_id and time.time() - zeit < IDEMPOTENZ_TTL:
+            metriken.cache_erfassen('idempotenz', True)
+            return response_data
+    metriken.cache_erfassen('idempotenz', False)
+    return None
+
+
+def antwort_merken(nachricht_id, response_data):
+    if nachricht_id is None:
+        return
+    grenze = time.time() - IDEMPOTENZ_TTL
+    erledigt = [e for e in session.get('erledigt', ()) if e[1] >= grenze][-(IDEMPOTENZ_MAX - 1):]
+    erledigt.append([nachricht_id, time.time(), response_data])
+    session['erledigt'] = erledigt
 
 
 @app.route('/start', methods=['POST'])
+@sitzung_exklusiv
 def start():
     """Startet eine neue Lernsession"""
     try:
@@ -153,54 +363,59 @@ def start():
         if not name:
             return jsonify({'success': False, 'error': 'Bitte Namen eingeben'}), 400
         
+        klasse = normalisieren(data.get('klasse', ''))
+        lehrplan = lehrplan_quelle.aktuell()
+        thema_id = lehrplan.start_thema
+        konzept_index = 0
+        punkte = 0
+        
+        # Gespeicherten Fortschritt übernehmen (z.B. nach einem Browserwechsel);
+        # nur mit Klassencode, sonst wird auch nichts gespeichert
+        lernender = lernender_id(klasse, name)
+        stand = fortschritt.stand(lernender) if fortschritt and lernender else None
+        if stand and stand['thema'] in lehrplan:
+            thema_id = stand['thema']
+            konzept_index = min(stand['konzept_index'], len(lehrplan[thema_id].konzepte) - 1)
+            punkte = stand['punkte']
+        thema_info = lehrplan[thema_id]
+        
         # Session initialisieren
         session['name'] = name
-        session['punkte'] = 0
-        session['aktuelles_thema'] = '1_grundlagen'
-        session['aktuelles_konzept_index'] = 0
-        session['conversation_history'] = []
+        session['klasse'] = klasse
+        session['lernender'] = lernender
+        session['punkte'] = punkte
+        session['aktuelles_thema'] = thema_id
+        session['aktuelles_konzept_index'] = konzept_index
         session['versuche_aktuelles_konzept'] = 0
+        session.pop('zusammenfassung', None)
+        session_store.verlauf_setzen(session.sid, [])
+        vorauslader.verwerfen(session.sid)
         
-        thema_id = '1_grundlagen'
-        thema_info = THEMEN[thema_id]
-        erstes_konzept = thema_info['konzepte'][0]
+        erstes_konzept = thema_info.konzepte[konzept_index]
         
-        # Erste Tutor-Nachricht
-        start_prompt = f"""Thema: {thema_info['name']}
-Erstes Konzept: {erstes_konzept}
-
-Der Schüler heißt {name} und startet gerade.
-
-Begrüße ihn kurz und beginne mit einer offenen Frage, um sein VORWISSEN zu erkunden.
-Sei freundlich, motivierend und ermutigend!
-
-Antworte im JSON-Format."""
-
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": TUTOR_SYSTEM_PROMPT},
-                {"role": "user", "content": start_prompt}
-            ],
-            max_tokens=300,
-            temperature=0.7
-        )
-        
-        # Parse Response
-        antwort_text = response.choices[0].message.content.strip()
-        antwort_text = antwort_text.replace('```json', '').replace('```', '').strip()
-        antwort = json.loads(antwort_text)
+        if stand and (thema_id != lehrplan.start_thema or konzept_index > 0):
+            # Wiederaufnahme mitten im Lehrplan: feste Begrüßung, kein API-Aufruf
+            antwort = {
+                'nachricht': f"Willkommen zurück, {name}! 👋 Wir machen weiter mit: {erstes_konzept}. "
+                             "Was weißt du darüber schon?"
+            }
+        else:
+            # Erste Tutor-Nachricht (aus dem Intro-Cache, Name wird eingesetzt)
+            antwort = intro_antwort('start', thema_id, name)
+        fortschritt_erfassen('start', erstes_konzept)
         
         # Conversation History speichern
-        session['conversation_history'] = [
+        session_store.verlauf_setzen(session.sid, [
             {"role": "assistant", "content": antwort['nachricht']}
-        ]
+        ])
         
         response_data = {
             'success': True,
-            'thema': thema_info['name'],
+            'thema': thema_info.name,
+            'thema_id': thema_id,
             'nachricht': antwort['nachricht'],
-            'konzept': erstes_konzept
+            'konzept': erstes_konzept,
+            'punkte': punkte
         }
         
         # Bild hinzufügen falls KI es entschieden hat
@@ -208,15 +423,352 @@ Antworte im JSON-Format."""
             bild_info = hole_bild(thema_id, antwort['bild_thema'])
             if bild_info:
                 response_data['bild'] = bild_info
+        vorab_bilder_anhaengen(response_data)
         
-        return jsonify(response_data)
+        with metriken.phase('serialisieren'):
+            return jsonify(response_data)
         
     except Exception as e:
         print(f"Fehler in /start: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def fortschritt_erfassen(art, konzept, versuche=0, verstanden=False):
+    """Übernimmt den Session-Stand in den Fortschrittsspeicher (nur Puffer, kein Plattenzugriff)"""
+    if fortschritt is None or not session.get('lernender'):
+        return
+    fortschritt.schreiben(
+        art,
+        session['lernender'],
+        session.get('klasse', ''),
+        session.get('name', ''),
+        session['aktuelles_thema'],
+        session.get('aktuelles_konzept_index', 0),
+        konzept,
+        session.get('punkte', 0),
+        versuche,
+        verstanden
+    )
+
+
+def tutor_anfrage(messages, max_tokens=500, prioritaet=PRIORITAET_CHAT, session_id=None):
+    """Fragt den Tutor an und parst die JSON-Antwort; bei Ausfall sokratische Ersatz-Antwort"""
+    if session_id is None and has_request_context():
+        session_id = session.sid
+    try:
+        with metriken.phase('upstream'):
+            response = llm.erstelle(
+                messages,
+                max_tokens=max_tokens,
+                temperature=0.7,
+                session_id=session_id,
+                prioritaet=prioritaet,
+                **JSON_MODUS
+            )
+    except LLMNichtVerfuegbar as e:
+        print(f"LLM nicht verfügbar: {str(e)}")
+        return dict(FALLBACK_ANTWORT)
+    
+    metriken.tokens_erfassen(getattr(response, 'usage', None))
+    with metriken.phase('parsen'):
+        return antwort_lesen(response.choices[0].message.content)
+
+
+def antwort_lesen(antwort_text):
+    """Parst die Modell-Antwort; ist sie unbrauchbar, gibt es die Ersatz-Antwort statt eines 500ers"""
+    try:
+        return parse_antwort(antwort_text)
+    except AntwortUngueltig as e:
+        print(f"Unbrauchbare Modell-Antwort: {str(e)}: {antwort_text!r:.200}")
+        return dict(FALLBACK_ANTWORT)
+
+
+def verlauf_zusammenfassen(bisher, nachrichten, session_id=None):
+    """Schreibt die laufende Zusammenfassung um neue (ältere) Nachrichten fort"""
+    dialog = "\n".join(
+        f"{'Schüler' if n['role'] == 'user' else 'Tutor'}: {n['content']}" for n in nachrichten
+    )
+    with metriken.phase('zusammenfassung'):
+        response = llm.erstelle(
+            messages=[
+                {"role": "system", "content": ZUSAMMENFASSUNG_PROMPT},
+                {"role": "user", "content": f"Bisherige Zusammenfassung:\n{bisher or '(keine)'}\n\nNeue Dialog-Runden:\n{dialog}"}
+            ],
+            max_tokens=200,
+            temperature=0.2,
+            session_id=session_id,
+            prioritaet=PRIORITAET_HINTERGRUND
+        )
+    metriken.tokens_erfassen(getattr(response, 'usage', None))
+    return response.choices[0].message.content.strip()
+
+
+kontext_fenster = KontextFenster(
+    budget=int(os.environ.get('KONTEXT_BUDGET', 3000)),
+    letzte_nachrichten=int(os.environ.get('KONTEXT_LETZTE_NACHRICHTEN', 8)),
+    zusammenfasser=verlauf_zusammenfassen
+)
+# Sessions, deren Zusammenfassung gerade im Hintergrund fortgeschrieben wird
+zusammenfassung_laeuft = set()
+zusammenfassung_lock = threading.Lock()
+
+
+def chat_vorbereiten(schueler_nachricht):
+    """Liest den Session-Zustand, erhöht die Versuche und baut die Prompt-Nachrichten"""
+    lehrplan = lehrplan_quelle.aktuell()
+    aktuelles_thema = session.get('aktuelles_thema', lehrplan.start_thema)
+    if aktuelles_thema not in lehrplan:
+        # Thema wurde aus dem Lehrplan entfernt: von vorn im Start-Thema, nicht mitten in einem fremden
+        aktuelles_thema = session['aktuelles_thema'] = lehrplan.start_thema
+        session['aktuelles_konzept_index'] = 0
+        session['versuche_aktuelles_konzept'] = 0
+    thema_info = lehrplan[aktuelles_thema]
+    konzept_index = min(session.get('aktuelles_konzept_index', 0), len(thema_info.konzepte) - 1)
+    aktuelles_konzept = thema_info.konzepte[konzept_index]
+    versuche = session.get('versuche_aktuelles_konzept', 0)
+    
+    # Versuche erhöhen
+    session['versuche_aktuelles_konzept'] = versuche + 1
+    
+    # Conversation History holen
+    with metriken.phase('verlauf_laden'):
+        conversation_history = session_store.verlauf(session.sid)
+    
+    # Schüler-Nachricht hinzufügen
+    schueler_eintrag = {
+        "role": "user",
+        "content": schueler_nachricht
+    }
+    conversation_history.append(schueler_eintrag)
+    
+    # Dialog-Prompt mit Kontext (pro Konzept vorberechnet)
+    dialog_prompt = thema_info.dialog_prompt(konzept_index, versuche + 1)
+    metriken.verlauf_erfassen(len(conversation_history))
+    
+    return {
+        'thema_id': aktuelles_thema,
+        'thema_info': thema_info,
+        'konzept_index': konzept_index,
+        'konzept': aktuelles_konzept,
+        'schueler_eintrag': schueler_eintrag,
+        'conversation_history': conversation_history,
+        'dialog_prompt': dialog_prompt,
+        'cache_partition': (aktuelles_thema, aktuelles_konzept, versuchs_stufe(versuche + 1))
+    }
+
+
+def chat_prompt_bauen(kontext):
+    """Baut die Prompt-Nachrichten - nur nötig, wenn der Semantik-Cache nicht greift"""
+    # Verlauf innerhalb des Token-Budgets: ältere Züge als Zusammenfassung
+    with metriken.phase('prompt'):
+        # Neu gefaltet wird erst nach dem Zug (zusammenfassung_anstossen)
+        messages, _, tokens_gespart = kontext_fenster.baue(
+            TUTOR_SYSTEM_PROMPT,
+            kontext['conversation_history'],
+            kontext['dialog_prompt'],
+            session.get('zusammenfassung'),
+            falten=False
+        )
+    kontext['messages'] = messages
+    kontext['tokens_gespart'] = tokens_gespart
+    return messages
+
+
+def zusammenfassung_anstossen(verlauf):
+    """Schreibt die Zusammenfassung im Hintergrund fort; bis sie fertig ist, gilt die bisherige"""
+    bisher = session.get('zusammenfassung')
+    if not kontext_fenster.faellig(verlauf, bisher):
+        return
+    sid = session.sid
+    with zusammenfassung_lock:
+        if sid in zusammenfassung_laeuft:
+            return
+        zusammenfassung_laeuft.add(sid)
+    vorauslader.nebenbei(zusammenfassung_falten, sid, list(verlauf), bisher)
+
+
+def zusammenfassung_falten(sid, verlauf, bisher):
+    """Hintergrund-Teil von zusammenfassung_anstossen: falten und in die Session schreiben"""
+    try:
+        neu = kontext_fenster.falten(verlauf, bisher, session_id=sid)
+        if neu.get('bis', 0) == (bisher or {}).get('bis', 0):
+            return
+        # Erst nach dem Zug: die Anfrage gibt die Sperre frei, wenn ihre Antwort raus ist
+        with session_store.sperre(sid):
+            daten = session_store.lade(sid)
+            # Inzwischen neu gestartet oder Thema gewechselt: die Zusammenfassung passt nicht mehr
+            if (daten is None or daten.get('zusammenfassung') != bisher
+                    or session_store.verlauf(sid)[:neu['bis']] != verlauf[:neu['bis']]):
+                return
+            daten['zusammenfassung'] = neu
+            session_store.speichere(sid, daten)
+    except Exception as e:
+        print(f"Fehler beim Speichern der Zusammenfassung: {str(e)}")
+    finally:
+        with zusammenfassung_lock:
+            zusammenfassung_laeuft.discard(sid)
+
+
+def semantik_cache_suchen(kontext):
+    """Gespeicherte Antwort auf eine fast gleiche Frage zum selben Konzept, sonst None"""
+    nachricht = kontext['schueler_eintrag']['content']
+    if not SEMANTIK_CACHE_AKTIV or not semantik_cache.aktiv_fuer(kontext['konzept'], nachricht):
+        return None
+    with metriken.phase('semantik_cache'):
+        antwort = semantik_cache.suche(kontext['cache_partition'], nachricht)
+    metriken.cache_erfassen('semantik', antwort is not None)
+    if antwort is not None:
+        antwort['nachricht'] = antwort['nachricht'].replace(NAME_PLATZHALTER, session.get('name', ''))
+    return antwort
+
+
+def schnellpfad_antwort(kontext):
+    """Lokale Vorlagen-Antwort für eindeutig triviale Nachrichten, sonst None"""
+    if schnellpfad is None:
+        return None
+    with metriken.phase('schnellpfad'):
+        antwort = schnellpfad.antwort(
+            kontext['schueler_eintrag']['content'],
+            kontext['thema_id'],
+            kontext['konzept'],
+            session.get('versuche_aktuelles_konzept', 0)
+        )
+    metriken.cache_erfassen('schnellpfad', antwort is not None)
+    return antwort
+
+
+def vorausgeladene_antwort(kontext):
+    """Vorab erzeugte Eröffnungsfrage, falls der Schüler nur "ok, weiter" geschrieben hat"""
+    if not PREFETCH_AKTIV:
+        return None
+    if not ist_zustimmung(kontext['schueler_eintrag']['content']):
+        # Inhaltliche Nachricht: die vorab erzeugte Antwort passt nicht mehr
+        vorauslader.verwerfen(session.sid)
+        return None
+    with metriken.phase('vorausladen'):
+        return vorauslader.abholen(session.sid, (kontext['thema_id'], kontext['konzept']), PREFETCH_WARTEN)
+
+
+def naechstes_konzept_vorausladen(kontext, antwort, neuer_index):
+    """Startet im Hintergrund den ersten Tutor-Zug zum nächsten Konzept"""
+    thema_info = kontext['thema_info']
+    verlauf = kontext['conversation_history'] + [
+        {"role": "assistant", "content": antwort['nachricht']},
+        {"role": "user", "content": "Ok, weiter!"}
+    ]
+    # Ohne neue Zusammenfassung, die entsteht nach dem Zug (zusammenfassung_anstossen)
+    messages, _, _ = kontext_fenster.baue(
+        TUTOR_SYSTEM_PROMPT,
+        verlauf,
+        thema_info.dialog_prompt(neuer_index, 1),
+        session.get('zusammenfassung'),
+        falten=False
+    )
+    sid = session.sid
+    
+    def erzeugen(abgebrochen):
+        if abgebrochen.is_set():
+            return None
+        vorab = tutor_anfrage(messages, max_tokens=500, prioritaet=PRIORITAET_HINTERGRUND, session_id=sid)
+        if vorab.get('fallback') or abgebrochen.is_set():
+            return None
+        # Nach einem "ok" kann das neue Konzept noch nicht verstanden sein
+        vorab['konzept_verstanden'] = False
+        return vorab
+    
+    tokens = sum(kontext_fenster.tokens(n) for n in messages) + 500
+    vorauslader.starten(sid, (thema_info.id, thema_info.konzepte[neuer_index]), erzeugen, tokens)
+
+
+def semantik_cache_ablegen(kontext, antwort, dauer_ms):
+    nachricht = kontext['schueler_eintrag']['content']
+    if not SEMANTIK_CACHE_AKTIV or not semantik_cache.aktiv_fuer(kontext['konzept'], nachricht):
+        return
+    # Andere Schüler bekommen die Antwort mit ihrem eigenen Namen (wie beim Intro-Cache)
+    allgemein = namen_ersetzen(antwort['nachricht'], session.get('name', ''))
+    if allgemein is None:
+        return
+    semantik_cache.ablegen(kontext['cache_partition'], nachricht, dict(antwort, nachricht=allgemein), dauer_ms)
+
+
+def namen_ersetzen(text, name):
+    """Setzt NAME_PLATZHALTER für den Namen ein; None, wenn der Text schon einen Platzhalter enthält"""
+    if NAME_PLATZHALTER in text:
+        return None
+    if not name:
+        return text
+    # Ganze Wörter samt Genitiv ("Annas"), nicht "Jan" in "Januar"
+    return re.sub(rf'(?<!\w){re.escape(name)}(?=s?(?!\w))', NAME_PLATZHALTER, text, flags=re.IGNORECASE)
+
+
+def chat_auswerten(kontext, antwort):
+    """Übernimmt die Tutor-Antwort in Session und Verlauf und baut die Antwortdaten"""
+    aktuelles_thema = kontext['thema_id']
+    thema_info = kontext['thema_info']
+    konzept_index = kontext['konzept_index']
+    versuche = session.get('versuche_aktuelles_konzept', 0)
+    
+    # Schüler-Nachricht und Tutor-Antwort an die History anhängen
+    with metriken.phase('verlauf_schreiben'):
+        session_store.verlauf_anhaengen(session.sid, kontext['schueler_eintrag'])
+        session_store.verlauf_anhaengen(session.sid, {
+            "role": "assistant",
+            "content": antwort['nachricht']
+        })
+    zusammenfassung_anstossen(kontext['conversation_history'] + [
+        {"role": "assistant", "content": antwort['nachricht']}
+    ])
+    
+    # Punkte vergeben (kontinuierlich)
+    session['punkte'] = session.get('punkte', 0) + 2
+    
+    response_data = {
+        'success': True,
+        'nachricht': antwort['nachricht'],
+        'punkte': session['punkte'],
+        'konzept': kontext['konzept']
+    }
+    
+    # Bild hinzufügen falls KI es entschieden hat
+    if antwort.get('zeige_bild') and antwort.get('bild_thema'):
+        bild_info = hole_bild(aktuelles_thema, antwort['bild_thema'])
+        if bild_info:
+            response_data['bild'] = bild_info
+    
+    # Quellen hinzufügen falls KI es entschieden hat
+    if antwort.get('gebe_quellen'):
+        response_data['quellen'] = list(thema_info.quellen)
+        if antwort.get('konzept_verstanden'):
+            response_data['nachricht'] += "\n\n📚 Hier sind passende Quellen zum Vertiefen:\n" + thema_info.quellen_text
+        else:
+            response_data['nachricht'] += "\n\n📚 Hier sind hilfreiche Quellen für später:\n" + thema_info.quellen_text
+    
+    # Wenn Konzept verstanden → nächstes Konzept
+    if antwort.get('konzept_verstanden'):
+        session['versuche_aktuelles_konzept'] = 0  # Reset
+        neuer_index = konzept_index + 1
+        if neuer_index < len(thema_info.konzepte):
+            session['aktuelles_konzept_index'] = neuer_index
+            naechstes_konzept = thema_info.konzepte[neuer_index]
+            response_data['neues_konzept'] = naechstes_konzept
+            if PREFETCH_AKTIV:
+                naechstes_konzept_vorausladen(kontext, antwort, neuer_index)
+            response_data['nachricht'] += f"\n\n✅ Super! Lass uns zum nächsten Thema gehen: {naechstes_konzept}"
+        else:
+            response_data['thema_abgeschlossen'] = True
+            response_data['nachricht'] += "\n\n🎉 Fantastisch! Du hast alle Konzepte dieses Themas verstanden!"
+            # Quellen am Ende
+            if not antwort.get('gebe_quellen'):
+                response_data['nachricht'] += "\n\n📚 Zum Vertiefen:\n" + thema_info.quellen_text
+    
+    fortschritt_erfassen('zug', kontext['konzept'], versuche, bool(antwort.get('konzept_verstanden')))
+    vorab_bilder_anhaengen(response_data)
+    
+    return response_data
+
+
 @app.route('/chat', methods=['POST'])
+@sitzung_exklusiv
 def chat():
     """Führt den Dialog mit dem Schüler"""
     try:
@@ -226,168 +778,228 @@ def chat():
         if not schueler_nachricht:
             return jsonify({'success': False, 'error': 'Bitte Nachricht eingeben'}), 400
         
-        aktuelles_thema = session.get('aktuelles_thema', '1_grundlagen')
-        thema_info = THEMEN[aktuelles_thema]
-        konzept_index = session.get('aktuelles_konzept_index', 0)
-        aktuelles_konzept = thema_info['konzepte'][konzept_index]
-        versuche = session.get('versuche_aktuelles_konzept', 0)
-        
-        # Versuche erhöhen
-        session['versuche_aktuelles_konzept'] = versuche + 1
+        # Doppelt abgeschickt: dieselbe Antwort, kein zweiter Versuch, keine doppelten Punkte
+        nachricht_id = nachricht_id_lesen(data)
+        response_data = erledigte_antwort(nachricht_id)
+        if response_data is not None:
+            return jsonify(response_data)
         
-        # Conversation History holen
-        conversation_history = session.get('conversation_history', [])
-        
-        # Schüler-Nachricht hinzufügen
-        conversation_history.append({
-            "role": "user",
-            "content": schueler_nachricht
-        })
+        kontext = chat_vorbereiten(schueler_nachricht)
+        antwort = vorausgeladene_antwort(kontext)
+        if antwort is None:
+            antwort = semantik_cache_suchen(kontext)
+        if antwort is None:
+            antwort = schnellpfad_antwort(kontext)
+        if antwort is None:
+            start = time.perf_counter()
+            antwort = tutor_anfrage(chat_prompt_bauen(kontext), max_tokens=500)
+            semantik_cache_ablegen(kontext, antwort, (time.perf_counter() - start) * 1000)
         
-        # Verfügbare Bilder für dieses Thema auflisten
-        verfuegbare_bilder = []
-        if aktuelles_thema in BILDER:
-            for bild_id in BILDER[aktuelles_thema].keys():
-                verfuegbare_bilder.append(bild_id)
+        response_data = chat_auswerten(kontext, antwort)
+        antwort_merken(nachricht_id, response_data)
+        with metriken.phase('serialisieren'):
+            return jsonify(response_data)
         
-        # Dialog-Prompt mit Kontext
-        dialog_prompt = f"""Thema: {thema_info['name']}
-Aktuelles Konzept: {aktuelles_konzept}
-Anzahl Versuche zu diesem Konzept: {versuche + 1}
+    except Exception as e:
+        print(f"Fehler in /chat: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-Verfügbare Bilder: {', '.join(verfuegbare_bilder)}
 
-WICHTIG:
-- Der Schüler hat bereits {versuche + 1} Versuche gemacht
-- Wenn Versuche >= 3: Erkenne FRUSTRATION und gib mehr Hilfe
-- Verwende GESTUFTE HILFE (Stufe 1 → 2 → 3 → 4)
-- NIEMALS die komplette Antwort geben
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Wie /chat, streamt die Tutor-Nachricht aber Token für Token per Server-Sent Events"""
+    data = request.json
+    schueler_nachricht = data.get('nachricht', '').strip()
+    
+    if not schueler_nachricht:
+        return jsonify({'success': False, 'error': 'Bitte Nachricht eingeben'}), 400
+    
+    nachricht_id = nachricht_id_lesen(data)
+    
+    def ereignisse():
+        for typ, daten in exklusiver_chat_zug(schueler_nachricht, nachricht_id):
+            yield sse_ereignis(typ, daten)
+    
+    return Response(
+        stream_with_context(ereignisse()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
-Führe den Dialog empathisch weiter.
 
-Antworte im JSON-Format."""
+def exklusiver_chat_zug(schueler_nachricht, nachricht_id):
+    """Ereignisse eines Chat-Zugs unter der Session-Sperre, Fehler als fehler-Ereignis"""
+    # Die Sperre gilt, solange gestreamt wird; die Antwort-Header sind dann
+    # längst raus (bzw. es gibt keine), daher sichert sitzung_sichern die Session selbst
+    try:
+        with session_store.sperre(session.sid, timeout=SITZUNG_SPERRE_WARTEN):
+            sitzung_frisch_laden()
+            try:
+                yield from chat_zug_ereignisse(schueler_nachricht, nachricht_id)
+            finally:
+                sitzung_sichern()
+    except SitzungBelegt:
+        yield 'fehler', {'success': False, 'error': 'Deine vorige Nachricht wird noch bearbeitet'}
+    except Exception as e:
+        print(f"Fehler im Chat-Zug: {str(e)}")
+        yield 'fehler', {'success': False, 'error': str(e)}
 
-        # OpenAI mit vollständiger Conversation History
-        messages = [{"role": "system", "content": TUTOR_SYSTEM_PROMPT}]
-        messages.extend(conversation_history)
-        messages.append({"role": "user", "content": dialog_prompt})
-        
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
+
+def chat_zug_ereignisse(schueler_nachricht, nachricht_id):
+    """(typ, daten) eines Chat-Zugs für /chat/stream und den Kanal; läuft unter der Session-Sperre"""
+    response_data = erledigte_antwort(nachricht_id)
+    if response_data is not None:
+        yield 'token', {'text': response_data['nachricht']}
+        yield 'fertig', response_data
+        return
+    
+    kontext = chat_vorbereiten(schueler_nachricht)
+    antwort = vorausgeladene_antwort(kontext)
+    if antwort is None:
+        antwort = semantik_cache_suchen(kontext)
+    if antwort is None:
+        antwort = schnellpfad_antwort(kontext)
+    if antwort is not None:
+        yield 'token', {'text': antwort['nachricht']}
+        response_data = chat_auswerten(kontext, antwort)
+        antwort_merken(nachricht_id, response_data)
+        yield 'fertig', response_data
+        return
+    
+    start = time.perf_counter()
+    try:
+        stream = llm.erstelle(
+            chat_prompt_bauen(kontext),
             max_tokens=500,
-            temperature=0.7
+            temperature=0.7,
+            session_id=session.sid,
+            stream=True,
+            stream_options={'include_usage': True},
+            **JSON_MODUS
         )
-        
-        # Parse Response
-        antwort_text = response.choices[0].message.content.strip()
-        antwort_text = antwort_text.replace('```json', '').replace('```', '').strip()
-        antwort = json.loads(antwort_text)
-        
-        # Tutor-Antwort zur History hinzufügen
-        conversation_history.append({
-            "role": "assistant",
-            "content": antwort['nachricht']
-        })
-        session['conversation_history'] = conversation_history
-        
-        # Punkte vergeben (kontinuierlich)
-        session['punkte'] = session.get('punkte', 0) + 2
-        
-        response_data = {
-            'success': True,
-            'nachricht': antwort['nachricht'],
-            'punkte': session['punkte'],
-            'konzept': aktuelles_konzept
-        }
-        
-        # Bild hinzufügen falls KI es entschieden hat
-        if antwort.get('zeige_bild') and antwort.get('bild_thema'):
-            bild_info = hole_bild(aktuelles_thema, antwort['bild_thema'])
-            if bild_info:
-                response_data['bild'] = bild_info
-        
-        # Quellen hinzufügen falls KI es entschieden hat
-        if antwort.get('gebe_quellen'):
-            response_data['quellen'] = thema_info.get('quellen', [])
-            if antwort.get('konzept_verstanden'):
-                response_data['nachricht'] += "\n\n📚 Hier sind passende Quellen zum Vertiefen:\n" + "\n".join(f"• {q}" for q in thema_info.get('quellen', []))
-            else:
-                response_data['nachricht'] += "\n\n📚 Hier sind hilfreiche Quellen für später:\n" + "\n".join(f"• {q}" for q in thema_info.get('quellen', []))
-        
-        # Wenn Konzept verstanden → nächstes Konzept
-        if antwort.get('konzept_verstanden'):
-            session['versuche_aktuelles_konzept'] = 0  # Reset
-            neuer_index = konzept_index + 1
-            if neuer_index < len(thema_info['konzepte']):
-                session['aktuelles_konzept_index'] = neuer_index
-                naechstes_konzept = thema_info['konzepte'][neuer_index]
-                response_data['neues_konzept'] = naechstes_konzept
-                response_data['nachricht'] += f"\n\n✅ Super! Lass uns zum nächsten Thema gehen: {naechstes_konzept}"
-            else:
-                response_data['thema_abgeschlossen'] = True
-                response_data['nachricht'] += "\n\n🎉 Fantastisch! Du hast alle Konzepte dieses Themas verstanden!"
-                # Quellen am Ende
-                if not antwort.get('gebe_quellen'):
-                    response_data['nachricht'] += "\n\n📚 Zum Vertiefen:\n" + "\n".join(f"• {q}" for q in thema_info.get('quellen', []))
-        
-        return jsonify(response_data)
-        
-    except Exception as e:
-        print(f"Fehler in /chat: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+    except LLMNichtVerfuegbar as e:
+        print(f"LLM nicht verfügbar: {str(e)}")
+        antwort = dict(FALLBACK_ANTWORT)
+        yield 'token', {'text': antwort['nachricht']}
+        response_data = chat_auswerten(kontext, antwort)
+        antwort_merken(nachricht_id, response_data)
+        yield 'fertig', response_data
+        return
+    
+    extraktor = NachrichtExtraktor()
+    with metriken.phase('upstream'):
+        for chunk in stream:
+            # Der letzte Chunk trägt nur noch die Token-Zahlen (include_usage)
+            if getattr(chunk, 'usage', None):
+                metriken.tokens_erfassen(chunk.usage)
+            if not chunk.choices:
+                continue
+            neu = extraktor.fuettern(chunk.choices[0].delta.content or '')
+            if neu:
+                yield 'token', {'text': neu}
+    
+    with metriken.phase('parsen'):
+        antwort = antwort_lesen(extraktor.text)
+    semantik_cache_ablegen(kontext, antwort, (time.perf_counter() - start) * 1000)
+    
+    response_data = chat_auswerten(kontext, antwort)
+    antwort_merken(nachricht_id, response_data)
+    yield 'fertig', response_data
+
+
+# Dauerhafte WebSocket-Verbindung pro Schüler (WEBSOCKET=1, braucht flask-sock)
+kanal_verbindungen = Verbindungen()
+
+
+def kanal_schliessen(ws, code, grund):
+    try:
+        ws.close(code, grund)
+    except Exception:  # schon zu
+        pass
+
+
+def kanal(ws):
+    """Chat-Züge über eine offene Verbindung; Ereignisse wie bei /chat/stream"""
+    sid = session.sid
+    alt = kanal_verbindungen.anmelden(sid, ws)
+    if alt is not None:
+        try:
+            alt.send(nachricht('ersetzt', {}))
+        except Exception:
+            pass
+        kanal_schliessen(alt, ERSETZT, 'Neue Verbindung')
+    try:
+        while True:
+            text = ws.receive(timeout=KANAL_LEERLAUF)
+            if text is None:
+                kanal_schliessen(ws, 1001, 'Leerlauf')
+                return
+            zug = nachricht_lesen(text)
+            if zug is None:
+                ws.send(nachricht('fehler', {'success': False, 'error': 'Bitte Nachricht eingeben'}))
+                continue
+            start = time.perf_counter()
+            ausgeliefert = zug_ausliefern(ws, exklusiver_chat_zug(zug['nachricht'], nachricht_id_lesen(zug)))
+            metriken.zug_erfassen(start)
+            if not ausgeliefert:
+                # Der Zug ist trotzdem gespeichert; der Browser holt die Antwort
+                # mit derselben Nachrichten-ID über /chat/stream ab
+                kanal_schliessen(ws, ZU_LANGSAM, 'Zu langsam')
+                return
+    finally:
+        kanal_verbindungen.abmelden(sid, ws)
+
+
+if KANAL_AKTIV:
+    app.config['SOCK_SERVER_OPTIONS'] = SERVER_OPTIONEN
+    Sock(app).route('/kanal')(kanal)
+
+
+@app.before_request
+def kanal_pruefen():
+    """Handshake nur von der eigenen Seite und mit gestarteter Session"""
+    if request.endpoint != 'kanal':
+        return None
+    if not gleiche_herkunft(request.headers.get('Origin'), request.host):
+        return jsonify({'success': False, 'error': 'Fremde Herkunft'}), 403
+    if session.new or 'aktuelles_thema' not in session:
+        return jsonify({'success': False, 'error': 'Bitte zuerst starten'}), 401
+    return None
 
 
 @app.route('/thema_wechseln', methods=['POST'])
+@sitzung_exklusiv
 def thema_wechseln():
     """Wechselt das Thema"""
     try:
         data = request.json
-        thema_id = data.get('thema_id', '1_grundlagen')
+        lehrplan = lehrplan_quelle.aktuell()
+        thema_id = data.get('thema_id', lehrplan.start_thema)
         
-        if thema_id not in THEMEN:
+        if thema_id not in lehrplan:
             return jsonify({'success': False, 'error': 'Ungültiges Thema'}), 400
         
-        thema_info = THEMEN[thema_id]
+        thema_info = lehrplan[thema_id]
         session['aktuelles_thema'] = thema_id
         session['aktuelles_konzept_index'] = 0
-        session['conversation_history'] = []
         session['versuche_aktuelles_konzept'] = 0
+        session.pop('zusammenfassung', None)
+        session_store.verlauf_setzen(session.sid, [])
+        vorauslader.verwerfen(session.sid)
         
-        erstes_konzept = thema_info['konzepte'][0]
-        
-        # Neue Intro-Nachricht
-        intro_prompt = f"""Thema: {thema_info['name']}
-Erstes Konzept: {erstes_konzept}
-
-Der Schüler wechselt zu einem neuen Thema.
-
-Begrüße ihn kurz für dieses neue Thema und erkunde sein Vorwissen zum ersten Konzept.
-Sei motivierend!
-
-Antworte im JSON-Format."""
-
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": TUTOR_SYSTEM_PROMPT},
-                {"role": "user", "content": intro_prompt}
-            ],
-            max_tokens=300,
-            temperature=0.7
-        )
+        erstes_konzept = thema_info.konzepte[0]
         
-        antwort_text = response.choices[0].message.content.strip()
-        antwort_text = antwort_text.replace('```json', '').replace('```', '').strip()
-        antwort = json.loads(antwort_text)
+        # Neue Intro-Nachricht (aus dem Intro-Cache)
+        antwort = intro_antwort('wechsel', thema_id, session.get('name', ''))
+        fortschritt_erfassen('wechsel', erstes_konzept)
         
-        session['conversation_history'] = [
+        session_store.verlauf_setzen(session.sid, [
             {"role": "assistant", "content": antwort['nachricht']}
-        ]
+        ])
         
         response_data = {
             'success': True,
-            'thema': thema_info['name'],
+            'thema': thema_info.name,
             'nachricht': antwort['nachricht'],
             'konzept': erstes_konzept
         }
@@ -396,26 +1008,266 @@ Antworte im JSON-Format."""
             bild_info = hole_bild(thema_id, antwort['bild_thema'])
             if bild_info:
                 response_data['bild'] = bild_info
+        vorab_bilder_anhaengen(response_data)
         
-        return jsonify(response_data)
+        with metriken.phase('serialisieren'):
+            return jsonify(response_data)
         
     except Exception as e:
         print(f"Fehler in /thema_wechseln: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def intro_generieren(art, thema_id, prioritaet=PRIORITAET_START):
+    """Erzeugt eine Begrüßung für ein Thema (mit Namens-Platzhalter) per API"""
+    thema_info = lehrplan_quelle.aktuell()[thema_id]
+    intro_prompt = INTRO_PROMPTS[art].format(
+        thema=thema_info.name,
+        konzept=thema_info.konzepte[0],
+        name=NAME_PLATZHALTER
+    )
+    
+    return tutor_anfrage([
+        {"role": "system", "content": TUTOR_SYSTEM_PROMPT},
+        {"role": "user", "content": intro_prompt}
+    ], max_tokens=300, prioritaet=prioritaet)
+
+
+def intro_schluessel(art, thema_info):
+    # Version des Themas: neuer Name oder andere Konzepte ergeben neue Begrüßungen
+    return (art, thema_info.id, thema_info.version, INTRO_PROMPT_VERSION)
+
+
+def intro_antwort(art, thema_id, name=''):
+    """Holt eine Begrüßung aus dem Intro-Cache oder erzeugt sie bei Bedarf"""
+    schluessel = intro_schluessel(art, lehrplan_quelle.aktuell()[thema_id])
+    antwort = None
+    if INTRO_CACHE_AKTIV:
+        antwort = intro_cache.hole(schluessel)
+        metriken.cache_erfassen('intro', antwort is not None)
+    if antwort is None:
+        if INTRO_CACHE_AKTIV:
+            # Startet eine Klasse gleichzeitig, fragt nur einer, die anderen warten
+            antwort = intro_cache.erzeugen(schluessel, lambda: intro_generieren(art, thema_id))
+        else:
+            antwort = intro_generieren(art, thema_id)
+    antwort['nachricht'] = antwort['nachricht'].replace(NAME_PLATZHALTER, name)
+    return antwort
+
+
+@app.cli.command('intro-cache-aufwaermen')
+def intro_cache_aufwaermen():
+    """Füllt den Intro-Cache (INTRO_CACHE_DATEI) für alle Themen, z.B. beim Deploy (render.yaml)"""
+    if intro_cache.datei is None:
+        print("Intro-Cache: ohne INTRO_CACHE_DATEI sieht der Server das Ergebnis nicht, Abbruch")
+        return
+    for thema_info in lehrplan_quelle.aktuell().values():
+        thema_id = thema_info.id
+        for art in INTRO_PROMPTS:
+            schluessel = intro_schluessel(art, thema_info)
+            for _ in range(intro_cache.fehlende(schluessel)):
+                try:
+                    antwort = intro_generieren(art, thema_id, PRIORITAET_HINTERGRUND)
+                except Exception as e:  # z.B. kein API-Key im Build; der Deploy soll trotzdem laufen
+                    print(f"Intro-Cache: nicht aufgewärmt: {str(e)}")
+                    return
+                if antwort.get('fallback'):
+                    print("Intro-Cache: Modell nicht erreichbar, Abbruch")
+                    return
+                intro_cache.ablegen(schluessel, antwort)
+            print(f"Intro-Cache: {thema_id}/{art} bereit")
+
+
 def hole_bild(thema_id, bild_id):
-    """Holt ein spezifisches Bild für ein Thema"""
-    if thema_id in BILDER and bild_id in BILDER[thema_id]:
-        bild_info = BILDER[thema_id][bild_id]
-        return {
-            'datei': bild_info['datei'],
-            'beschreibung': bild_info['beschreibung'],
-            'url': f'/static/{bild_info["datei"]}'
-        }
-    return None
+    """Holt ein spezifisches Bild für ein Thema (mit optimierten Varianten, falls gebaut)"""
+    with metriken.phase('bild'):
+        return bild_eintrag(thema_id, bild_id)
+
+
+def vorab_bilder_anhaengen(response_data):
+    """Wahrscheinlich nächste Bilder (aktuelles und nächstes Konzept) als 'vorab_bilder' zum Vorladen im Browser"""
+    lehrplan = lehrplan_quelle.aktuell()
+    if not VORAB_BILDER or session.get('aktuelles_thema') not in lehrplan:
+        return
+    thema_info = lehrplan[session['aktuelles_thema']]
+    with metriken.phase('bild'):
+        bilder = vorab_bilder(
+            thema_info.id, thema_info.konzepte, session.get('aktuelles_konzept_index', 0), VORAB_BILDER
+        )
+    # Das Bild dieser Antwort lädt der Browser ohnehin sofort
+    angezeigt = response_data.get('bild', {}).get('url')
+    bilder = [b for b in bilder if b['url'] != angezeigt]
+    if bilder:
+        # Kein Link-Header: den werten Browser bei fetch()-Antworten nicht aus, app.js lädt selbst vor
+        response_data['vorab_bilder'] = bilder
+
+
+@app.route('/bild_angezeigt', methods=['POST'])
+def bild_angezeigt():
+    """Meldung des Browsers, ob ein angezeigtes Bild schon vorab geladen war (Trefferquote)"""
+    data = request.get_json(silent=True) or {}
+    if 'aktuelles_thema' in session and isinstance(data.get('vorab'), bool):
+        bilder_statistik['angezeigt'] += 1
+        bilder_statistik['vorab'] += data['vorab']
+        metriken.cache_erfassen('bild_vorab', data['vorab'])
+    return '', 204
+
+
+@app.route('/lehrkraft/statistik')
+def lehrkraft_statistik():
+    """
+    Auswertung für Lehrkräfte aus den Übersichtstabellen des Fortschrittsspeichers.
+    
+    ?klasse=... liefert Schüler und Konzepte einer Klasse, sonst alle Konzepte
+    über alle Klassen (optional ?thema=...). Zugang nur mit LEHRKRAFT_TOKEN
+    als Bearer-Token im Authorization-Header; ein Token in der URL stünde
+    im Access-Log.
+    """
+    token = os.environ.get('LEHRKRAFT_TOKEN')
+    if fortschritt is None or not token:
+        return jsonify({'success': False, 'error': 'Nicht eingerichtet'}), 404
+    art, _, gesendet = request.headers.get('Authorization', '').partition(' ')
+    if art != 'Bearer':
+        gesendet = ''
+    if not hmac.compare_digest(gesendet.encode(), token.encode()):
+        return jsonify({'success': False, 'error': 'Nicht berechtigt'}), 403
+    
+    klasse = request.args.get('klasse', '').strip()
+    if klasse:
+        daten = fortschritt.klassen_uebersicht(normalisieren(klasse))
+    else:
+        daten = {'konzepte': fortschritt.konzept_uebersicht(request.args.get('thema'))}
+    return jsonify({'success': True, **daten})
+
+
+@app.route('/bereit')
+def bereit():
+    """Readiness-Check für den Load Balancer, ohne Template und ohne Session"""
+    try:
+        lehrplan = lehrplan_quelle.aktuell()
+        session_store.bereit()
+    except Exception as e:
+        return jsonify({'bereit': False, 'fehler': str(e)}), 503
+    return jsonify({
+        'bereit': True,
+        'themen': len(lehrplan),
+        'lehrplan': lehrplan.version,
+        'llm': llm.breaker.zustand
+    })
+
+
+@app.route('/metrics')
+def metrics():
+    """Metriken im Prometheus-Textformat"""
+    return Response(metriken.prometheus_text(), mimetype='text/plain; version=0.0.4')
+
+
+# Messung des Hot-Paths und Kennzahlen der Caches, des Kontextfensters und des Schedulers
+metriken.einrichten(app, routen={'start', 'chat', 'chat_stream', 'thema_wechseln'})
+metriken.messwert(
+    'tutor_intro_cache_trefferquote', 'Anteil der Begrüßungen aus dem Intro-Cache',
+    lambda: intro_cache.treffer / max(1, intro_cache.treffer + intro_cache.fehlschlaege)
+)
+metriken.messwert(
+    'tutor_semantik_cache_trefferquote', 'Anteil der Chat-Züge aus dem Semantik-Cache',
+    lambda: semantik_cache.metriken()['trefferquote']
+)
+metriken.messwert(
+    'tutor_semantik_cache_gesparte_sekunden', 'Durch Semantik-Cache-Treffer eingesparte Upstream-Zeit',
+    lambda: semantik_cache.gesparte_ms / 1000
+)
+metriken.messwert(
+    'tutor_schnellpfad_quote', 'Anteil der Chat-Züge, die lokal ohne Sprachmodell beantwortet wurden',
+    lambda: schnellpfad.metriken()['quote'] if schnellpfad else 0.0
+)
+metriken.messwert(
+    'tutor_vorab_bilder_trefferquote', 'Anteil der angezeigten Bilder, die der Browser schon vorab geladen hatte',
+    lambda: bilder_statistik['vorab'] / max(1, bilder_statistik['angezeigt'])
+)
+metriken.messwert(
+    'tutor_start_phase_sekunden', 'Dauer der Initialisierungsschritte beim Start dieses Prozesses',
+    lambda: metriken.STARTPHASEN,
+    labels=('phase',)
+)
+metriken.messwert(
+    'tutor_kanal_verbindungen', 'Offene WebSocket-Verbindungen dieses Workers',
+    lambda: len(kanal_verbindungen)
+)
+metriken.messwert(
+    'tutor_vorausladen_trefferquote', 'Anteil der vorab erzeugten Eröffnungsfragen, die genutzt wurden',
+    lambda: vorauslader.metriken()['trefferquote']
+)
+metriken.messwert(
+    'tutor_vorausladen_tokens', 'Für das Vorausladen eingeplante Tokens (Schätzung)',
+    lambda: vorauslader.statistik['tokens']
+)
+metriken.messwert(
+    'tutor_fortschritt_puffer', 'Noch nicht geschriebene Fortschritts-Ereignisse',
+    lambda: fortschritt.metriken()['puffer'] if fortschritt else 0
+)
+metriken.messwert(
+    'tutor_kontext_tokens_gespart_pro_zug', 'Durch Zusammenfassung eingesparte Prompt-Tokens pro Zug',
+    lambda: kontext_fenster.metriken()['tokens_gespart_pro_zug']
+)
+metriken.messwert(
+    'tutor_scheduler_warteschlange', 'Wartende Upstream-Aufrufe pro Priorität',
+    lambda: llm.scheduler.warteschlangen_tiefe() if llm.scheduler else {},
+    labels=('prioritaet',)
+)
+metriken.messwert(
+    'tutor_scheduler_wartezeit_mittel_sekunden', 'Mittlere Wartezeit in der Scheduler-Warteschlange',
+    lambda: llm.scheduler.metriken()['wartezeit_mittel'] if llm.scheduler else 0.0
+)
+metriken.messwert(
+    'tutor_llm_gebuendelt', 'Upstream-Aufrufe, die auf eine gleiche laufende Anfrage gewartet haben',
+    lambda: llm.gebuendelt
+)
+metriken.messwert(
+    'tutor_llm_circuit_offen', 'Circuit Breaker zum Sprachmodell offen (1) oder geschlossen (0)',
+    lambda: 1.0 if llm.breaker.zustand == 'offen' else 0.0
+)
+
+
+@app.before_request
+def vorkomprimiert_ausliefern():
+    """Gebaute CSS/JS-Dateien als .br/.gz-Variante, wenn der Browser das annimmt"""
+    if not (request.path.startswith('/static/build/') and request.path.endswith(('.css', '.js'))):
+        return None
+    pfad = os.path.join(BUILD_VERZEICHNIS, os.path.basename(request.path))
+    variante, kodierung = vorkomprimierte_datei(pfad, request.accept_encodings)
+    if variante is None:
+        return None
+    response = send_file(variante, mimetype=mimetypes.guess_type(pfad)[0], conditional=True)
+    response.headers['Content-Encoding'] = kodierung
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@app.after_request
+def antwort_komprimieren(response):
+    """HTML- und JSON-Antworten mit brotli/gzip; Streams und Dateien bleiben, wie sie sind"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in KOMPRIMIERBAR):
+        return response
+    response.vary.add('Accept-Encoding')
+    kodierung = kodierung_waehlen(request.accept_encodings)
+    if kodierung is None or response.content_length < KOMPRIMIERUNG_MIN_BYTES:
+        return response
+    response.set_data(komprimieren(response.get_data(), kodierung))
+    response.headers['Content-Encoding'] = kodierung
+    return response
+
+
+@app.after_request
+def cache_header_setzen(response):
+    """Gebaute Bilder tragen einen Inhalts-Hash im Namen und ändern sich nie"""
+    if request.path.startswith('/static/build/') and response.status_code == 200:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 
 if __name__ == '__main__':
+    if SCHNELLSTART:
+        threading.Thread(target=llm.vorwaermen, name='llm-vorwaermen', daemon=True).start()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
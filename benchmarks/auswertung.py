@@ -0,0 +1,205 @@
+# benchmarks/auswertung.py
+# Offline-Auswertung: spielt Tutor-Dialoge gegen den Mock-LLM ab
+
+"""
+Treibt die Flask-App über ihren Test-Client mit geskripteten Schüler-Dialogen
+(pro Konzept aus dem Lehrplan) gegen den lokalen Mock-Server. Viele Sessions laufen
+parallel; am Ende gibt es p50/p95/p99-Latenz pro Route, Tokens pro Zug und
+Fehlerquoten. So lassen sich Änderungen an TUTOR_SYSTEM_PROMPT oder den
+Routen ohne echte Schüler und ohne API-Kosten vergleichen.
+
+Beispiel:
+    python benchmarks/auswertung.py --sessions 200 --parallel 100 --zuege 8 --json ergebnis.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_openai import MockEinstellungen, starte_mock  # noqa: E402
+
+# Generische Schüler-Züge; {konzept} wird durch das aktuelle Konzept ersetzt
+STANDARD_ZUEGE = [
+    "Keine Ahnung ehrlich gesagt",
+    "Hat das was mit {konzept} zu tun?",
+    "ich weiß es nicht",
+    "Kannst du mir einen Tipp geben?",
+    "Ist es so, dass {konzept} aus kleineren Teilen besteht?",
+    "ok",
+    "Ah, ich glaube jetzt verstehe ich {konzept}!"
+]
+
+
+def perzentil(werte, p):
+    if not werte:
+        return 0.0
+    werte = sorted(werte)
+    index = min(len(werte) - 1, max(0, round(p / 100 * (len(werte) - 1))))
+    return werte[index]
+
+
+class Messung:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latenzen = {}   # route -> [ms]
+        self.fehler = {}     # route -> Anzahl
+        self.fallbacks = 0
+        self.chat_zuege = 0
+
+    def eintragen(self, route, ms, ok, fallback=False):
+        with self.lock:
+            self.latenzen.setdefault(route, []).append(ms)
+            if not ok:
+                self.fehler[route] = self.fehler.get(route, 0) + 1
+            if fallback:
+                self.fallbacks += 1
+            if route.startswith('/chat'):
+                self.chat_zuege += 1
+
+
+def lade_transkripte(pfad):
+    """{thema_id: {konzept: [züge, ...]}} aus JSON, fehlende Konzepte nutzen STANDARD_ZUEGE."""
+    if not pfad:
+        return {}
+    with open(pfad, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def zuege_fuer(transkripte, themen, thema_id, konzept):
+    zuege = transkripte.get(thema_id, {}).get(konzept)
+    if zuege:
+        return zuege
+    return [z.format(konzept=konzept) for z in STANDARD_ZUEGE]
+
+
+def session_abspielen(app_modul, messung, args, transkripte, nummer):
+    zufall = random.Random(nummer)
+    client = app_modul.app.test_client()
+    themen = app_modul.lehrplan_quelle.aktuell()
+    fallback_text = app_modul.FALLBACK_ANTWORT['nachricht']
+    chat_route = '/chat/stream' if args.stream else '/chat'
+
+    def senden(route, nutzlast):
+        start = time.perf_counter()
+        antwort = client.post(route, json=nutzlast)
+        if route == '/chat/stream':
+            roh = antwort.get_data(as_text=True)
+            daten = {}
+            for block in roh.split('\n\n'):
+                if block.startswith('event: fertig'):
+                    daten = json.loads(block.split('data: ', 1)[1])
+        else:
+            daten = antwort.get_json(silent=True) or {}
+        ms = (time.perf_counter() - start) * 1000
+        ok = antwort.status_code == 200 and daten.get('success', False)
+        messung.eintragen(route, ms, ok, fallback=daten.get('nachricht', '').startswith(fallback_text))
+        return daten
+
+    daten = senden('/start', {'name': f'Schüler{nummer}'})
+    thema_id = themen.start_thema
+    konzept = daten.get('konzept', themen[thema_id].konzepte[0])
+    wechsel_nach = args.zuege // 2 if args.wechsel else None
+
+    for zug in range(args.zuege):
+        if zug == wechsel_nach:
+            thema_id = zufall.choice([t for t in themen if t != thema_id])
+            daten = senden('/thema_wechseln', {'thema_id': thema_id})
+            konzept = daten.get('konzept', themen[thema_id].konzepte[0])
+        zuege = zuege_fuer(transkripte, themen, thema_id, konzept)
+        daten = senden(chat_route, {'nachricht': zuege[zug % len(zuege)]})
+        if daten.get('neues_konzept'):
+            konzept = daten['neues_konzept']
+        if args.denkzeit_ms:
+            time.sleep(zufall.uniform(0.5, 1.5) * args.denkzeit_ms / 1000)
+
+
+def bericht(messung, mock_statistik, dauer, args):
+    ergebnis = {'routen': {}, 'dauer_s': round(dauer, 2), 'sessions': args.sessions}
+    print(f"\n{'Route':<16} {'Anzahl':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'Fehler':>8}")
+    for route, werte in sorted(messung.latenzen.items()):
+        fehler = messung.fehler.get(route, 0)
+        eintrag = {
+            'anzahl': len(werte),
+            'p50_ms': round(perzentil(werte, 50), 1),
+            'p95_ms': round(perzentil(werte, 95), 1),
+            'p99_ms': round(perzentil(werte, 99), 1),
+            'fehlerquote': round(fehler / len(werte), 4)
+        }
+        ergebnis['routen'][route] = eintrag
+        print(f"{route:<16} {eintrag['anzahl']:>7} {eintrag['p50_ms']:>9} {eintrag['p95_ms']:>9} "
+              f"{eintrag['p99_ms']:>9} {eintrag['fehlerquote']:>8.2%}")
+
+    upstream = mock_statistik.als_dict()
+    zuege = max(1, messung.chat_zuege)
+    ergebnis['upstream'] = upstream
+    ergebnis['prompt_tokens_pro_zug'] = round(upstream['prompt_tokens'] / zuege, 1)
+    ergebnis['completion_tokens_pro_zug'] = round(upstream['completion_tokens'] / zuege, 1)
+    ergebnis['fallbacks'] = messung.fallbacks
+    anfragen = sum(len(w) for w in messung.latenzen.values())
+    ergebnis['durchsatz_pro_s'] = round(anfragen / dauer, 1) if dauer else 0.0
+
+    print(f"\nUpstream-Aufrufe: {upstream['anfragen']} (davon Fehler: {upstream['fehler']})")
+    print(f"Tokens pro Chat-Zug: {ergebnis['prompt_tokens_pro_zug']} Prompt / "
+          f"{ergebnis['completion_tokens_pro_zug']} Completion")
+    print(f"Ersatz-Antworten (Fallback): {messung.fallbacks}")
+    print(f"Durchsatz: {ergebnis['durchsatz_pro_s']} Anfragen/s in {ergebnis['dauer_s']} s")
+    return ergebnis
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tutor-Dialoge gegen einen Mock-LLM abspielen')
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--parallel', type=int, default=50)
+    parser.add_argument('--zuege', type=int, default=8, help='Chat-Züge pro Session')
+    parser.add_argument('--wechsel', action='store_true', help='Nach der Hälfte das Thema wechseln')
+    parser.add_argument('--stream', action='store_true', help='/chat/stream statt /chat verwenden')
+    parser.add_argument('--denkzeit-ms', type=float, default=0.0, help='Pause zwischen Zügen')
+    parser.add_argument('--transkripte', help='JSON {thema_id: {konzept: [züge]}}')
+    parser.add_argument('--latenz-ms', type=float, default=300.0)
+    parser.add_argument('--ms-pro-token', type=float, default=5.0)
+    parser.add_argument('--ausgabe-tokens', type=int, default=60)
+    parser.add_argument('--fehlerquote', type=float, default=0.0)
+    parser.add_argument('--verstanden-quote', type=float, default=0.25)
+    parser.add_argument('--json', help='Ergebnis zusätzlich als JSON speichern')
+    args = parser.parse_args(argv)
+
+    server, mock_statistik = starte_mock(0, MockEinstellungen(
+        latenz_ms=args.latenz_ms, ms_pro_token=args.ms_pro_token, ausgabe_tokens=args.ausgabe_tokens,
+        fehlerquote=args.fehlerquote, verstanden_quote=args.verstanden_quote, seed=1
+    ))
+    os.environ['OPENAI_BASE_URL'] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault('OPENAI_API_KEY', 'mock')
+    # Der Mock hat keine Ratenlimits, der Scheduler soll nicht künstlich bremsen
+    os.environ.setdefault('LIMIT_ANFRAGEN_PRO_MINUTE', '1000000')
+    os.environ.setdefault('LIMIT_TOKENS_PRO_MINUTE', '1000000000')
+
+    import app as app_modul
+
+    transkripte = lade_transkripte(args.transkripte)
+    messung = Messung()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.parallel) as pool:
+        auftraege = [pool.submit(session_abspielen, app_modul, messung, args, transkripte, n)
+                     for n in range(args.sessions)]
+        for auftrag in auftraege:
+            auftrag.result()
+    dauer = time.perf_counter() - start
+
+    ergebnis = bericht(messung, mock_statistik, dauer, args)
+    server.shutdown()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(ergebnis, f, ensure_ascii=False, indent=2)
+    return ergebnis
+
+
+if __name__ == '__main__':
+    main()
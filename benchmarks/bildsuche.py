@@ -0,0 +1,75 @@
+# benchmarks/bildsuche.py
+# Micro-Benchmark: Stichwort-Index vs. lineare Suche in image_resources
+
+"""
+Vergleicht die alte verschachtelte Schleife (jedes Bild, jedes Keyword, `in`)
+mit dem vorkompilierten Index für wachsende Keyword-Zahlen.
+
+Aufruf (aus dem Projektverzeichnis):
+    python benchmarks/bildsuche.py
+"""
+
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import image_resources  # noqa: E402
+
+TEXT = ("Ich glaube die Basenpaarung funktioniert über Wasserstoffbrücken, "
+        "aber wie hängt das mit der Doppelhelix und dem Zucker-Phosphat-Rückgrat zusammen?")
+
+
+def lineare_suche(frage_text, thema_bilder):
+    """Die ursprüngliche Implementierung von finde_passendes_bild."""
+    frage_lower = frage_text.lower()
+    for bild_id, bild_info in thema_bilder.items():
+        for keyword in bild_info["keywords"]:
+            if keyword in frage_lower:
+                return bild_id
+    return None
+
+
+def kuenstliche_bilder(anzahl_bilder, keywords_pro_bild):
+    zufall = random.Random(42)
+    bilder = {}
+    for i in range(anzahl_bilder):
+        bilder[f"bild{i}"] = {
+            "datei": f"bild{i}.png",
+            "beschreibung": f"Bild {i}",
+            "keywords": ["".join(zufall.choices(string.ascii_lowercase, k=zufall.randint(5, 12)))
+                         for _ in range(keywords_pro_bild)]
+        }
+    # Ein echtes Keyword ganz am Ende, damit die lineare Suche alles durchlaufen muss
+    bilder[f"bild{anzahl_bilder - 1}"]["keywords"].append("doppelhelix")
+    return bilder
+
+
+def main():
+    print(f"{'Bilder':>7} {'Keywords':>9} {'linear (µs)':>12} {'Index (µs)':>11}")
+    original = dict(image_resources.BILDER)
+    try:
+        for anzahl_bilder in (6, 50, 200, 800):
+            bilder = kuenstliche_bilder(anzahl_bilder, 6)
+            image_resources.BILDER["bench"] = bilder
+            image_resources.index_aufbauen()
+            keywords = sum(len(b["keywords"]) for b in bilder.values())
+
+            durchlaeufe = 2000
+            linear = timeit.timeit(lambda: lineare_suche(TEXT, bilder), number=durchlaeufe)
+            index = timeit.timeit(
+                lambda: image_resources.finde_passende_bilder(TEXT, "bench"), number=durchlaeufe
+            )
+            print(f"{anzahl_bilder:>7} {keywords:>9} "
+                  f"{linear / durchlaeufe * 1e6:>12.1f} {index / durchlaeufe * 1e6:>11.1f}")
+    finally:
+        image_resources.BILDER.clear()
+        image_resources.BILDER.update(original)
+        image_resources.index_aufbauen()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+# benchmarks/kaltstart.py
+# Kaltstart: Zeit vom Prozessstart bis zur ersten Seite und zum ersten Chat-Zug
+
+"""
+Misst, was ein Schüler nach einem Scale-to-zero-Start erlebt: die App wird
+(gunicorn mit gunicorn.conf.py, gegen den Mock-LLM) frisch gestartet und
+gemessen wird ab Prozessstart bis
+
+- seite: GET / liefert 200 (Startseite)
+- start: erste Antwort von /start
+- chat1: erste Antwort von /chat (erste Upstream-Verbindung)
+- chat2: zweiter Chat-Zug (warm, zum Vergleich), als Dauer des Zugs
+
+Jede Variante läuft --laeufe mal, berichtet wird der Median. Varianten:
+normal, schnellstart (SCHNELLSTART=1) und ohne-snapshot (SNAPSHOT=0).
+Dazu die Startphasen aus /metrics (tutor_start_phase_sekunden) und mit
+--importtime die teuersten Importe von "import app".
+
+Aufruf (aus dem Projektverzeichnis):
+    python benchmarks/kaltstart.py
+    python benchmarks/kaltstart.py --laeufe 10 --varianten normal schnellstart --importtime
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_VERZEICHNIS = os.path.dirname(os.path.abspath(__file__))
+REPO_VERZEICHNIS = os.path.dirname(BENCH_VERZEICHNIS)
+sys.path.insert(0, BENCH_VERZEICHNIS)
+
+from lasttest import freier_port, warten_bis_bereit  # noqa: E402
+
+VARIANTEN = {
+    'normal': {},
+    'schnellstart': {'SCHNELLSTART': '1'},
+    'ohne-snapshot': {'SNAPSHOT': '0'},
+}
+PHASEN = ('seite', 'start', 'chat1', 'chat2')
+
+
+def _warten_auf_seite(url, prozess, frist=60):
+    # Eigene Schleife mit kurzem Takt, sonst misst das Intervall mit
+    ende = time.monotonic() + frist
+    while time.monotonic() < ende:
+        if prozess.poll() is not None:
+            raise RuntimeError(f"App beendet mit Code {prozess.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=2) as antwort:
+                if antwort.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} nicht bereit nach {frist} s")
+
+
+def _post(oeffner, url, daten):
+    anfrage = urllib.request.Request(url, json.dumps(daten).encode(), {'Content-Type': 'application/json'})
+    with oeffner.open(anfrage, timeout=60) as antwort:
+        return json.load(antwort)
+
+
+def start_messen(umgebung, arbeitsverzeichnis):
+    """Ein Kaltstart; Zeiten in ms ab Popen, dazu die Startphasen aus /metrics."""
+    port = freier_port()
+    umgebung = dict(umgebung, PORT=str(port),
+                    SESSION_DB=os.path.join(arbeitsverzeichnis, f'sessions-{port}.db'),
+                    SCHEDULER_DB=os.path.join(arbeitsverzeichnis, f'scheduler-{port}.db'),
+                    FORTSCHRITT_DB=os.path.join(arbeitsverzeichnis, f'fortschritt-{port}.db'))
+    basis = f"http://127.0.0.1:{port}"
+    oeffner = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    beginn = time.perf_counter()
+    prozess = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--access-logfile', '/dev/null', 'app:app'],
+        cwd=REPO_VERZEICHNIS, env=umgebung, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        zeiten = {}
+        _warten_auf_seite(basis + '/', prozess)
+        zeiten['seite'] = time.perf_counter() - beginn
+        _post(oeffner, basis + '/start', {'name': 'Kaltstart', 'klasse': 'messung'})
+        zeiten['start'] = time.perf_counter() - beginn
+        _post(oeffner, basis + '/chat', {'nachricht': 'Ich glaube, DNA besteht aus Zucker und Phosphat.'})
+        zeiten['chat1'] = time.perf_counter() - beginn
+        zwischen = time.perf_counter()
+        _post(oeffner, basis + '/chat', {'nachricht': 'Und die Basen sind irgendwie gepaart?'})
+        zeiten['chat2'] = time.perf_counter() - zwischen
+        with urllib.request.urlopen(basis + '/metrics', timeout=5) as antwort:
+            metriken = antwort.read().decode('utf-8')
+    finally:
+        prozess.terminate()
+        try:
+            prozess.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            prozess.kill()
+    phasen = {
+        name: float(wert) for name, wert
+        in re.findall(r'^tutor_start_phase_sekunden\{phase="([^"]+)"\} (\S+)$', metriken, re.M)
+    }
+    return {name: round(1000 * wert, 1) for name, wert in zeiten.items()}, phasen
+
+
+def importe_messen(anzahl=12):
+    """Die teuersten Module von "import app" laut python -X importtime (kumuliert, ms)."""
+    ergebnis = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=REPO_VERZEICHNIS, capture_output=True, text=True,
+        env=dict(os.environ, OPENAI_API_KEY='mock')
+    )
+    module = []
+    for zeile in ergebnis.stderr.splitlines():
+        teile = zeile.split('|')
+        if len(teile) == 3 and teile[1].strip().isdigit():
+            name = teile[2].rstrip()[1:]
+            # app selbst und was es direkt importiert; tiefere Module sind dort mitgezählt
+            if len(name) - len(name.lstrip(' ')) <= 2:
+                module.append((int(teile[1]) / 1000, name.strip()))
+    return sorted(module, reverse=True)[:anzahl]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Kaltstart der App unter gunicorn messen')
+    parser.add_argument('--laeufe', type=int, default=5)
+    parser.add_argument('--varianten', nargs='+', choices=sorted(VARIANTEN), default=sorted(VARIANTEN))
+    parser.add_argument('--importtime', action='store_true', help='Teuerste Importe von "import app" zeigen')
+    parser.add_argument('--json', help='Ergebnis als JSON speichern')
+    args = parser.parse_args(argv)
+
+    if args.importtime:
+        print("Teuerste Importe (kumuliert):")
+        for ms, name in importe_messen():
+            print(f"  {ms:8.1f} ms  {name}")
+        print()
+
+    arbeitsverzeichnis = tempfile.mkdtemp(prefix='kaltstart-')
+    mock_port = freier_port()
+    mock = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_VERZEICHNIS, 'mock_openai.py'), '--port', str(mock_port),
+         '--latenz-ms', '100', '--ms-pro-token', '1', '--seed', '1'],
+        stdout=subprocess.DEVNULL
+    )
+    umgebung = dict(
+        os.environ,
+        OPENAI_API_KEY='mock',
+        OPENAI_BASE_URL=f"http://127.0.0.1:{mock_port}/v1",
+        SECRET_KEY_DATEI=os.path.join(arbeitsverzeichnis, 'secret_key'),
+        WEB_CONCURRENCY=os.environ.get('WEB_CONCURRENCY', '1'),
+        # Jeder Lauf soll wirklich das Modell fragen
+        SEMANTIK_CACHE='0', PREFETCH='0'
+    )
+    ergebnis = {}
+    try:
+        warten_bis_bereit(f"http://127.0.0.1:{mock_port}/v1/statistik", mock)
+        for variante in args.varianten:
+            laeufe = []
+            phasen = {}
+            for _ in range(args.laeufe):
+                zeiten, phasen = start_messen(dict(umgebung, **VARIANTEN[variante]), arbeitsverzeichnis)
+                laeufe.append(zeiten)
+            ergebnis[variante] = {
+                'median_ms': {p: statistics.median(lauf[p] for lauf in laeufe) for p in PHASEN},
+                'startphasen_ms': {p: round(1000 * s, 1) for p, s in phasen.items()},
+                'laeufe': laeufe,
+            }
+    finally:
+        mock.terminate()
+        mock.wait(timeout=15)
+
+    print(f"Median über {args.laeufe} Läufe (ms ab Prozessstart; chat2 = Dauer des zweiten Zugs)")
+    print(f"{'Variante':<15}" + ''.join(f"{p:>10}" for p in PHASEN))
+    for variante, daten in ergebnis.items():
+        print(f"{variante:<15}" + ''.join(f"{daten['median_ms'][p]:>10.0f}" for p in PHASEN))
+    print()
+    for variante, daten in ergebnis.items():
+        phasen = ', '.join(f"{p} {ms:.0f}" for p, ms in daten['startphasen_ms'].items())
+        print(f"Startphasen {variante} (ms, letzter Lauf): {phasen or '-'}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(ergebnis, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
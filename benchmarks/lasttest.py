@@ -0,0 +1,562 @@
+# benchmarks/lasttest.py
+# Lasttest: ganze Schulklassen gegen gunicorn + Mock-LLM, mit Baseline-Vergleich
+
+"""
+Startet den Mock-LLM und die App unter gunicorn (gunicorn.conf.py) als
+eigene Prozesse und lässt einen asyncio-Client viele Schüler gleichzeitig
+/start -> mehrere /chat-Züge -> /thema_wechseln -> weitere Züge
+durchspielen, über echte HTTP-Verbindungen mit Keep-Alive und Cookies.
+
+Währenddessen werden CPU und Speicher (RSS, PSS, USS) aller gunicorn-
+Prozesse aus /proc mitgeschrieben; mit --py-spy zusätzlich ein
+Flamegraph pro Worker, falls py-spy installiert ist.
+
+Profile (Schüler gleichzeitig): klasse (30), jahrgang (150), schule (500)
+
+Beispiele:
+    python benchmarks/lasttest.py --profil klasse
+    python benchmarks/lasttest.py --profil schule --vergleich benchmarks/baseline.json
+    python benchmarks/lasttest.py --profil jahrgang --baseline-schreiben benchmarks/baseline.json
+
+Die Standard-Züge sind für alle Schüler gleich und werden daher oft vom
+semantischen Cache beantwortet; für den reinen Upstream-Pfad
+SEMANTIK_CACHE=0 setzen oder mit --transkripte echte Verläufe einspielen.
+Alle Umgebungsvariablen (WEB_CONCURRENCY, GUNICORN_*, ...) werden an
+gunicorn durchgereicht.
+
+Im Vergleichsmodus endet das Skript mit Exit-Code 1, wenn der Durchsatz um
+mehr als --toleranz fällt oder ein p95 um mehr als --toleranz steigt.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_VERZEICHNIS = os.path.dirname(os.path.abspath(__file__))
+REPO_VERZEICHNIS = os.path.dirname(BENCH_VERZEICHNIS)
+sys.path.insert(0, REPO_VERZEICHNIS)
+sys.path.insert(0, BENCH_VERZEICHNIS)
+
+from auswertung import Messung, perzentil, zuege_fuer, lade_transkripte  # noqa: E402
+from lehrplan import lehrplan_laden  # noqa: E402
+
+PROFILE = {
+    'klasse': {'schueler': 30, 'zuege': 8, 'denkzeit_ms': 500, 'anlauf_s': 2},
+    'jahrgang': {'schueler': 150, 'zuege': 8, 'denkzeit_ms': 1000, 'anlauf_s': 5},
+    'schule': {'schueler': 500, 'zuege': 6, 'denkzeit_ms': 2000, 'anlauf_s': 10},
+}
+
+TAKT = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def freier_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class HTTPVerbindung:
+    """Minimaler HTTP/1.1-Client auf asyncio-Streams mit Keep-Alive und Session-Cookie."""
+
+    def __init__(self, host, port, timeout=120.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.cookies = {}
+        self._reader = None
+        self._writer = None
+
+    async def _verbinden(self):
+        if self._writer is None or self._writer.is_closing():
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def schliessen(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            self._writer = None
+
+    async def post(self, pfad, daten, bei_erstem_teil=None):
+        """
+        Returns:
+            tuple: (status, body als bytes); bei_erstem_teil() wird beim ersten Body-Stück aufgerufen
+        """
+        return await asyncio.wait_for(self._post(pfad, daten, bei_erstem_teil), self.timeout)
+
+    async def _post(self, pfad, daten, bei_erstem_teil):
+        koerper = json.dumps(daten).encode()
+        kopf = [
+            f"POST {pfad} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(koerper)}",
+        ]
+        if self.cookies:
+            kopf.append("Cookie: " + "; ".join(f"{k}={v}" for k, v in self.cookies.items()))
+        for versuch in range(2):
+            await self._verbinden()
+            try:
+                self._writer.write(("\r\n".join(kopf) + "\r\n\r\n").encode() + koerper)
+                await self._writer.drain()
+                statuszeile = await self._reader.readline()
+                if not statuszeile:
+                    raise ConnectionResetError('Verbindung vom Server geschlossen')
+                break
+            except (ConnectionError, OSError):
+                # Keep-Alive-Verbindung war schon zu: einmal neu verbinden
+                await self.schliessen()
+                if versuch:
+                    raise
+        status = int(statuszeile.split()[1])
+
+        header = {}
+        while True:
+            zeile = (await self._reader.readline()).decode('latin-1').strip()
+            if not zeile:
+                break
+            name, _, wert = zeile.partition(':')
+            name = name.strip().lower()
+            wert = wert.strip()
+            if name == 'set-cookie':
+                paar = wert.split(';', 1)[0]
+                k, _, v = paar.partition('=')
+                self.cookies[k.strip()] = v.strip()
+            header[name] = wert
+
+        teile = []
+        if header.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                groesse = int((await self._reader.readline()).split(b';')[0].strip() or b'0', 16)
+                if groesse == 0:
+                    await self._reader.readline()
+                    break
+                teil = await self._reader.readexactly(groesse + 2)
+                if not teile and bei_erstem_teil:
+                    bei_erstem_teil()
+                teile.append(teil[:-2])
+        elif 'content-length' in header:
+            teile.append(await self._reader.readexactly(int(header['content-length'])))
+        else:
+            teile.append(await self._reader.read())
+            await self.schliessen()
+        if header.get('connection', '').lower() == 'close':
+            await self.schliessen()
+        return status, b''.join(teile)
+
+
+class ProzessMessung:
+    """Schreibt CPU und Speicher aller gunicorn-Prozesse aus /proc mit."""
+
+    def __init__(self, master_pid, intervall=0.5):
+        self.master_pid = master_pid
+        self.intervall = intervall
+        self.verlauf = []     # [(zeit, {pid: {...}})]
+        self._letzte = {}     # pid -> (zeit, cpu_ticks)
+
+    @staticmethod
+    def _kinder(pid):
+        kinder = []
+        try:
+            for task in os.listdir(f'/proc/{pid}/task'):
+                with open(f'/proc/{pid}/task/{task}/children') as f:
+                    kinder.extend(int(k) for k in f.read().split())
+        except OSError:
+            pass
+        return kinder
+
+    @staticmethod
+    def _speicher(pid):
+        werte = {}
+        try:
+            with open(f'/proc/{pid}/smaps_rollup') as f:
+                for zeile in f:
+                    teile = zeile.split()
+                    if len(teile) >= 2 and teile[0].rstrip(':') in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                        werte[teile[0].rstrip(':')] = int(teile[1])
+        except OSError:
+            return None
+        return {
+            'rss_mb': round(werte.get('Rss', 0) / 1024, 1),
+            'pss_mb': round(werte.get('Pss', 0) / 1024, 1),
+            'uss_mb': round((werte.get('Private_Clean', 0) + werte.get('Private_Dirty', 0)) / 1024, 1)
+        }
+
+    def _cpu_ticks(self, pid):
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                felder = f.read().rsplit(')', 1)[1].split()
+            return int(felder[11]) + int(felder[12])
+        except (OSError, IndexError):
+            return None
+
+    def messen(self):
+        jetzt = time.monotonic()
+        stand = {}
+        for pid in [self.master_pid] + self._kinder(self.master_pid):
+            ticks = self._cpu_ticks(pid)
+            speicher = self._speicher(pid)
+            if ticks is None or speicher is None:
+                continue
+            cpu = 0.0
+            if pid in self._letzte:
+                zeit, vorher = self._letzte[pid]
+                cpu = round(100.0 * (ticks - vorher) / TAKT / max(1e-6, jetzt - zeit), 1)
+            self._letzte[pid] = (jetzt, ticks)
+            stand[pid] = dict(speicher, cpu_prozent=cpu, rolle='master' if pid == self.master_pid else 'worker')
+        self.verlauf.append((jetzt, stand))
+
+    async def laufen(self):
+        while True:
+            self.messen()
+            await asyncio.sleep(self.intervall)
+
+    def zusammenfassung(self):
+        prozesse = {}
+        for _, stand in self.verlauf[1:]:
+            for pid, w in stand.items():
+                p = prozesse.setdefault(pid, {'rolle': w['rolle'], 'cpu': [], 'rss_mb': 0, 'pss_mb': 0, 'uss_mb': 0})
+                p['cpu'].append(w['cpu_prozent'])
+                for k in ('rss_mb', 'pss_mb', 'uss_mb'):
+                    p[k] = max(p[k], w[k])
+        ergebnis = {}
+        for pid, p in prozesse.items():
+            ergebnis[str(pid)] = {
+                'rolle': p['rolle'],
+                'cpu_mittel_prozent': round(sum(p['cpu']) / len(p['cpu']), 1) if p['cpu'] else 0.0,
+                'cpu_max_prozent': max(p['cpu'], default=0.0),
+                'rss_max_mb': p['rss_mb'],
+                'pss_max_mb': p['pss_mb'],
+                'uss_max_mb': p['uss_mb']
+            }
+        return ergebnis
+
+
+async def schueler_abspielen(nummer, args, themen, transkripte, messung, ttft, host, port, start_verzoegerung):
+    zufall = random.Random(nummer)
+    await asyncio.sleep(start_verzoegerung)
+    verbindung = HTTPVerbindung(host, port)
+    chat_route = '/chat/stream' if args.stream else '/chat'
+
+    async def senden(route, nutzlast):
+        beginn = time.perf_counter()
+        erstes = []
+
+        def bei_erstem_teil():
+            erstes.append(time.perf_counter())
+
+        try:
+            status, body = await verbindung.post(route, nutzlast, bei_erstem_teil if route == '/chat/stream' else None)
+        except (asyncio.TimeoutError, ConnectionError, OSError, ValueError):
+            await verbindung.schliessen()
+            messung.eintragen(route, (time.perf_counter() - beginn) * 1000, False)
+            return {}
+        ms = (time.perf_counter() - beginn) * 1000
+        daten = {}
+        if route == '/chat/stream':
+            for block in body.decode('utf-8', 'replace').split('\n\n'):
+                if block.startswith('event: fertig'):
+                    daten = json.loads(block.split('data: ', 1)[1])
+            if erstes:
+                ttft.append((erstes[0] - beginn) * 1000)
+        else:
+            try:
+                daten = json.loads(body)
+            except ValueError:
+                daten = {}
+        messung.eintragen(route, ms, status == 200 and daten.get('success', False),
+                          fallback=daten.get('fallback_text', False))
+        return daten
+
+    async def denken():
+        if args.denkzeit_ms:
+            await asyncio.sleep(zufall.uniform(0.5, 1.5) * args.denkzeit_ms / 1000)
+
+    try:
+        daten = await senden('/start', {'name': f'Schüler{nummer}', 'klasse': f'last-{nummer % 20}'})
+        thema_id = daten.get('thema_id', themen.start_thema)
+        konzept = daten.get('konzept', themen[thema_id].konzepte[0])
+        for zug in range(args.zuege):
+            await denken()
+            if zug == args.zuege // 2:
+                thema_id = zufall.choice([t for t in themen if t != thema_id])
+                daten = await senden('/thema_wechseln', {'thema_id': thema_id})
+                konzept = daten.get('konzept', themen[thema_id].konzepte[0])
+                await denken()
+            zuege = zuege_fuer(transkripte, themen, thema_id, konzept)
+            daten = await senden(chat_route, {'nachricht': zuege[zug % len(zuege)]})
+            if daten.get('neues_konzept'):
+                konzept = daten['neues_konzept']
+    finally:
+        await verbindung.schliessen()
+
+
+async def last_erzeugen(args, host, port, prozess_messung):
+    themen = lehrplan_laden()
+    transkripte = lade_transkripte(args.transkripte)
+    messung = Messung()
+    ttft = []
+    messer = asyncio.create_task(prozess_messung.laufen()) if prozess_messung else None
+    beginn = time.perf_counter()
+    await asyncio.gather(*[
+        schueler_abspielen(n, args, themen, transkripte, messung, ttft, host, port,
+                           args.anlauf_s * n / max(1, args.schueler))
+        for n in range(args.schueler)
+    ])
+    dauer = time.perf_counter() - beginn
+    if messer:
+        messer.cancel()
+    return messung, ttft, dauer
+
+
+def mock_statistik(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/v1/statistik", timeout=5) as antwort:
+        return json.load(antwort)
+
+
+def warten_bis_bereit(url, prozess, frist=60):
+    ende = time.monotonic() + frist
+    while time.monotonic() < ende:
+        if prozess is not None and prozess.poll() is not None:
+            raise RuntimeError(f"Prozess beendet mit Code {prozess.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=2) as antwort:
+                if antwort.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} nicht bereit nach {frist} s")
+
+
+def bericht(args, messung, ttft, dauer, upstream, prozesse):
+    ergebnis = {
+        'profil': args.profil,
+        'schueler': args.schueler,
+        'zuege': args.zuege,
+        'stream': args.stream,
+        'dauer_s': round(dauer, 2),
+        'routen': {},
+        'umgebung': {
+            'python': platform.python_version(),
+            'kerne': os.cpu_count(),
+            'worker': os.environ.get('WEB_CONCURRENCY', 'auto'),
+            'worker_klasse': os.environ.get('GUNICORN_WORKER_KLASSE', 'auto'),
+            'worker_verbindungen': os.environ.get('GUNICORN_WORKER_CONNECTIONS', '100')
+        }
+    }
+    print(f"\nProfil {args.profil}: {args.schueler} Schüler, {args.zuege} Züge, {ergebnis['dauer_s']} s")
+    print(f"{'Route':<16} {'Anzahl':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'Fehler':>8}")
+    for route, werte in sorted(messung.latenzen.items()):
+        fehler = messung.fehler.get(route, 0)
+        eintrag = {
+            'anzahl': len(werte),
+            'p50_ms': round(perzentil(werte, 50), 1),
+            'p95_ms': round(perzentil(werte, 95), 1),
+            'p99_ms': round(perzentil(werte, 99), 1),
+            'fehlerquote': round(fehler / len(werte), 4)
+        }
+        ergebnis['routen'][route] = eintrag
+        print(f"{route:<16} {eintrag['anzahl']:>7} {eintrag['p50_ms']:>9} {eintrag['p95_ms']:>9} "
+              f"{eintrag['p99_ms']:>9} {eintrag['fehlerquote']:>8.2%}")
+    if ttft:
+        ergebnis['erstes_token_p50_ms'] = round(perzentil(ttft, 50), 1)
+        ergebnis['erstes_token_p95_ms'] = round(perzentil(ttft, 95), 1)
+        print(f"Erstes Token (Stream): p50 {ergebnis['erstes_token_p50_ms']} ms, "
+              f"p95 {ergebnis['erstes_token_p95_ms']} ms")
+
+    anfragen = sum(len(w) for w in messung.latenzen.values())
+    ergebnis['durchsatz_pro_s'] = round(anfragen / dauer, 1) if dauer else 0.0
+    print(f"Durchsatz: {ergebnis['durchsatz_pro_s']} Anfragen/s")
+    if upstream:
+        zuege = max(1, messung.chat_zuege)
+        ergebnis['upstream'] = upstream
+        ergebnis['prompt_tokens_pro_zug'] = round(upstream['prompt_tokens'] / zuege, 1)
+        print(f"Upstream-Aufrufe: {upstream['anfragen']}, Prompt-Tokens pro Chat-Zug: "
+              f"{ergebnis['prompt_tokens_pro_zug']}")
+    if prozesse:
+        ergebnis['prozesse'] = prozesse
+        print(f"\n{'PID':>8} {'Rolle':<7} {'CPU ø %':>8} {'CPU max':>8} {'RSS MB':>8} {'PSS MB':>8} {'USS MB':>8}")
+        for pid, p in sorted(prozesse.items()):
+            print(f"{pid:>8} {p['rolle']:<7} {p['cpu_mittel_prozent']:>8} {p['cpu_max_prozent']:>8} "
+                  f"{p['rss_max_mb']:>8} {p['pss_max_mb']:>8} {p['uss_max_mb']:>8}")
+    return ergebnis
+
+
+def vergleichen(ergebnis, baseline, toleranz):
+    """
+    Vergleicht mit einer gespeicherten Baseline.
+
+    Returns:
+        list: Beschreibungen der Regressionen (leer = alles im Rahmen)
+    """
+    regressionen = []
+    alt = baseline.get('durchsatz_pro_s', 0)
+    neu = ergebnis['durchsatz_pro_s']
+    print(f"\nVergleich mit Baseline (Toleranz {toleranz:.0%}):")
+    print(f"  Durchsatz: {alt} -> {neu} Anfragen/s")
+    if alt and neu < alt * (1 - toleranz):
+        regressionen.append(f"Durchsatz {neu} < {alt} (-{1 - neu / alt:.0%})")
+    for route, werte in ergebnis['routen'].items():
+        basis = baseline.get('routen', {}).get(route)
+        if not basis:
+            continue
+        print(f"  {route}: p95 {basis['p95_ms']} -> {werte['p95_ms']} ms, "
+              f"Fehler {basis['fehlerquote']:.2%} -> {werte['fehlerquote']:.2%}")
+        if basis['p95_ms'] and werte['p95_ms'] > basis['p95_ms'] * (1 + toleranz):
+            regressionen.append(f"{route} p95 {werte['p95_ms']} ms > {basis['p95_ms']} ms "
+                                f"(+{werte['p95_ms'] / basis['p95_ms'] - 1:.0%})")
+        if werte['fehlerquote'] > basis['fehlerquote'] + 0.01:
+            regressionen.append(f"{route} Fehlerquote {werte['fehlerquote']:.2%}")
+    return regressionen
+
+
+def py_spy_starten(master_pid, dauer, ziel):
+    if not shutil.which('py-spy'):
+        print("py-spy nicht gefunden, kein Flamegraph")
+        return []
+    prozesse = []
+    for pid in ProzessMessung._kinder(master_pid):
+        datei = os.path.join(ziel, f"profil-{pid}.svg")
+        prozesse.append(subprocess.Popen(
+            ['py-spy', 'record', '--pid', str(pid), '--duration', str(int(dauer)), '--nonblocking', '-o', datei],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        ))
+        print(f"py-spy: Flamegraph für Worker {pid} -> {datei}")
+    return prozesse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Lasttest der Tutor-Routen gegen gunicorn und einen Mock-LLM')
+    parser.add_argument('--profil', choices=sorted(PROFILE), default='klasse')
+    parser.add_argument('--schueler', type=int, help='Überschreibt das Profil')
+    parser.add_argument('--zuege', type=int, help='Chat-Züge pro Schüler (überschreibt das Profil)')
+    parser.add_argument('--denkzeit-ms', type=float, help='Pause zwischen Zügen (überschreibt das Profil)')
+    parser.add_argument('--anlauf-s', type=float, help='Schüler verteilt über so viele Sekunden starten')
+    parser.add_argument('--stream', action='store_true', help='/chat/stream statt /chat verwenden')
+    parser.add_argument('--transkripte', help='JSON {thema_id: {konzept: [züge]}}')
+    parser.add_argument('--url', help='Laufende App testen statt gunicorn zu starten, z.B. http://127.0.0.1:5000')
+    parser.add_argument('--latenz-ms', type=float, default=300.0)
+    parser.add_argument('--ms-pro-token', type=float, default=5.0)
+    parser.add_argument('--fehlerquote', type=float, default=0.0)
+    parser.add_argument('--py-spy', action='store_true', help='Flamegraph pro Worker mit py-spy aufnehmen')
+    parser.add_argument('--json', help='Ergebnis (inkl. Prozessverlauf) als JSON speichern')
+    parser.add_argument('--vergleich', help='Baseline-Datei; Exit-Code 1 bei Regression')
+    parser.add_argument('--toleranz', type=float, default=0.15)
+    parser.add_argument('--baseline-schreiben', help='Ergebnis als Baseline für dieses Profil speichern')
+    args = parser.parse_args(argv)
+
+    for name, wert in PROFILE[args.profil].items():
+        if getattr(args, name, None) is None:
+            setattr(args, name, wert)
+
+    arbeitsverzeichnis = tempfile.mkdtemp(prefix='lasttest-')
+    prozesse = []
+    prozess_messung = None
+    upstream = None
+    mock_port = None
+    try:
+        if args.url:
+            ziel = urllib.request.urlparse(args.url)
+            host, port = ziel.hostname, ziel.port or 80
+        else:
+            mock_port = freier_port()
+            prozesse.append(subprocess.Popen(
+                [sys.executable, os.path.join(BENCH_VERZEICHNIS, 'mock_openai.py'), '--port', str(mock_port),
+                 '--latenz-ms', str(args.latenz_ms), '--ms-pro-token', str(args.ms_pro_token),
+                 '--fehlerquote', str(args.fehlerquote), '--seed', '1'],
+                stdout=subprocess.DEVNULL
+            ))
+            host, port = '127.0.0.1', freier_port()
+            umgebung = dict(
+                os.environ,
+                PORT=str(port),
+                OPENAI_API_KEY='mock',
+                OPENAI_BASE_URL=f"http://127.0.0.1:{mock_port}/v1",
+                LIMIT_ANFRAGEN_PRO_MINUTE='1000000',
+                LIMIT_TOKENS_PRO_MINUTE='1000000000',
+                SESSION_BACKEND=os.environ.get('SESSION_BACKEND', 'sqlite'),
+                SESSION_DB=os.path.join(arbeitsverzeichnis, 'sessions.db'),
+                SCHEDULER_DB=os.path.join(arbeitsverzeichnis, 'scheduler.db'),
+                FORTSCHRITT_DB=os.path.join(arbeitsverzeichnis, 'fortschritt.db'),
+                SECRET_KEY_DATEI=os.path.join(arbeitsverzeichnis, 'secret_key'),
+                GUNICORN_MAX_REQUESTS='0'
+            )
+            gunicorn = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--access-logfile', '/dev/null',
+                 'app:app'],
+                cwd=REPO_VERZEICHNIS, env=umgebung
+            )
+            prozesse.append(gunicorn)
+            warten_bis_bereit(f"http://127.0.0.1:{mock_port}/v1/statistik", prozesse[0])
+            warten_bis_bereit(f"http://{host}:{port}/bereit", gunicorn)
+            if os.path.exists('/proc/self/smaps_rollup'):
+                prozess_messung = ProzessMessung(gunicorn.pid)
+            if args.py_spy:
+                geschaetzt = args.anlauf_s + args.zuege * (args.denkzeit_ms / 1000 + args.latenz_ms / 1000 + 0.5)
+                prozesse.extend(py_spy_starten(gunicorn.pid, geschaetzt, os.getcwd()))
+
+        messung, ttft, dauer = asyncio.run(last_erzeugen(args, host, port, prozess_messung))
+        if mock_port:
+            upstream = mock_statistik(mock_port)
+        ergebnis = bericht(args, messung, ttft, dauer, upstream,
+                           prozess_messung.zusammenfassung() if prozess_messung else None)
+    finally:
+        for prozess in reversed(prozesse):
+            if prozess.poll() is None:
+                prozess.terminate()
+        for prozess in prozesse:
+            try:
+                prozess.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                prozess.kill()
+        shutil.rmtree(arbeitsverzeichnis, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(dict(ergebnis, prozess_verlauf=[
+                {'t': round(t - prozess_messung.verlauf[0][0], 2), 'prozesse': {str(k): v for k, v in stand.items()}}
+                for t, stand in prozess_messung.verlauf
+            ] if prozess_messung else []), f, ensure_ascii=False, indent=2)
+
+    if args.baseline_schreiben:
+        baselines = {}
+        if os.path.exists(args.baseline_schreiben):
+            with open(args.baseline_schreiben, encoding='utf-8') as f:
+                baselines = json.load(f)
+        baselines[args.profil + ('-stream' if args.stream else '')] = ergebnis
+        with open(args.baseline_schreiben, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline für {args.profil} gespeichert: {args.baseline_schreiben}")
+
+    if args.vergleich:
+        with open(args.vergleich, encoding='utf-8') as f:
+            baseline = json.load(f).get(args.profil + ('-stream' if args.stream else ''))
+        if baseline is None:
+            print(f"Keine Baseline für {args.profil} in {args.vergleich}")
+            return 2
+        regressionen = vergleichen(ergebnis, baseline, args.toleranz)
+        if regressionen:
+            print("\nREGRESSION:")
+            for r in regressionen:
+                print(f"  - {r}")
+            return 1
+        print("\nKeine Regression.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
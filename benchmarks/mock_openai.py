@@ -0,0 +1,212 @@
+# benchmarks/mock_openai.py
+# Lokaler Mock für /v1/chat/completions mit einstellbarer Latenz
+
+"""
+Beantwortet Chat-Completions im Format des Tutors, ohne echte API-Kosten.
+Latenz (Grundlatenz + Zeit pro Ausgabe-Token), Antwortlänge, Fehlerquote
+und die Wahrscheinlichkeit für "konzept_verstanden" sind einstellbar.
+Unterstützt auch stream=True (Server-Sent Events wie die echte API).
+
+Einzeln starten:
+    python benchmarks/mock_openai.py --port 8001 --latenz-ms 300
+und die App mit OPENAI_BASE_URL=http://127.0.0.1:8001/v1 betreiben.
+GET /statistik liefert Anfragen und Tokens seit dem Start als JSON.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WOERTER = ("Was denkst du denn , woraus die DNA aufgebaut ist ? Überlege mal , "
+           "welche Bausteine sich immer wiederholen und wie sie verbunden sind .").split()
+
+
+class MockEinstellungen:
+    def __init__(self, latenz_ms=300.0, ms_pro_token=10.0, jitter_ms=50.0, ausgabe_tokens=60,
+                 fehlerquote=0.0, verstanden_quote=0.25, seed=None):
+        self.latenz_ms = latenz_ms
+        self.ms_pro_token = ms_pro_token
+        self.jitter_ms = jitter_ms
+        self.ausgabe_tokens = ausgabe_tokens
+        self.fehlerquote = fehlerquote
+        self.verstanden_quote = verstanden_quote
+        self.zufall = random.Random(seed)
+
+
+class MockStatistik:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.anfragen = 0
+        self.fehler = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def als_dict(self):
+        with self.lock:
+            return {
+                'anfragen': self.anfragen,
+                'fehler': self.fehler,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens
+            }
+
+
+def _schaetze_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def _antwort_text(einstellungen, messages):
+    z = einstellungen.zufall
+    if messages and messages[0]['content'].startswith('Du fasst'):
+        return "Der Schüler kennt die Grundbegriffe, verwechselt aber noch Basen und Nukleotide."
+    woerter = [z.choice(WOERTER) for _ in range(max(1, einstellungen.ausgabe_tokens - 30))]
+    zeige_bild = z.random() < 0.2
+    return json.dumps({
+        "nachricht": " ".join(woerter),
+        "hilfe_stufe": z.randint(1, 4),
+        "zeige_bild": zeige_bild,
+        "bild_thema": "basen" if zeige_bild else None,
+        "konzept_verstanden": z.random() < einstellungen.verstanden_quote,
+        "gebe_quellen": False,
+        "frustration_erkannt": False
+    }, ensure_ascii=False)
+
+
+def erstelle_handler(einstellungen, statistik):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def handle(self):
+            try:
+                super().handle()
+            except (ConnectionResetError, BrokenPipeError):
+                pass  # Client hat die Keep-Alive-Verbindung einfach geschlossen
+
+        def _senden(self, status, daten, header=None):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(daten)))
+            for name, wert in (header or {}).items():
+                self.send_header(name, wert)
+            self.end_headers()
+            self.wfile.write(daten)
+
+        def do_GET(self):
+            if self.path.rstrip('/').endswith('/statistik'):
+                self._senden(200, json.dumps(statistik.als_dict()).encode())
+            else:
+                self._senden(404, b'{"error": {"message": "not found"}}')
+
+        def do_POST(self):
+            laenge = int(self.headers.get('Content-Length', 0))
+            anfrage = json.loads(self.rfile.read(laenge) or b'{}')
+            messages = anfrage.get('messages', [])
+
+            if einstellungen.zufall.random() < einstellungen.fehlerquote:
+                with statistik.lock:
+                    statistik.anfragen += 1
+                    statistik.fehler += 1
+                self._senden(429, b'{"error": {"message": "rate limited (mock)"}}', {'Retry-After': '0.2'})
+                return
+
+            text = _antwort_text(einstellungen, messages)
+            prompt_tokens = sum(_schaetze_tokens(m.get('content', '')) + 4 for m in messages)
+            completion_tokens = _schaetze_tokens(text)
+            with statistik.lock:
+                statistik.anfragen += 1
+                statistik.prompt_tokens += prompt_tokens
+                statistik.completion_tokens += completion_tokens
+
+            latenz = (einstellungen.latenz_ms
+                      + einstellungen.zufall.uniform(-1, 1) * einstellungen.jitter_ms) / 1000.0
+            pro_token = einstellungen.ms_pro_token / 1000.0
+            usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                     'total_tokens': prompt_tokens + completion_tokens}
+
+            if anfrage.get('stream'):
+                self._streamen(text, max(0.0, latenz), pro_token)
+                return
+
+            time.sleep(max(0.0, latenz) + completion_tokens * pro_token)
+            self._senden(200, json.dumps({
+                'id': 'mock', 'object': 'chat.completion', 'created': int(time.time()),
+                'model': anfrage.get('model', 'mock'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                             'finish_reason': 'stop'}],
+                'usage': usage
+            }).encode())
+
+        def _streamen(self, text, latenz, pro_token):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+
+            def schreiben(daten):
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(daten), daten))
+                self.wfile.flush()
+
+            time.sleep(latenz)
+            for i in range(0, len(text), 4):
+                stueck = {'id': 'mock', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                          'model': 'mock',
+                          'choices': [{'index': 0, 'delta': {'content': text[i:i + 4]}, 'finish_reason': None}]}
+                schreiben(f"data: {json.dumps(stueck)}\n\n".encode())
+                time.sleep(pro_token)
+            schreiben(b'data: [DONE]\n\n')
+            self.wfile.write(b'0\r\n\r\n')
+
+    return Handler
+
+
+class _MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Unter Last öffnen die Worker viele Verbindungen gleichzeitig
+    request_queue_size = 256
+
+
+def starte_mock(port=0, einstellungen=None):
+    """
+    Startet den Mock-Server in einem Hintergrund-Thread.
+
+    Returns:
+        tuple: (server, statistik) - die URL ist http://127.0.0.1:<server.server_port>/v1
+    """
+    einstellungen = einstellungen or MockEinstellungen()
+    statistik = MockStatistik()
+    server = _MockServer(('127.0.0.1', port), erstelle_handler(einstellungen, statistik))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, statistik
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock für die OpenAI Chat-Completions-API')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latenz-ms', type=float, default=300.0)
+    parser.add_argument('--ms-pro-token', type=float, default=10.0)
+    parser.add_argument('--ausgabe-tokens', type=int, default=60)
+    parser.add_argument('--fehlerquote', type=float, default=0.0)
+    parser.add_argument('--verstanden-quote', type=float, default=0.25)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    server, _ = starte_mock(args.port, MockEinstellungen(
+        latenz_ms=args.latenz_ms, ms_pro_token=args.ms_pro_token, ausgabe_tokens=args.ausgabe_tokens,
+        fehlerquote=args.fehlerquote, verstanden_quote=args.verstanden_quote, seed=args.seed
+    ))
+    print(f"Mock-OpenAI läuft auf http://127.0.0.1:{server.server_port}/v1", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# benchmarks/schnellpfad_bericht.py
+# Präzision und Abdeckung des lokalen Absicht-Klassifikators je Schwelle
+
+"""
+Kreuzvalidierung über schnellpfad_beispiele.yaml: das Modell wird jeweils
+ohne einen Teil der Beispiele trainiert und auf diesem Teil geprüft
+(die Regeln gelten immer).
+
+- Abdeckung: Anteil aller Nachrichten, die lokal beantwortet würden
+- Präzision: Anteil der lokal beantworteten, deren Absicht stimmt
+- falsch lokal: inhaltliche Nachrichten ("sonstiges"), die trotzdem eine
+  Vorlagen-Antwort bekämen - der teure Fehler
+- Regeln: wie viele Nachrichten schon die festen Regeln abfangen; falsche
+  Regeltreffer stehen bei den Fehlzuordnungen (Konfidenz 1.0)
+
+Mit --daten lässt sich zusätzlich ein eigener, gelabelter Satz prüfen
+(JSON-Lines mit {"text": ..., "absicht": ...}, z.B. aus echten Chats),
+dann wird auf allen Beispielen trainiert.
+
+Aufruf (aus dem Projektverzeichnis):
+    python benchmarks/schnellpfad_bericht.py
+    python benchmarks/schnellpfad_bericht.py --daten gelabelt.jsonl --schwellen 0.8 0.9 0.95
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schnellpfad import AbsichtModell, Schnellpfad, BEANTWORTBAR, beispiele_laden  # noqa: E402
+
+SCHWELLEN = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98)
+
+
+def vorhersagen_sammeln(beispiele, falten):
+    """[(wahre absicht, vorhergesagte absicht, konfidenz, quelle), ...] per k-facher Kreuzvalidierung"""
+    gemischt = list(beispiele)
+    random.Random(1).shuffle(gemischt)
+    ergebnisse = []
+    for f in range(falten):
+        test = gemischt[f::falten]
+        training = [b for i, b in enumerate(gemischt) if i % falten != f]
+        pfad = Schnellpfad(AbsichtModell.trainieren(training))
+        for text, absicht in test:
+            ergebnisse.append((absicht,) + pfad.klassifizieren(text))
+    return ergebnisse
+
+
+def auswerten(ergebnisse, schwellen):
+    print(f"{'Schwelle':>9} {'Abdeckung':>10} {'Präzision':>10} {'falsch lokal':>13} {'davon Modell':>13}")
+    for schwelle in schwellen:
+        lokal = [e for e in ergebnisse if e[1] in BEANTWORTBAR and e[2] >= schwelle]
+        richtig = sum(1 for e in lokal if e[0] == e[1])
+        falsch_lokal = sum(1 for e in lokal if e[0] not in BEANTWORTBAR)
+        modell = sum(1 for e in lokal if e[3] == 'modell')
+        print(f"{schwelle:>9.2f} {len(lokal) / len(ergebnisse):>10.1%} "
+              f"{richtig / len(lokal) if lokal else 1.0:>10.1%} {falsch_lokal:>13} {modell:>13}")
+
+
+def fehler_zeigen(ergebnisse, schwelle, texte):
+    print(f"\nFehlzuordnungen bei Schwelle {schwelle}:")
+    for (absicht, vorhersage, konfidenz, quelle), text in zip(ergebnisse, texte):
+        if vorhersage in BEANTWORTBAR and konfidenz >= schwelle and absicht != vorhersage:
+            print(f"  {text!r}: {absicht} -> {vorhersage} ({konfidenz:.2f}, {quelle})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Präzision/Abdeckung des Schnellpfad-Klassifikators')
+    parser.add_argument('--daten', help='Gelabelte Nachrichten als JSON-Lines {"text", "absicht"}')
+    parser.add_argument('--falten', type=int, default=5)
+    parser.add_argument('--schwellen', type=float, nargs='+', default=SCHWELLEN)
+    parser.add_argument('--fehler', type=float, default=0.9, help='Fehlzuordnungen bei dieser Schwelle zeigen')
+    args = parser.parse_args()
+
+    beispiele = beispiele_laden()
+    start = time.perf_counter()
+    modell = AbsichtModell.trainieren(beispiele)
+    print(f"{len(beispiele)} Beispiele, Training {1000 * (time.perf_counter() - start):.0f} ms")
+
+    if args.daten:
+        with open(args.daten, encoding='utf-8') as f:
+            daten = [json.loads(z) for z in f if z.strip()]
+        texte = [d['text'] for d in daten]
+        pfad = Schnellpfad(modell)
+        ergebnisse = [(d['absicht'],) + pfad.klassifizieren(d['text']) for d in daten]
+        print(f"\nEigener Datensatz ({len(daten)} Nachrichten):")
+    else:
+        texte_nach_reihenfolge = list(beispiele)
+        random.Random(1).shuffle(texte_nach_reihenfolge)
+        ergebnisse = vorhersagen_sammeln(beispiele, args.falten)
+        texte = [t for f in range(args.falten) for t, _ in texte_nach_reihenfolge[f::args.falten]]
+        print(f"\n{args.falten}-fache Kreuzvalidierung:")
+    auswerten(ergebnisse, args.schwellen)
+    fehler_zeigen(ergebnisse, args.fehler, texte)
+    regel = [e for e in ergebnisse if e[3] == 'regel']
+    print(f"\nRegeln: {len(regel)} von {len(ergebnisse)} Nachrichten, "
+          f"davon falsch {sum(1 for e in regel if e[0] != e[1])}")
+
+    pfad = Schnellpfad(modell)
+    texte_messung = [t for t, _ in beispiele] * 20
+    start = time.perf_counter()
+    for text in texte_messung:
+        pfad.klassifizieren(text)
+    dauer_us = 1e6 * (time.perf_counter() - start) / len(texte_messung)
+    print(f"\nKlassifikation: {dauer_us:.0f} µs pro Nachricht")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# bilder_pipeline.py
+# Build-Schritt für die Bilder aus image_resources.BILDER
+
+"""
+Erzeugt aus den PNGs in static/ verkleinerte, neu komprimierte Varianten
+(AVIF falls verfügbar, WebP und PNG als Fallback) mit Inhalts-Hash im
+Dateinamen und schreibt ein Manifest mit URLs und Abmessungen.
+
+Weil sich der Dateiname mit dem Inhalt ändert, können die Varianten mit
+"Cache-Control: immutable" ausgeliefert werden.
+
+Aufruf (z.B. im buildCommand):
+    python bilder_pipeline.py
+"""
+
+import hashlib
+import io
+import json
+import os
+import sys
+
+from PIL import Image, features
+
+from image_resources import BILDER, BUILD_VERZEICHNIS, MANIFEST_DATEI, STATIC_VERZEICHNIS
+
+# Zielbreiten in Pixeln; größere Originale werden nicht hochskaliert
+BREITEN = (480, 960)
+
+WEBP_QUALITAET = 80
+AVIF_QUALITAET = 55
+
+
+def _formate():
+    formate = []
+    if features.check('avif'):
+        formate.append(('image/avif', 'avif', {'quality': AVIF_QUALITAET}))
+    formate.append(('image/webp', 'webp', {'quality': WEBP_QUALITAET, 'method': 6}))
+    formate.append(('image/png', 'png', {'optimize': True}))
+    return formate
+
+
+def _schreiben(bild, stamm, breite, endung, optionen):
+    """Speichert eine Variante mit Inhalts-Hash im Namen und gibt die URL zurück."""
+    puffer = io.BytesIO()
+    if endung == 'png':
+        # Schaubilder kommen mit 256 Farben aus (wie pngquant), das spart das meiste
+        bild = bild.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+    bild.save(puffer, format=endung.upper(), **optionen)
+    daten = puffer.getvalue()
+    inhalt_hash = hashlib.sha256(daten).hexdigest()[:10]
+    name = f"{stamm}-{breite}.{inhalt_hash}.{endung}"
+    pfad = os.path.join(BUILD_VERZEICHNIS, name)
+    if not os.path.exists(pfad):
+        with open(pfad, 'wb') as f:
+            f.write(daten)
+    return f"/static/build/{name}"
+
+
+def verarbeite_bild(datei, formate):
+    """Erzeugt alle Varianten eines Bildes und gibt den Manifest-Eintrag zurück."""
+    with Image.open(os.path.join(STATIC_VERZEICHNIS, datei)) as original:
+        original.load()
+        bild = original.convert('RGBA') if original.mode not in ('RGB', 'RGBA') else original.copy()
+
+    stamm = os.path.splitext(datei)[0]
+    # Kleinere Stufen nur, wenn sie sich deutlich vom Original unterscheiden
+    breiten = [b for b in BREITEN if b < bild.width * 0.8] + [min(bild.width, BREITEN[-1])]
+    breiten = sorted(set(breiten))
+    eintrag = {'breite': bild.width, 'hoehe': bild.height, 'varianten': {}}
+
+    for breite in breiten:
+        hoehe = round(bild.height * breite / bild.width)
+        skaliert = bild if breite == bild.width else bild.resize((breite, hoehe), Image.LANCZOS)
+        for mime, endung, optionen in formate:
+            url = _schreiben(skaliert, stamm, breite, endung, optionen)
+            eintrag['varianten'].setdefault(mime, []).append({'url': url, 'breite': breite})
+
+    # Größte PNG-Variante als <img src>-Fallback
+    eintrag['fallback'] = eintrag['varianten']['image/png'][-1]['url']
+    return eintrag
+
+
+def main():
+    os.makedirs(BUILD_VERZEICHNIS, exist_ok=True)
+    formate = _formate()
+    manifest = {}
+    fehlend = []
+
+    dateien = sorted({info['datei'] for thema in BILDER.values() for info in thema.values()})
+    for datei in dateien:
+        if not os.path.exists(os.path.join(STATIC_VERZEICHNIS, datei)):
+            fehlend.append(datei)
+            continue
+        manifest[datei] = verarbeite_bild(datei, formate)
+        vorher = os.path.getsize(os.path.join(STATIC_VERZEICHNIS, datei))
+        print(f"{datei}: {vorher // 1024} KB -> {', '.join(m.split('/')[1] for m in manifest[datei]['varianten'])}")
+
+    with open(MANIFEST_DATEI, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"Manifest mit {len(manifest)} Bildern geschrieben: {MANIFEST_DATEI}")
+
+    for datei in fehlend:
+        print(f"WARNUNG: {datei} aus BILDER fehlt in static/", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+# fortschritt.py
+# Dauerhafter Lernfortschritt mit gepuffertem Schreiben (write-behind)
+
+"""
+Punkte, Thema, Konzept und Versuche hängen sonst nur an der Session und
+sind beim Wechsel des Browsers weg. Hier landen sie dauerhaft in SQLite
+(WAL), zugeordnet über Klassencode + Name. Ohne Klassencode wird nichts
+gespeichert, der Name allein ist nicht eindeutig.
+
+Der Hot-Path legt nur ein Ereignis in einen Puffer im Speicher; ein
+Hintergrund-Thread schreibt die Ereignisse gesammelt in einer Transaktion
+und pflegt dabei die Übersichtstabellen gleich mit:
+
+- ereignisse:         Rohdaten (start, zug, wechsel), nach Klasse/Zeit indiziert
+- lernende:           aktueller Stand pro Schüler (für die Wiederaufnahme)
+- konzept_statistik:  Züge, verstandene Konzepte und Versuche pro Klasse/Konzept
+
+Auswertungen für Lehrkräfte lesen nur die Übersichtstabellen.
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from semantik_cache import normalisieren
+
+
+def lernender_id(klasse, name):
+    """
+    Schlüssel eines Schülers: Klassencode + Name, unabhängig von Groß-/Kleinschreibung.
+
+    Returns:
+        str oder None: ohne Klassencode None - der Name allein ist nicht
+        eindeutig, gleichnamige Schüler würden sich den Fortschritt teilen
+    """
+    klasse = normalisieren(klasse or '')
+    if not klasse:
+        return None
+    return f"{klasse}:{normalisieren(name)}"
+
+
+class FortschrittStore:
+    """SQLite-Fortschrittsspeicher; schreiben() blockiert nie auf der Platte."""
+
+    def __init__(self, pfad, batch_groesse=200, intervall=1.0, max_puffer=50000):
+        self.pfad = pfad
+        self.batch_groesse = batch_groesse
+        self.intervall = intervall
+        self.max_puffer = max_puffer
+        self.verworfen = 0
+        self.geschrieben = 0
+        self._zuruecksetzen()
+        # Ein Worker, der nach dem fork weiterschreibt, braucht eigenen Puffer und Thread
+        os.register_at_fork(after_in_child=self._zuruecksetzen)
+        atexit.register(self.leeren)
+        db = self._db()
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS ereignisse (
+                id INTEGER PRIMARY KEY,
+                zeit REAL NOT NULL,
+                lernender TEXT NOT NULL,
+                klasse TEXT NOT NULL,
+                art TEXT NOT NULL,
+                thema TEXT NOT NULL,
+                konzept TEXT NOT NULL,
+                punkte INTEGER NOT NULL,
+                versuche INTEGER NOT NULL,
+                verstanden INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_ereignisse_klasse ON ereignisse (klasse, zeit);
+            CREATE INDEX IF NOT EXISTS idx_ereignisse_lernender ON ereignisse (lernender, zeit);
+
+            CREATE TABLE IF NOT EXISTS lernende (
+                lernender TEXT PRIMARY KEY,
+                klasse TEXT NOT NULL,
+                name TEXT NOT NULL,
+                punkte INTEGER NOT NULL,
+                thema TEXT NOT NULL,
+                konzept_index INTEGER NOT NULL,
+                konzept TEXT NOT NULL,
+                versuche INTEGER NOT NULL,
+                verstandene_konzepte INTEGER NOT NULL DEFAULT 0,
+                zuletzt REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_lernende_klasse ON lernende (klasse, punkte);
+
+            CREATE TABLE IF NOT EXISTS konzept_statistik (
+                klasse TEXT NOT NULL,
+                thema TEXT NOT NULL,
+                konzept TEXT NOT NULL,
+                zuege INTEGER NOT NULL DEFAULT 0,
+                verstanden INTEGER NOT NULL DEFAULT 0,
+                versuche_bis_verstanden INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (klasse, thema, konzept)
+            );
+            CREATE INDEX IF NOT EXISTS idx_konzept_statistik_konzept ON konzept_statistik (thema, konzept);
+        """)
+
+    def _zuruecksetzen(self):
+        self._lokal = threading.local()
+        self._puffer = deque()
+        self._lock = threading.Lock()
+        self._signal = threading.Event()
+        self._thread = None
+
+    def _db(self):
+        db = getattr(self._lokal, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.pfad, timeout=10, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._lokal.db = db
+        return db
+
+    def schreiben(self, art, lernender, klasse, name, thema, konzept_index, konzept, punkte, versuche,
+                  verstanden=False):
+        """
+        Legt ein Ereignis in den Puffer; geschrieben wird im Hintergrund.
+
+        Args:
+            konzept_index (int): Stand nach dem Ereignis (für die Wiederaufnahme)
+            konzept (str): Konzept, um das es in diesem Zug ging
+            versuche (int): Versuche zu diesem Konzept bis einschließlich dieses Zugs
+        """
+        ereignis = (time.time(), lernender, klasse, name, art, thema, konzept_index, konzept,
+                    punkte, versuche, int(bool(verstanden)))
+        with self._lock:
+            if len(self._puffer) >= self.max_puffer:
+                # Platte hängt hinterher: lieber alte Ereignisse verlieren als Speicher
+                self._puffer.popleft()
+                self.verworfen += 1
+            self._puffer.append(ereignis)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._schleife, name='fortschritt', daemon=True)
+                self._thread.start()
+            voll = len(self._puffer) >= self.batch_groesse
+        if voll:
+            self._signal.set()
+
+    def _schleife(self):
+        while True:
+            self._signal.wait(self.intervall)
+            self._signal.clear()
+            try:
+                self.leeren()
+            except Exception as e:
+                print(f"Fehler beim Schreiben des Fortschritts: {str(e)}")
+                time.sleep(self.intervall)
+
+    def leeren(self):
+        """Schreibt alle gepufferten Ereignisse (auch beim Beenden des Prozesses)."""
+        while True:
+            with self._lock:
+                if not self._puffer:
+                    return
+                batch = [self._puffer.popleft() for _ in range(min(len(self._puffer), self.batch_groesse))]
+            try:
+                self._batch_schreiben(batch)
+            except Exception:
+                # Zurück an den Anfang des Puffers, nächster Versuch im nächsten Intervall
+                with self._lock:
+                    self._puffer.extendleft(reversed(batch))
+                raise
+            self.geschrieben += len(batch)
+
+    def _batch_schreiben(self, batch):
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(
+                'INSERT INTO ereignisse (zeit, lernender, klasse, art, thema, konzept, punkte, versuche, verstanden) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(e[0], e[1], e[2], e[4], e[5], e[7], e[8], e[9], e[10]) for e in batch]
+            )
+            db.executemany(
+                """INSERT INTO lernende (lernender, klasse, name, punkte, thema, konzept_index, konzept,
+                                         versuche, verstandene_konzepte, zuletzt)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (lernender) DO UPDATE SET
+                       name = excluded.name, punkte = excluded.punkte, thema = excluded.thema,
+                       konzept_index = excluded.konzept_index, konzept = excluded.konzept,
+                       versuche = excluded.versuche,
+                       verstandene_konzepte = verstandene_konzepte + excluded.verstandene_konzepte,
+                       zuletzt = excluded.zuletzt""",
+                [(e[1], e[2], e[3], e[8], e[5], e[6], e[7], e[9], e[10], e[0]) for e in batch]
+            )
+            zuege = [e for e in batch if e[4] == 'zug']
+            db.executemany(
+                """INSERT INTO konzept_statistik (klasse, thema, konzept, zuege, verstanden, versuche_bis_verstanden)
+                   VALUES (?, ?, ?, 1, ?, ?)
+                   ON CONFLICT (klasse, thema, konzept) DO UPDATE SET
+                       zuege = zuege + 1,
+                       verstanden = verstanden + excluded.verstanden,
+                       versuche_bis_verstanden = versuche_bis_verstanden + excluded.versuche_bis_verstanden""",
+                [(e[2], e[5], e[7], e[10], e[9] if e[10] else 0) for e in zuege]
+            )
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+
+    def stand(self, lernender):
+        """
+        Zuletzt gespeicherter Stand eines Schülers.
+
+        Returns:
+            dict oder None: punkte, thema, konzept_index
+        """
+        with self._lock:
+            # Noch nicht geschriebene Ereignisse sind neuer als die Datenbank
+            for e in reversed(self._puffer):
+                if e[1] == lernender:
+                    return {'punkte': e[8], 'thema': e[5], 'konzept_index': e[6]}
+        zeile = self._db().execute(
+            'SELECT punkte, thema, konzept_index FROM lernende WHERE lernender = ?', (lernender,)
+        ).fetchone()
+        if zeile is None:
+            return None
+        return {'punkte': zeile[0], 'thema': zeile[1], 'konzept_index': zeile[2]}
+
+    def klassen_uebersicht(self, klasse):
+        """Schüler und Konzepte einer Klasse, nur aus den Übersichtstabellen."""
+        db = self._db()
+        lernende = [
+            {
+                'name': z[0], 'punkte': z[1], 'thema': z[2], 'zuletzt_konzept': z[3],
+                'verstandene_konzepte': z[4], 'zuletzt': z[5]
+            }
+            for z in db.execute(
+                'SELECT name, punkte, thema, konzept, verstandene_konzepte, zuletzt FROM lernende '
+                'WHERE klasse = ? ORDER BY punkte DESC', (klasse,)
+            )
+        ]
+        konzepte = [
+            {
+                'thema': z[0], 'konzept': z[1], 'zuege': z[2], 'verstanden': z[3],
+                'versuche_bis_verstanden': round(z[4] / z[3], 2) if z[3] else None
+            }
+            for z in db.execute(
+                'SELECT thema, konzept, zuege, verstanden, versuche_bis_verstanden FROM konzept_statistik '
+                'WHERE klasse = ? ORDER BY thema, konzept', (klasse,)
+            )
+        ]
+        return {'klasse': klasse, 'lernende': lernende, 'konzepte': konzepte}
+
+    def konzept_uebersicht(self, thema=None):
+        """Züge und Verständnis pro Konzept über alle Klassen."""
+        sql = ('SELECT thema, konzept, SUM(zuege), SUM(verstanden), SUM(versuche_bis_verstanden) '
+               'FROM konzept_statistik')
+        parameter = ()
+        if thema:
+            sql += ' WHERE thema = ?'
+            parameter = (thema,)
+        sql += ' GROUP BY thema, konzept ORDER BY thema, konzept'
+        return [
+            {
+                'thema': z[0], 'konzept': z[1], 'zuege': z[2], 'verstanden': z[3],
+                'versuche_bis_verstanden': round(z[4] / z[3], 2) if z[3] else None
+            }
+            for z in self._db().execute(sql, parameter)
+        ]
+
+    def metriken(self):
+        return {'puffer': len(self._puffer), 'geschrieben': self.geschrieben, 'verworfen': self.verworfen}
+
+
+def erstelle_fortschritt_store():
+    """FORTSCHRITT=0 schaltet ab, FORTSCHRITT_DB wählt die Datei."""
+    if os.environ.get('FORTSCHRITT', '1') == '0':
+        return None
+    return FortschrittStore(
+        os.environ.get('FORTSCHRITT_DB', 'fortschritt.db'),
+        batch_groesse=int(os.environ.get('FORTSCHRITT_BATCH', 200)),
+        intervall=float(os.environ.get('FORTSCHRITT_INTERVALL', 1.0))
+    )
@@ -0,0 +1,180 @@
+# frontend.py
+# Vorab gerenderte Startseite, minifizierte Assets und Antwort-Kompression
+
+"""
+Die Startseite hängt nur vom Lehrplan ab und wird daher einmal gerendert
+(und erst nach einer Lehrplan-Änderung neu), nicht bei jedem Aufruf.
+CSS und JS liegen als Quellen in static/app.css und static/app.js; beim
+Start werden sie minifiziert und mit Inhalts-Hash im Namen nach
+static/build/ geschrieben, zusammen mit vorkomprimierten .gz- und
+.br-Varianten. Die Startseite trägt ein ETag, wiederholte Besuche
+bekommen 304.
+
+Dynamische HTML- und JSON-Antworten werden je nach Accept-Encoding mit
+brotli (falls installiert) oder gzip komprimiert. Gestreamte Antworten
+(SSE) bleiben unkomprimiert, jedes Ereignis soll sofort beim Schüler sein.
+
+Aufruf als Build-Schritt (optional, passiert sonst beim Start):
+    python frontend.py
+"""
+
+import gzip
+import hashlib
+import os
+import re
+import threading
+
+try:
+    import brotli
+except ImportError:  # dann nur gzip
+    brotli = None
+
+from image_resources import BUILD_VERZEICHNIS, STATIC_VERZEICHNIS
+
+ASSETS = {'css': 'app.css', 'js': 'app.js'}
+
+# Kleine Antworten lohnen das Komprimieren nicht (Header-Overhead, CPU)
+KOMPRIMIERUNG_MIN_BYTES = int(os.environ.get('KOMPRIMIERUNG_MIN_BYTES', 512))
+KOMPRIMIERBAR = frozenset((
+    'text/html', 'application/json', 'text/css', 'text/javascript', 'application/javascript', 'text/plain'
+))
+
+# Dynamische Antworten: schnelle Stufen; vorkomprimierte Dateien: maximale
+GZIP_STUFE = 6
+BROTLI_STUFE = 5
+
+
+def css_minimieren(css):
+    """Entfernt Kommentare und überflüssige Leerzeichen."""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r'([{;])\s*([\w-]+)\s*:\s*', r'\1\2:', css)
+    return css.replace(';}', '}').strip()
+
+
+def js_minimieren(js):
+    """
+    Konservativ: Einrückung, Leerzeilen und ganze Kommentarzeilen fallen weg.
+
+    Zeilenumbrüche bleiben stehen, damit die automatische Semikolon-Einfügung
+    von JavaScript genauso greift wie im Quelltext; den Rest erledigt gzip.
+    """
+    zeilen = (zeile.strip() for zeile in js.splitlines())
+    return '\n'.join(z for z in zeilen if z and not z.startswith('//'))
+
+
+def html_minimieren(html):
+    """Einrückung, Leerzeilen und HTML-Kommentare entfernen."""
+    html = re.sub(r'<!--(?!\[).*?-->', '', html, flags=re.S)
+    zeilen = (zeile.strip() for zeile in html.splitlines())
+    return '\n'.join(z for z in zeilen if z)
+
+
+def komprimieren(daten, kodierung, maximal=False):
+    if kodierung == 'br':
+        return brotli.compress(daten, quality=11 if maximal else BROTLI_STUFE)
+    # mtime=0: gleiche Eingabe, gleiche Bytes (stabile ETags und Dateien)
+    return gzip.compress(daten, compresslevel=9 if maximal else GZIP_STUFE, mtime=0)
+
+
+def kodierung_waehlen(accept_encodings):
+    """Bevorzugt br vor gzip; None, wenn der Client keins von beiden annimmt."""
+    if brotli is not None and accept_encodings.quality('br') > 0:
+        return 'br'
+    if accept_encodings.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def _atomar_schreiben(pfad, daten):
+    if os.path.exists(pfad):
+        return
+    tmp = f"{pfad}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(daten)
+    os.replace(tmp, pfad)
+
+
+def assets_bauen(quelle=STATIC_VERZEICHNIS, ziel=BUILD_VERZEICHNIS):
+    """
+    Minifiziert CSS/JS und schreibt sie mit Inhalts-Hash plus .gz/.br nach ziel.
+
+    Returns:
+        dict: {'css': url, 'js': url} für das Template
+    """
+    os.makedirs(ziel, exist_ok=True)
+    urls = {}
+    for art, datei in ASSETS.items():
+        with open(os.path.join(quelle, datei), encoding='utf-8') as f:
+            text = f.read()
+        daten = (css_minimieren(text) if art == 'css' else js_minimieren(text)).encode('utf-8')
+        stamm, endung = os.path.splitext(datei)
+        name = f"{stamm}.{hashlib.sha256(daten).hexdigest()[:10]}{endung}"
+        pfad = os.path.join(ziel, name)
+        _atomar_schreiben(pfad, daten)
+        _atomar_schreiben(pfad + '.gz', komprimieren(daten, 'gzip', maximal=True))
+        if brotli is not None:
+            _atomar_schreiben(pfad + '.br', komprimieren(daten, 'br', maximal=True))
+        urls[art] = f"/static/build/{name}"
+    return urls
+
+
+def vorkomprimierte_datei(pfad, accept_encodings):
+    """
+    Passende .br/.gz-Variante zu einer gebauten Datei.
+
+    Returns:
+        tuple: (pfad der Variante, kodierung) oder (None, None)
+    """
+    for kodierung, endung in (('br', '.br'), ('gzip', '.gz')):
+        if accept_encodings.quality(kodierung) > 0 and os.path.exists(pfad + endung):
+            return pfad + endung, kodierung
+    return None, None
+
+
+class Startseite:
+    """Vorab gerenderte Startseite mit ETag und komprimierten Varianten pro Lehrplan-Version."""
+
+    def __init__(self, rendern):
+        """
+        Args:
+            rendern: funktion(lehrplan) -> HTML-Text; läuft nur bei neuer Lehrplan-Version
+        """
+        self._rendern = rendern
+        self._lock = threading.Lock()
+        self._version = None
+        # (etag, {kodierung (None = unkomprimiert): bytes}), wird als Ganzes ersetzt
+        self._stand = (None, {})
+
+    def fuer(self, lehrplan):
+        """Stellt sicher, dass die Seite zum Lehrplan passt; gibt sich selbst zurück."""
+        if self._version != lehrplan.version:
+            with self._lock:
+                if self._version != lehrplan.version:
+                    daten = html_minimieren(self._rendern(lehrplan)).encode('utf-8')
+                    varianten = {None: daten, 'gzip': komprimieren(daten, 'gzip', maximal=True)}
+                    if brotli is not None:
+                        varianten['br'] = komprimieren(daten, 'br', maximal=True)
+                    self._stand = (hashlib.sha256(daten).hexdigest()[:16], varianten)
+                    self._version = lehrplan.version
+        return self
+
+    def variante(self, kodierung):
+        """
+        Returns:
+            tuple: (bytes, etag) - das ETag unterscheidet sich je Kodierung
+        """
+        etag, varianten = self._stand
+        if kodierung not in varianten:
+            kodierung = None
+        return varianten[kodierung], etag + (f"-{kodierung}" if kodierung else '')
+
+    def etags(self):
+        etag, varianten = self._stand
+        return [etag] + [f"{etag}-{k}" for k in varianten if k]
+
+
+if __name__ == '__main__':
+    for art, url in assets_bauen().items():
+        print(f"{art}: {url}")
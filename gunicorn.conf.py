@@ -0,0 +1,107 @@
+# gunicorn.conf.py
+# Produktionsbetrieb mit mehreren Worker-Prozessen
+
+"""
+Start:
+    gunicorn -c gunicorn.conf.py app:app
+
+- Die App (Lehrplan, Bild-Indizes, Manifest, Prompts) wird einmal im
+  Master geladen (preload_app) und per fork an die Worker weitergegeben;
+  gc.freeze() vor dem fork hält diese Seiten copy-on-write geteilt
+- Worker- und Thread-Zahl richten sich nach den verfügbaren CPU-Kernen,
+  WEB_CONCURRENCY und GUNICORN_THREADS überschreiben das
+- Sessions liegen in SQLite, auch bei einem Worker: sie überstehen so das
+  regelmäßige Erneuern der Worker (max_requests). Bei mehreren Workern
+  liegt auch der Scheduler-Stand dort, damit jeder Worker jede Session
+  bedienen kann. Wer SESSION_BACKEND=memory setzt, bekommt keine
+  Erneuerung, sonst wären alle Sessions mitten in der Stunde weg
+- Mit gevent wird schon hier gepatcht, bevor die App Locks und
+  Bedingungsvariablen anlegt
+- Der WebSocket-Kanal (kanal.py) ist nur mit gevent standardmäßig an: eine
+  offene Verbindung kostet dort ein paar Greenlets statt eines Threads.
+  Für Tausende Verbindungen pro Worker auch das Limit offener Dateien
+  (ulimit -n) entsprechend hoch setzen
+- SCHNELLSTART=1 (für Hosting, das im Leerlauf auf null skaliert): openai
+  wird nicht im Master geladen, sondern in jedem Worker nach dem Start im
+  Hintergrund, zusammen mit der ersten Verbindung zum Upstream
+"""
+
+import gc
+import os
+
+try:
+    _KERNE = len(os.sched_getaffinity(0))
+except AttributeError:  # nicht überall verfügbar (z.B. macOS)
+    _KERNE = os.cpu_count() or 1
+
+
+def _gevent_verfuegbar():
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+worker_class = os.environ.get('GUNICORN_WORKER_KLASSE') or ('gevent' if _gevent_verfuegbar() else 'gthread')
+
+if worker_class == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+if worker_class == 'sync':
+    _standard_worker = 2 * _KERNE + 1
+else:
+    # gevent/gthread warten nebenläufig auf die API, ein Prozess pro Kern genügt
+    _standard_worker = _KERNE
+workers = int(os.environ.get('WEB_CONCURRENCY', min(_standard_worker, int(os.environ.get('GUNICORN_MAX_WORKER', 8)))))
+threads = int(os.environ.get('GUNICORN_THREADS', 8 if worker_class == 'gthread' else 1))
+os.environ.setdefault('WEBSOCKET', '1' if worker_class == 'gevent' else '0')
+# Bei gevent zählen offene WebSocket-Verbindungen mit, die meisten davon ruhen
+worker_connections = int(os.environ.get(
+    'GUNICORN_WORKER_CONNECTIONS', 5000 if os.environ['WEBSOCKET'] == '1' and worker_class == 'gevent' else 100
+))
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+preload_app = True
+# Gestreamte Antworten dürfen so lange dauern wie ein Upstream-Aufruf mit allen Retries
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+
+# Sessions müssen einen Worker-Neustart überleben (und bei mehreren Workern geteilt sein)
+os.environ.setdefault('SESSION_BACKEND', 'sqlite')
+if workers > 1:
+    os.environ.setdefault('SCHEDULER_DB', 'scheduler.db')
+
+# Worker gelegentlich erneuern, falls doch Speicher wächst (Jitter gegen gleichzeitige Neustarts);
+# Sessions im Speicher gingen dabei verloren
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000)) if os.environ['SESSION_BACKEND'] != 'memory' else 0
+max_requests_jitter = max_requests // 10
+
+
+def when_ready(server):
+    # Die vorab geladenen Objekte nicht mehr vom GC anfassen lassen, sonst
+    # kopiert jeder Worker beim ersten GC-Lauf die Seiten des Masters
+    gc.freeze()
+    server.log.info(f"{workers} Worker ({worker_class}, {threads} Threads) bei {_KERNE} Kernen")
+
+
+def post_worker_init(worker):
+    if os.environ.get('SCHNELLSTART', '0') != '1':
+        return
+    from app import llm
+    if worker_class == 'gevent':
+        import gevent
+
+        def vorwaermen():
+            # Nur der Import läuft in einem echten Thread (er rechnet und würde
+            # sonst den Hub aufhalten); Client und Verbindung gehören in ein
+            # Greenlet, sonst sind sie an den fremden Thread gebunden
+            gevent.get_hub().threadpool.spawn(llm.vorladen).get()
+            llm.vorwaermen()
+        gevent.spawn(vorwaermen)
+    else:
+        import threading
+        threading.Thread(target=llm.vorwaermen, name='llm-vorwaermen', daemon=True).start()
@@ -8,142 +8,210 @@ Die Bilder sind eine zusätzliche visuelle Hilfe, die angezeigt wird,
 wenn eine Frage zu einem bestimmten Bild passt.
 """
 
-# Bildverzeichnis - organisiert nach Themen
-BILDER = {
-    "1_grundlagen": {
-        "basen": {
-            "datei": "Basen.png",
-            "keywords": ["basen", "adenin", "thymin", "guanin", "cytosin", "purin", "pyrimidin"],
-            "beschreibung": "Die vier DNA-Basen und ihre Struktur"
-        },
-        "basenpaarung": {
-            "datei": "Basenpaarungen.png",
-            "keywords": ["basenpaarung", "paarung", "wasserstoff", "a-t", "g-c", "komplementär"],
-            "beschreibung": "Komplementäre Basenpaarung mit Wasserstoffbrücken"
-        },
-        "nucleotid": {
-            "datei": "Nucleotidstruktur.png",
-            "keywords": ["nukleotid", "aufbau", "phosphat", "zucker", "desoxyribose"],
-            "beschreibung": "Aufbau eines DNA-Nukleotids"
-        },
-        "leiter": {
-            "datei": "Leitermodell.png",
-            "keywords": ["leitermodell", "struktur", "strickleiter"],
-            "beschreibung": "DNA-Leitermodell (vereinfachte Darstellung)"
-        },
-        "helix": {
-            "datei": "DNA_Helix.png",
-            "keywords": ["helix", "doppelhelix", "spirale", "windung"],
-            "beschreibung": "Die DNA-Doppelhelix-Struktur"
-        },
-        "doppelhelix": {
-            "datei": "Doppelhelix.png",
-            "keywords": ["doppelhelix", "antiparallel", "3'", "5'"],
-            "beschreibung": "Detaillierte Doppelhelix mit antiparallelen Strängen"
+import functools
+import json
+import os
+import re
+
+from lehrplan import lehrplan_laden
+
+STATIC_VERZEICHNIS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+BUILD_VERZEICHNIS = os.path.join(STATIC_VERZEICHNIS, 'build')
+# Wird von bilder_pipeline.py erzeugt (optimierte Varianten mit Inhalts-Hash)
+MANIFEST_DATEI = os.path.join(BUILD_VERZEICHNIS, 'manifest.json')
+
+# Bildverzeichnis - organisiert nach Themen, gepflegt in der Lehrplan-Datei
+BILDER = {}
+
+
+class _StichwortIndex:
+    """
+    Vorkompilierter Stichwort-Index für die Bilder eines Themas.
+
+    Alle Keywords werden zu einem Präfixbaum (Trie) zusammengefasst und als
+    eine einzige Regex kompiliert. Die Regex-Engine prüft pro Textposition
+    nur noch einen Pfad im Baum statt jedes Keyword einzeln, die Suche bleibt
+    daher auch bei sehr vielen Keywords schnell. Ein Lookahead sorgt dafür,
+    dass ein Durchlauf über den Text auch überlappende Treffer findet
+    (z.B. "helix" in "doppelhelix"). Kürzere Keywords, die an derselben
+    Stelle beginnen ("basen" in "basenpaarung"), werden über eine
+    vorberechnete Präfix-Tabelle mitgezählt.
+    """
+
+    def __init__(self, thema_bilder):
+        self.bilder_pro_keyword = {}
+        for bild_id, bild_info in thema_bilder.items():
+            for keyword in bild_info["keywords"]:
+                self.bilder_pro_keyword.setdefault(keyword.lower(), []).append(bild_id)
+
+        keywords = list(self.bilder_pro_keyword)
+        trie = {}
+        for keyword in keywords:
+            knoten = trie
+            for zeichen in keyword:
+                knoten = knoten.setdefault(zeichen, {})
+            knoten[""] = True  # Ende eines Keywords
+        self.muster = re.compile("(?=(" + _trie_regex(trie) + "))") if keywords else None
+
+        # Keyword -> alle Keywords, die Präfix davon sind (inkl. sich selbst)
+        self.praefixe = {
+            k: [k[:i] for i in range(1, len(k) + 1) if k[:i] in self.bilder_pro_keyword]
+            for k in keywords
         }
-    },
-    
-    "2_aufbau": {
-        "chromosom": {
-            "datei": "Chromosom_Aufbau.png",
-            "keywords": ["chromosom", "chromatid", "zentromer", "aufbau"],
-            "beschreibung": "Aufbau eines Chromosoms"
-        },
-        "karyogramm": {
-            "datei": "Chromosomensatz.png",
-            "keywords": ["chromosomensatz", "karyogramm", "diploid", "haploid", "autosomen"],
-            "beschreibung": "Menschlicher Chromosomensatz"
-        },
-        "gen": {
-            "datei": "Gen.png",
-            "keywords": ["gen", "dna-abschnitt", "merkmal"],
-            "beschreibung": "Ein Gen als DNA-Abschnitt"
-        },
-        "zellkern": {
-            "datei": "Zellkern.png",
-            "keywords": ["zellkern", "nucleus", "chromatin", "wo liegt"],
-            "beschreibung": "Der Zellkern mit DNA"
+
+        # Spezifität: lange Keywords, die nur zu einem Bild gehören, zählen mehr
+        self.gewicht = {
+            k: len(k) / len(bilder) for k, bilder in self.bilder_pro_keyword.items()
         }
-    },
+
+    def suche(self, text):
+        """Gibt {bild_id: (punkte, treffer)} für alle passenden Bilder zurück."""
+        ergebnis = {}
+        if self.muster is None:
+            return ergebnis
+        for treffer in self.muster.finditer(text):
+            for keyword in self.praefixe[treffer.group(1)]:
+                for bild_id in self.bilder_pro_keyword[keyword]:
+                    punkte, anzahl = ergebnis.get(bild_id, (0.0, 0))
+                    ergebnis[bild_id] = (punkte + self.gewicht[keyword], anzahl + 1)
+        return ergebnis
+
+
+def _trie_regex(knoten):
+    """Wandelt einen Trie in eine Regex um; gierig, findet also das längste Keyword."""
+    zweige = [re.escape(zeichen) + _trie_regex(kind) for zeichen, kind in knoten.items() if zeichen]
+    if not zweige:
+        return ""
+    teil = zweige[0] if len(zweige) == 1 else "(?:" + "|".join(zweige) + ")"
+    if "" in knoten:
+        # An diesem Knoten endet schon ein Keyword, der Rest ist optional
+        return "(?:" + teil + ")?"
+    return teil
+
+
+def manifest_laden():
+    """Liest das Bild-Manifest der Build-Pipeline; ohne Manifest gibt es nur die Original-PNGs."""
+    global _MANIFEST
+    try:
+        with open(MANIFEST_DATEI, encoding='utf-8') as f:
+            _MANIFEST = json.load(f)
+    except (OSError, ValueError):
+        _MANIFEST = {}
+
+
+_MANIFEST = {}
+manifest_laden()
+
+
+def _bild_dict(bild_info):
+    bild = {
+        "datei": bild_info["datei"],
+        "beschreibung": bild_info["beschreibung"],
+        "url": f"/static/{bild_info['datei']}"
+    }
+    eintrag = _MANIFEST.get(bild_info["datei"])
+    if eintrag:
+        # srcset-fertige Varianten, bevorzugtes Format zuerst
+        bild["url"] = eintrag["fallback"]
+        bild["breite"] = eintrag["breite"]
+        bild["hoehe"] = eintrag["hoehe"]
+        bild["quellen"] = [
+            {
+                "typ": mime,
+                "srcset": ", ".join(f"{v['url']} {v['breite']}w" for v in varianten)
+            }
+            for mime, varianten in eintrag["varianten"].items()
+        ]
+    return bild
+
+
+def bild_eintrag(thema_id, bild_id):
+    """
+    Gibt die Bildinfo zu einer Bild-ID zurück.
     
-    "3_replikation": {
-        "replikation": {
-            "datei": "Replikation.png",
-            "keywords": ["replikation", "verdopplung", "kopie", "zellteilung"],
-            "beschreibung": "Der DNA-Replikationsprozess"
-        },
-        "schema": {
-            "datei": "Replikationsschema.png",
-            "keywords": ["semikonservativ", "helikase", "polymerase", "replikationsgabel"],
-            "beschreibung": "Schema der semikonservativen Replikation"
-        }
-    },
+    Args:
+        thema_id (str): ID des Themas
+        bild_id (str): ID des Bildes (z.B. 'basen')
     
-    "4_vererbung": {
-        "mendel1": {
-            "datei": "Mendelregel_1.png",
-            "keywords": ["mendel", "uniformität", "erste regel", "f1"],
-            "beschreibung": "1. Mendelsche Regel (Uniformitätsregel)"
-        },
-        "mendel2": {
-            "datei": "Mendelregel_2.png",
-            "keywords": ["spaltung", "zweite regel", "f2", "3:1"],
-            "beschreibung": "2. Mendelsche Regel (Spaltungsregel)"
-        },
-        "erbgang": {
-            "datei": "Erbgang_Beispiel.png",
-            "keywords": ["erbgang", "stammbaum", "vererbung", "generationen"],
-            "beschreibung": "Beispiel eines Erbgangs"
-        },
-        "phänotyp": {
-            "datei": "Phanotyp_Genotyp.png",
-            "keywords": ["phänotyp", "genotyp", "erscheinungsbild", "erbanlage"],
-            "beschreibung": "Unterschied zwischen Phänotyp und Genotyp"
-        },
-        "allele": {
-            "datei": "Allelschema.png",
-            "keywords": ["allel", "homozygot", "heterozygot", "dominant", "rezessiv"],
-            "beschreibung": "Schema verschiedener Allel-Kombinationen"
-        }
-    }
-}
+    Returns:
+        dict oder None: Bildinfo (mit 'quellen' für srcset, falls gebaut)
+    """
+    if thema_id in BILDER and bild_id in BILDER[thema_id]:
+        return _bild_dict(BILDER[thema_id][bild_id])
+    return None
 
 
-def finde_passendes_bild(frage_text, thema_id):
+def index_aufbauen():
+    """Baut die Stichwort-Indizes neu auf (z.B. nachdem BILDER geändert wurde)."""
+    global _INDEX
+    _INDEX = {thema_id: _StichwortIndex(thema_bilder) for thema_id, thema_bilder in BILDER.items()}
+
+
+@functools.lru_cache(maxsize=1024)
+def _konzept_bild_ids(thema_id, konzept):
+    return tuple(bild["bild_id"] for bild in finde_passende_bilder(konzept, thema_id))
+
+
+def bilder_setzen(bilder):
+    """Übernimmt die Bilder eines (neu geladenen) Lehrplans und baut die Indizes neu auf."""
+    global BILDER
+    BILDER = bilder
+    index_aufbauen()
+    _konzept_bild_ids.cache_clear()
+
+
+# Einmalig beim Import aufbauen
+_INDEX = {}
+bilder_setzen(lehrplan_laden().bilder())
+
+
+def finde_passende_bilder(frage_text, thema_id, max_anzahl=None):
     """
-    Findet ein passendes Bild zu einer Frage basierend auf Keywords.
+    Findet alle passenden Bilder zu einer Frage, nach Relevanz sortiert.
     
     Args:
         frage_text (str): Der Text der Frage
         thema_id (str): ID des aktuellen Themas (z.B. '1_grundlagen')
+        max_anzahl (int): Höchstens so viele Bilder zurückgeben (None = alle)
     
     Returns:
-        dict oder None: Bildinfo falls gefunden, sonst None
+        list: Bildinfos (mit 'bild_id' und 'punkte'), bestes Bild zuerst
     """
-    if not frage_text or not thema_id:
-        return None
+    if not frage_text or thema_id not in _INDEX:
+        return []
     
-    frage_lower = frage_text.lower()
+    treffer = _INDEX[thema_id].suche(frage_text.lower())
+    reihenfolge = list(BILDER[thema_id])
+    rangliste = sorted(
+        treffer.items(),
+        # Punkte, dann Trefferzahl; bei Gleichstand entscheidet die Reihenfolge in BILDER
+        key=lambda eintrag: (-eintrag[1][0], -eintrag[1][1], reihenfolge.index(eintrag[0]))
+    )
     
-    # Suche nur in Bildern des aktuellen Themas
-    if thema_id not in BILDER:
-        return None
-    
-    thema_bilder = BILDER[thema_id]
+    bilder_liste = []
+    for bild_id, (punkte, _) in rangliste[:max_anzahl]:
+        bild = _bild_dict(BILDER[thema_id][bild_id])
+        bild["bild_id"] = bild_id
+        bild["punkte"] = round(punkte, 2)
+        bilder_liste.append(bild)
+    return bilder_liste
+
+
+def finde_passendes_bild(frage_text, thema_id):
+    """
+    Findet das am besten passende Bild zu einer Frage basierend auf Keywords.
     
-    # Durchsuche alle Bilder des Themas
-    for bild_id, bild_info in thema_bilder.items():
-        # Prüfe ob Keywords in der Frage vorkommen
-        for keyword in bild_info["keywords"]:
-            if keyword in frage_lower:
-                # Gefunden! Gib Bildinfo zurück
-                return {
-                    "datei": bild_info["datei"],
-                    "beschreibung": bild_info["beschreibung"],
-                    "url": f"/static/{bild_info['datei']}"
-                }
+    Args:
+        frage_text (str): Der Text der Frage
+        thema_id (str): ID des aktuellen Themas (z.B. '1_grundlagen')
     
-    return None
+    Returns:
+        dict oder None: Bildinfo falls gefunden, sonst None
+    """
+    bilder_liste = finde_passende_bilder(frage_text, thema_id, max_anzahl=1)
+    if not bilder_liste:
+        return None
+    return _bild_dict(BILDER[thema_id][bilder_liste[0]["bild_id"]])
 
 
 def alle_bilder_für_thema(thema_id):
@@ -161,10 +229,33 @@ def alle_bilder_für_thema(thema_id):
     
     bilder_liste = []
     for bild_id, bild_info in BILDER[thema_id].items():
-        bilder_liste.append({
-            "datei": bild_info["datei"],
-            "beschreibung": bild_info["beschreibung"],
-            "url": f"/static/{bild_info['datei']}"
-        })
+        bilder_liste.append(_bild_dict(bild_info))
     
-    return bilder_liste
\ No newline at end of file
+    return bilder_liste
+
+
+def vorab_bilder(thema_id, konzepte, konzept_index, max_anzahl=3):
+    """
+    Bilder, die als Nächstes wahrscheinlich gezeigt werden: die zum aktuellen
+    und zum nächsten Konzept, gefunden über die Stichwörter im Konzeptnamen.
+
+    Args:
+        thema_id (str): ID des Themas
+        konzepte (sequence): Konzepte des Themas in Lehrplan-Reihenfolge
+        konzept_index (int): Index des aktuellen Konzepts
+        max_anzahl (int): Höchstens so viele Bilder
+
+    Returns:
+        list: Bildinfos wie bei bild_eintrag() (mit 'bild_id'), wahrscheinlichstes zuerst
+    """
+    bild_ids = []
+    for konzept in konzepte[konzept_index:konzept_index + 2]:
+        for bild_id in _konzept_bild_ids(thema_id, konzept):
+            if bild_id not in bild_ids:
+                bild_ids.append(bild_id)
+    bilder_liste = []
+    for bild_id in bild_ids[:max_anzahl]:
+        bild = _bild_dict(BILDER[thema_id][bild_id])
+        bild["bild_id"] = bild_id
+        bilder_liste.append(bild)
+    return bilder_liste
@@ -0,0 +1,205 @@
+# intro_cache.py
+# Cache für die Begrüßungsnachrichten aus /start und /thema_wechseln
+
+"""
+Die Intro-Prompts unterscheiden sich nur im Namen des Schülers. Deshalb
+wird pro Schlüssel (Art, Thema, Konzept, Prompt-Version) ein kleiner Pool
+vorab erzeugter Begrüßungen gehalten; der Name wird über einen Platzhalter
+eingesetzt. Zu Stundenbeginn kostet dann nicht jeder Schüler einen API-Aufruf.
+
+- Bis der Pool voll ist, gilt jede Anfrage als Fehlschlag und bringt eine
+  neue Variante (sonst bekäme jeder Schüler dieselbe Begrüßung)
+- Gleichzeitige Fehlschläge für denselben Schlüssel (eine Klasse drückt
+  zusammen auf Start) lösen nur einen API-Aufruf aus, die anderen warten
+  darauf und bekommen dieselbe Antwort
+- Mit Datei teilen sich Worker und der Aufwärm-Lauf beim Deploy den Cache:
+  Schreiben führt mit dem Dateistand zusammen (unter einer Dateisperre,
+  wo fcntl verfügbar ist), ein Fehlschlag liest die Datei neu, wenn sie
+  sich geändert hat. Scheitert das Schreiben, bleibt der Pool im Speicher
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # z.B. Windows: dann nur die Sperre im Prozess
+    fcntl = None
+
+
+def prompt_version(*teile):
+    """Kurzer Hash über die Prompt-Texte - ändert sich ein Prompt, verfällt der Cache."""
+    h = hashlib.sha256()
+    for teil in teile:
+        h.update(teil.encode('utf-8'))
+    return h.hexdigest()[:12]
+
+
+class _Erzeugung:
+    __slots__ = ('fertig', 'antwort')
+
+    def __init__(self):
+        self.fertig = threading.Event()
+        self.antwort = None
+
+
+class IntroCache:
+    """LRU-Cache mit TTL, der pro Schlüssel einen Pool von Antworten hält."""
+
+    def __init__(self, max_schluessel=256, pool_groesse=5, ttl=7 * 24 * 3600, datei=None):
+        self.max_schluessel = max_schluessel
+        self.pool_groesse = pool_groesse
+        self.ttl = ttl
+        self.datei = datei
+        self.treffer = 0
+        self.fehlschlaege = 0
+        self._pools = OrderedDict()  # schluessel -> [(erstellt, antwort), ...]
+        self._lock = threading.Lock()
+        self._laufend = {}  # schluessel -> _Erzeugung
+        self._datei_stand = None
+        self._datei_lock = threading.Lock()  # ein Schreiber pro Prozess, zwischen Prozessen fcntl
+        if datei:
+            self.laden()
+
+    @staticmethod
+    def _schluessel_text(schluessel):
+        return '|'.join(str(teil) for teil in schluessel)
+
+    def _gueltige(self, schluessel_text):
+        pool = self._pools.get(schluessel_text)
+        if not pool:
+            return []
+        grenze = time.time() - self.ttl
+        pool[:] = [eintrag for eintrag in pool if eintrag[0] >= grenze]
+        if not pool:
+            del self._pools[schluessel_text]
+            return []
+        self._pools.move_to_end(schluessel_text)
+        return pool
+
+    def hole(self, schluessel):
+        """Gibt eine zufällige Antwort aus dem vollen Pool zurück (als Kopie), sonst None."""
+        schluessel_text = self._schluessel_text(schluessel)
+        if self.datei and self.fehlende(schluessel) > 0 and self._datei_geaendert():
+            self.laden()
+        with self._lock:
+            pool = self._gueltige(schluessel_text)
+            if len(pool) < self.pool_groesse:
+                self.fehlschlaege += 1
+                return None
+            self.treffer += 1
+            return dict(random.choice(pool)[1])
+
+    def erzeugen(self, schluessel, erzeugen, warten=60.0):
+        """
+        Erzeugt eine neue Antwort per erzeugen() und legt sie ab (außer Ersatz-
+        Antworten mit 'fallback'). Läuft für den Schlüssel schon eine Erzeugung,
+        wird auf deren Ergebnis gewartet statt ein zweites Mal zu fragen.
+        """
+        schluessel_text = self._schluessel_text(schluessel)
+        with self._lock:
+            laufend = self._laufend.get(schluessel_text)
+            eigene = laufend is None
+            if eigene:
+                laufend = self._laufend[schluessel_text] = _Erzeugung()
+        if not eigene:
+            if laufend.fertig.wait(warten) and laufend.antwort is not None:
+                return dict(laufend.antwort)
+            return erzeugen()  # die andere Erzeugung ist gescheitert oder hängt
+        try:
+            antwort = erzeugen()
+            if not antwort.get('fallback'):
+                self.ablegen(schluessel, antwort)
+            laufend.antwort = dict(antwort)
+            return antwort
+        finally:
+            with self._lock:
+                del self._laufend[schluessel_text]
+            laufend.fertig.set()
+
+    def fehlende(self, schluessel):
+        """Wie viele Antworten dem Pool noch fehlen."""
+        with self._lock:
+            return self.pool_groesse - len(self._gueltige(self._schluessel_text(schluessel)))
+
+    def ablegen(self, schluessel, antwort):
+        schluessel_text = self._schluessel_text(schluessel)
+        with self._lock:
+            pool = self._pools.setdefault(schluessel_text, [])
+            if len(pool) >= self.pool_groesse:
+                pool.pop(0)
+            pool.append((time.time(), dict(antwort)))
+            self._pools.move_to_end(schluessel_text)
+            while len(self._pools) > self.max_schluessel:
+                self._pools.popitem(last=False)
+        if self.datei:
+            self.speichern()
+
+    def _datei_geaendert(self):
+        try:
+            stand = os.stat(self.datei).st_mtime_ns
+        except OSError:
+            return False
+        return stand != self._datei_stand
+
+    def laden(self):
+        """Übernimmt die Einträge aus der Datei, falls vorhanden; eigene bleiben erhalten."""
+        try:
+            stand = os.stat(self.datei).st_mtime_ns
+            with open(self.datei, encoding='utf-8') as f:
+                daten = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            self._datei_stand = stand
+            for schluessel_text, pool in daten.items():
+                eigene = self._pools.get(schluessel_text, [])
+                bekannt = {(e[0], e[1].get('nachricht')) for e in eigene}
+                neu = [tuple(e) for e in pool if (e[0], e[1].get('nachricht')) not in bekannt]
+                # Die neuesten behalten, wie ablegen()
+                self._pools[schluessel_text] = sorted(eigene + neu, key=lambda e: e[0])[-self.pool_groesse:]
+            while len(self._pools) > self.max_schluessel:
+                self._pools.popitem(last=False)
+
+    @contextlib.contextmanager
+    def _dateisperre(self):
+        with self._datei_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{self.datei}.lock", 'a') as sperre:
+                fcntl.flock(sperre, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(sperre, fcntl.LOCK_UN)
+
+    def speichern(self):
+        """Führt mit dem Dateistand zusammen (andere Worker) und schreibt atomar; Fehler nur im Log."""
+        tmp = None
+        try:
+            with self._dateisperre():
+                self.laden()
+                with self._lock:
+                    daten = {k: [list(e) for e in pool] for k, pool in self._pools.items()}
+                verzeichnis, name = os.path.split(os.path.abspath(self.datei))
+                fd, tmp = tempfile.mkstemp(prefix=f"{name}.", suffix='.tmp', dir=verzeichnis)
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(daten, f, ensure_ascii=False)
+                os.replace(tmp, self.datei)
+                tmp = None
+                stand = os.stat(self.datei).st_mtime_ns
+            with self._lock:
+                self._datei_stand = stand
+        except OSError as e:
+            print(f"Intro-Cache nicht gespeichert: {str(e)}")
+            if tmp is not None:
+                with contextlib.suppress(OSError):
+                    os.remove(tmp)
@@ -0,0 +1,168 @@
+# kanal.py
+# WebSocket-Kanal: eine dauerhafte Verbindung pro Schüler für alle Chat-Züge
+
+"""
+Statt für jeden Chat-Zug eine neue POST-Anfrage zu schicken (Header,
+Cookie prüfen, Session laden), öffnet das Frontend nach /start einen
+WebSocket zu /kanal. Das Cookie wird einmal beim Handshake geprüft, das
+Session-Objekt bleibt für die Dauer der Verbindung im Worker.
+
+Protokoll (JSON-Textnachrichten):
+- Browser -> Server: {"typ": "nachricht", "nachricht": ..., "nachricht_id": ...}
+- Server -> Browser: {"typ": ..., "daten": {...}} mit denselben Ereignissen
+  wie /chat/stream (token, fertig, fehler), dazu "ersetzt", wenn eine
+  neuere Verbindung derselben Session die alte ablöst
+
+- Herzschlag: der Server pingt alle KANAL_HERZSCHLAG Sekunden; bleibt das
+  Pong aus, wird die Verbindung geschlossen. Ohne Schüler-Nachricht wird
+  sie nach KANAL_LEERLAUF Sekunden geschlossen (der Browser baut sie beim
+  nächsten Senden neu auf).
+- Gegendruck: ein Zug legt seine Ereignisse in einen Sendepuffer, ein
+  eigener Thread liefert sie aus. Kommt der Browser nicht hinterher,
+  werden wartende Token-Ereignisse zusammengelegt statt gestaut; der
+  Upstream-Stream wird nie vom Browser gebremst. Dauert die Auslieferung
+  länger als KANAL_SENDEN_WARTEN, wird die Verbindung geschlossen.
+- Höchstens eine Verbindung pro Session und Worker: eine neue (zweiter
+  Tab, Reconnect) ersetzt die alte.
+
+Braucht flask-sock und für viele offene Verbindungen gevent-Worker,
+gunicorn.conf.py schaltet den Kanal deshalb nur dort standardmäßig ein
+(mit gthread belegt jede Verbindung einen Thread). Ohne Kanal nutzt das
+Frontend /chat/stream.
+"""
+
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+
+# flask-sock (samt wsproto) nur importieren, wenn der Kanal auch an ist
+KANAL_AKTIV = os.environ.get('WEBSOCKET', '0') == '1'
+Sock = None
+if KANAL_AKTIV:
+    try:
+        from flask_sock import Sock
+    except ImportError:  # dann nur /chat/stream
+        KANAL_AKTIV = False
+
+KANAL_LEERLAUF = float(os.environ.get('KANAL_LEERLAUF', 3600))
+KANAL_SENDEN_WARTEN = float(os.environ.get('KANAL_SENDEN_WARTEN', 30))
+SERVER_OPTIONEN = {
+    'ping_interval': float(os.environ.get('KANAL_HERZSCHLAG', 25)),
+    # Schüler-Nachrichten sind kurz; alles darüber wird gar nicht erst gepuffert
+    'max_message_size': 8192
+}
+
+# Schließ-Codes (4000-4999 sind für Anwendungen frei)
+ERSETZT = 4000
+ZU_LANGSAM = 4008
+
+
+def nachricht(typ, daten):
+    return json.dumps({'typ': typ, 'daten': daten}, ensure_ascii=False)
+
+
+def nachricht_lesen(text):
+    """Schüler-Nachricht als dict mit 'nachricht' (und ggf. 'nachricht_id'), sonst None"""
+    try:
+        daten = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(daten, dict) or daten.get('typ') != 'nachricht':
+        return None
+    if not isinstance(daten.get('nachricht'), str) or not daten['nachricht'].strip():
+        return None
+    daten['nachricht'] = daten['nachricht'].strip()
+    return daten
+
+
+def gleiche_herkunft(origin, host):
+    """Browser schicken das Cookie auch beim Handshake fremder Seiten mit; nur die eigene zulassen."""
+    return bool(origin) and urlsplit(origin).netloc == host
+
+
+class Sendepuffer:
+    """Ereignisse eines Zugs zwischen Erzeuger (Chat-Zug) und Auslieferung an den Browser."""
+
+    def __init__(self):
+        self._bedingung = threading.Condition()
+        self._ereignisse = []
+        self._geschlossen = False
+        self.zusammengelegt = 0
+        self.fehler = None
+
+    def ablegen(self, typ, daten):
+        with self._bedingung:
+            if typ == 'token' and self._ereignisse and self._ereignisse[-1][0] == 'token':
+                # Der Browser hinkt hinterher: an das wartende Token-Ereignis anhängen
+                self._ereignisse[-1] = ('token', {'text': self._ereignisse[-1][1]['text'] + daten['text']})
+                self.zusammengelegt += 1
+            else:
+                self._ereignisse.append((typ, daten))
+            self._bedingung.notify()
+
+    def schliessen(self):
+        with self._bedingung:
+            self._geschlossen = True
+            self._bedingung.notify()
+
+    def ausliefern(self, senden):
+        """Läuft im Auslieferungs-Thread, bis der Puffer geschlossen und leer ist."""
+        while True:
+            with self._bedingung:
+                while not self._ereignisse and not self._geschlossen:
+                    self._bedingung.wait()
+                if not self._ereignisse:
+                    return
+                ereignisse, self._ereignisse = self._ereignisse, []
+            try:
+                for typ, daten in ereignisse:
+                    senden(nachricht(typ, daten))
+            except Exception as e:  # Verbindung weg; der Zug läuft trotzdem zu Ende
+                self.fehler = e
+                return
+
+
+def zug_ausliefern(ws, ereignisse):
+    """
+    Schickt die Ereignisse eines Zugs über einen Sendepuffer an den Browser.
+
+    Returns:
+        bool: False, wenn die Verbindung weg ist oder der Browser nicht mitkommt
+    """
+    puffer = Sendepuffer()
+    auslieferung = threading.Thread(target=puffer.ausliefern, args=(ws.send,), daemon=True)
+    auslieferung.start()
+    try:
+        for typ, daten in ereignisse:
+            puffer.ablegen(typ, daten)
+    finally:
+        puffer.schliessen()
+    auslieferung.join(KANAL_SENDEN_WARTEN)
+    return not auslieferung.is_alive() and puffer.fehler is None
+
+
+class Verbindungen:
+    """Offene Kanäle dieses Workers, höchstens einer pro Session."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._nach_sid = {}
+
+    def anmelden(self, sid, ws):
+        """
+        Returns:
+            die bisherige Verbindung dieser Session oder None
+        """
+        with self._lock:
+            alt = self._nach_sid.get(sid)
+            self._nach_sid[sid] = ws
+        return alt
+
+    def abmelden(self, sid, ws):
+        with self._lock:
+            if self._nach_sid.get(sid) is ws:
+                del self._nach_sid[sid]
+
+    def __len__(self):
+        return len(self._nach_sid)
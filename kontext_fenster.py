@@ -0,0 +1,146 @@
+# kontext_fenster.py
+# Token-Budget für den Gesprächsverlauf im /chat-Prompt
+
+"""
+Statt bei jedem Zug den kompletten Verlauf mitzuschicken, bleiben nur die
+letzten Nachrichten wörtlich erhalten. Ältere Nachrichten werden blockweise
+in eine laufende Zusammenfassung gefaltet, die inkrementell fortgeschrieben
+(und nicht jedes Mal neu erzeugt) wird. Der Prompt bleibt so unter einem
+festen Token-Budget.
+
+Das Falten kostet einen eigenen Modell-Aufruf. Mit baue(..., falten=False)
+bleibt es aus dem Zug heraus; faellig() sagt, wann es sich lohnt, und
+falten() lässt sich dann im Hintergrund aufrufen.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding('o200k_base')
+except Exception:  # tiktoken ist optional
+    _ENCODING = None
+
+# Zusätzliche Tokens pro Nachricht (Rolle, Trennzeichen) laut OpenAI-Format
+TOKENS_PRO_NACHRICHT = 4
+
+
+def zaehle_tokens(text):
+    """Zählt Tokens mit tiktoken, sonst grobe Schätzung (~4 Zeichen pro Token)."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return max(1, (len(text) + 3) // 4)
+
+
+class KontextFenster:
+    """Baut die Prompt-Nachrichten für /chat innerhalb eines Token-Budgets."""
+
+    def __init__(self, budget=3000, letzte_nachrichten=8, block=4, zusammenfasser=None,
+                 max_cache=20000):
+        self.budget = budget
+        self.letzte_nachrichten = letzte_nachrichten
+        self.block = block
+        self.zusammenfasser = zusammenfasser
+        self.max_cache = max_cache
+        self._token_cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.statistik = {
+            'zuege': 0,
+            'tokens_voll': 0,
+            'tokens_gesendet': 0,
+            'faltungen': 0,
+            'gekuerzt': 0
+        }
+
+    def tokens(self, nachricht):
+        """Token-Anzahl einer Nachricht, pro Inhalt nur einmal gezählt."""
+        schluessel = hashlib.blake2b(nachricht['content'].encode('utf-8'), digest_size=16).digest()
+        with self._lock:
+            anzahl = self._token_cache.get(schluessel)
+            if anzahl is not None:
+                self._token_cache.move_to_end(schluessel)
+                return anzahl
+        anzahl = zaehle_tokens(nachricht['content']) + TOKENS_PRO_NACHRICHT
+        with self._lock:
+            self._token_cache[schluessel] = anzahl
+            if len(self._token_cache) > self.max_cache:
+                self._token_cache.popitem(last=False)
+        return anzahl
+
+    def faellig(self, verlauf, zustand):
+        """True, wenn mindestens ein Block alter Nachrichten in die Zusammenfassung gehört."""
+        grenze = len(verlauf) - self.letzte_nachrichten
+        return self.zusammenfasser is not None and grenze - (zustand or {}).get('bis', 0) >= self.block
+
+    def falten(self, verlauf, zustand, **kwargs):
+        """
+        Faltet überzählige alte Nachrichten in die Zusammenfassung (blockweise).
+
+        Weitere Argumente gehen an den zusammenfasser. Gibt den neuen Zustand
+        zurück, bei einem Fehler den alten.
+        """
+        zustand = dict(zustand or {})
+        bis = zustand.get('bis', 0)
+        grenze = len(verlauf) - self.letzte_nachrichten
+        if not self.faellig(verlauf, zustand):
+            return zustand
+        try:
+            text = self.zusammenfasser(zustand.get('text', ''), verlauf[bis:grenze], **kwargs)
+        except Exception as e:
+            print(f"Fehler beim Zusammenfassen: {str(e)}")
+            return zustand
+        self.statistik['faltungen'] += 1
+        return {'text': text, 'bis': grenze}
+
+    def baue(self, system_prompt, verlauf, dialog_prompt, zustand=None, falten=True):
+        """
+        Baut die Nachrichtenliste für die API.
+
+        Args:
+            system_prompt (str): Der Tutor-System-Prompt
+            verlauf (list): Kompletter Gesprächsverlauf (inkl. aktueller Schüler-Nachricht)
+            dialog_prompt (str): Kontext-Prompt für diesen Zug
+            zustand (dict): Bisherige Zusammenfassung {'text': ..., 'bis': ...}
+            falten (bool): False = keine neue Zusammenfassung anstoßen (nur kürzen)
+
+        Returns:
+            tuple: (messages, neuer_zustand, tokens_gespart)
+        """
+        zustand = dict(zustand or {})
+        if falten:
+            zustand = self.falten(verlauf, zustand)
+        bis = min(zustand.get('bis', 0), len(verlauf))
+
+        kopf = [{"role": "system", "content": system_prompt}]
+        if zustand.get('text'):
+            kopf.append({
+                "role": "system",
+                "content": f"Bisheriger Gesprächsverlauf (Zusammenfassung):\n{zustand['text']}"
+            })
+        fuss = [{"role": "user", "content": dialog_prompt}]
+        woertlich = list(verlauf[bis:])
+
+        gesendet = sum(self.tokens(n) for n in kopf + woertlich + fuss)
+        # Budget notfalls durch Weglassen der ältesten wörtlichen Nachrichten einhalten
+        while gesendet > self.budget and len(woertlich) > 2:
+            gesendet -= self.tokens(woertlich.pop(0))
+            self.statistik['gekuerzt'] += 1
+
+        voll = (self.tokens(kopf[0]) + sum(self.tokens(n) for n in verlauf)
+                + self.tokens(fuss[0]))
+        gespart = max(0, voll - gesendet)
+
+        self.statistik['zuege'] += 1
+        self.statistik['tokens_voll'] += voll
+        self.statistik['tokens_gesendet'] += gesendet
+
+        return kopf + woertlich + fuss, zustand, gespart
+
+    def metriken(self):
+        """Kennzahlen über alle Züge, u.a. eingesparte Tokens pro Zug."""
+        s = dict(self.statistik)
+        s['tokens_gespart'] = s['tokens_voll'] - s['tokens_gesendet']
+        s['tokens_gespart_pro_zug'] = s['tokens_gespart'] / s['zuege'] if s['zuege'] else 0.0
+        return s
@@ -0,0 +1,295 @@
+# lehrplan.py
+# Lehrplan (Themen, Konzepte, Quellen, Bilder) aus einer Datendatei
+
+"""
+Der Lehrplan liegt in lehrplan.yaml (oder einer JSON-Datei mit derselben
+Struktur) statt als verschachtelte dicts im Code. Beim Laden wird er
+geprüft und in unveränderliche Objekte mit __slots__ eingefroren. Alles,
+was pro Chat-Zug gebraucht wird, ist dabei schon vorberechnet: die
+Bild-IDs als Text, der Quellen-Text und der Dialog-Prompt pro Konzept
+(bis auf die Versuchsanzahl). Die geparsten Rohdaten liegen zusätzlich als
+Schnappschuss vor (schnappschuss.py), ein Start muss kein YAML parsen.
+
+LehrplanQuelle prüft höchstens alle paar Sekunden die Änderungszeit der
+Datei und lädt sie bei Bedarf neu - Lehrkräfte können Inhalte ändern,
+ohne dass die App neu gestartet werden muss. Ist die geänderte Datei
+fehlerhaft, bleibt der alte Stand aktiv.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+
+import schnappschuss
+
+try:
+    import yaml
+except ImportError:  # nur für .yaml-Dateien nötig
+    yaml = None
+
+# Der C-Parser (libyaml) ist um ein Vielfaches schneller, falls PyYAML damit gebaut ist
+YAML_LOADER = getattr(yaml, 'CSafeLoader', getattr(yaml, 'SafeLoader', None))
+
+LEHRPLAN_DATEI = os.environ.get(
+    'LEHRPLAN_DATEI',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lehrplan.yaml')
+)
+
+VERSUCHE_PLATZHALTER = '{versuche}'
+
+
+class LehrplanFehler(ValueError):
+    """Die Lehrplan-Datei fehlt, ist nicht lesbar oder hat eine ungültige Struktur."""
+
+
+class _Eingefroren:
+    __slots__ = ()
+
+    def __setattr__(self, name, wert):
+        raise AttributeError(f"{type(self).__name__} ist unveränderlich")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} ist unveränderlich")
+
+    def _setzen(self, **werte):
+        for name, wert in werte.items():
+            object.__setattr__(self, name, wert)
+
+
+class Bild(_Eingefroren):
+    __slots__ = ('id', 'datei', 'keywords', 'beschreibung')
+
+    def __init__(self, id, datei, keywords, beschreibung):
+        self._setzen(id=id, datei=datei, keywords=tuple(keywords), beschreibung=beschreibung)
+
+    def als_dict(self):
+        """Format von image_resources.BILDER"""
+        return {'datei': self.datei, 'keywords': list(self.keywords), 'beschreibung': self.beschreibung}
+
+
+class Thema(_Eingefroren):
+    __slots__ = ('id', 'name', 'kurzname', 'symbol', 'beschreibung', 'konzepte', 'quellen',
+                 'bilder', 'bild_ids', 'bilder_text', 'quellen_text', 'version', '_prompt_teile')
+
+    def __init__(self, id, name, beschreibung, konzepte, quellen, bilder, kurzname=None, symbol='',
+                 dialog_vorlage=None):
+        konzepte = tuple(konzepte)
+        bilder = tuple(bilder)
+        bild_ids = tuple(b.id for b in bilder)
+        bilder_text = ', '.join(bild_ids)
+        version = hashlib.blake2b(
+            json.dumps([name, konzepte], ensure_ascii=False).encode('utf-8'), digest_size=6
+        ).hexdigest()
+
+        # Dialog-Prompt pro Konzept vorab füllen, nur die Versuchsanzahl bleibt offen
+        prompt_teile = ()
+        if dialog_vorlage:
+            prompt_teile = tuple(
+                tuple(
+                    dialog_vorlage
+                    .replace('{thema}', name)
+                    .replace('{konzept}', konzept)
+                    .replace('{bilder}', bilder_text)
+                    .split(VERSUCHE_PLATZHALTER)
+                )
+                for konzept in konzepte
+            )
+
+        self._setzen(
+            id=id, name=name, kurzname=kurzname or name, symbol=symbol, beschreibung=beschreibung,
+            konzepte=konzepte, quellen=tuple(quellen), bilder=bilder, bild_ids=bild_ids,
+            bilder_text=bilder_text, quellen_text='\n'.join(f"• {q}" for q in quellen),
+            version=version, _prompt_teile=prompt_teile
+        )
+
+    def dialog_prompt(self, konzept_index, versuche):
+        """Vorberechneter Dialog-Prompt für ein Konzept mit eingesetzter Versuchsanzahl"""
+        return str(versuche).join(self._prompt_teile[konzept_index])
+
+
+class Lehrplan(_Eingefroren):
+    """Alle Themen in Datei-Reihenfolge; verhält sich wie ein schreibgeschütztes dict."""
+
+    __slots__ = ('themen', 'start_thema', 'version', 'datei')
+
+    def __init__(self, themen, version='', datei=None):
+        themen = {thema.id: thema for thema in themen}
+        self._setzen(
+            themen=MappingProxyType(themen),
+            start_thema=next(iter(themen)),
+            version=version,
+            datei=datei
+        )
+
+    def __getitem__(self, thema_id):
+        return self.themen[thema_id]
+
+    def __contains__(self, thema_id):
+        return thema_id in self.themen
+
+    def __iter__(self):
+        return iter(self.themen)
+
+    def __len__(self):
+        return len(self.themen)
+
+    def values(self):
+        return self.themen.values()
+
+    def bilder(self):
+        """Bilder aller Themen im Format von image_resources.BILDER"""
+        return {
+            thema.id: {bild.id: bild.als_dict() for bild in thema.bilder}
+            for thema in self.themen.values()
+        }
+
+
+def _text(wert, pfad, pflicht=True):
+    if wert is None and not pflicht:
+        return None
+    if not isinstance(wert, str) or not wert.strip():
+        raise LehrplanFehler(f"{pfad}: Text erwartet, gefunden {wert!r}")
+    return wert.strip()
+
+
+def _textliste(wert, pfad, pflicht=True):
+    if wert is None and not pflicht:
+        return []
+    if not isinstance(wert, list) or (pflicht and not wert):
+        raise LehrplanFehler(f"{pfad}: nicht-leere Liste erwartet")
+    eintraege = [_text(w, f"{pfad}[{i}]") for i, w in enumerate(wert)]
+    if len(set(eintraege)) != len(eintraege):
+        raise LehrplanFehler(f"{pfad}: doppelte Einträge")
+    return eintraege
+
+
+def _mapping(wert, pfad):
+    if not isinstance(wert, dict) or not wert:
+        raise LehrplanFehler(f"{pfad}: nicht-leere Zuordnung erwartet")
+    return wert
+
+
+def lehrplan_pruefen(daten, dialog_vorlage=None, version='', datei=None):
+    """
+    Prüft die Rohdaten und friert sie in einen Lehrplan ein.
+
+    Raises:
+        LehrplanFehler: mit Pfad zur fehlerhaften Stelle, z.B. "themen.2_aufbau.konzepte"
+    """
+    themen = []
+    for thema_id, roh in _mapping((daten or {}).get('themen'), 'themen').items():
+        pfad = f"themen.{thema_id}"
+        roh = _mapping(roh, pfad)
+        bilder = []
+        for bild_id, bild in (roh.get('bilder') or {}).items():
+            bild_pfad = f"{pfad}.bilder.{bild_id}"
+            bild = _mapping(bild, bild_pfad)
+            bilder.append(Bild(
+                str(bild_id),
+                _text(bild.get('datei'), f"{bild_pfad}.datei"),
+                [k.lower() for k in _textliste(bild.get('keywords'), f"{bild_pfad}.keywords")],
+                _text(bild.get('beschreibung'), f"{bild_pfad}.beschreibung")
+            ))
+        themen.append(Thema(
+            str(thema_id),
+            name=_text(roh.get('name'), f"{pfad}.name"),
+            kurzname=_text(roh.get('kurzname'), f"{pfad}.kurzname", pflicht=False),
+            symbol=_text(roh.get('symbol'), f"{pfad}.symbol", pflicht=False) or '',
+            beschreibung=_text(roh.get('beschreibung'), f"{pfad}.beschreibung"),
+            konzepte=_textliste(roh.get('konzepte'), f"{pfad}.konzepte"),
+            quellen=_textliste(roh.get('quellen'), f"{pfad}.quellen", pflicht=False),
+            bilder=bilder,
+            dialog_vorlage=dialog_vorlage
+        ))
+    return Lehrplan(themen, version=version, datei=datei)
+
+
+def lehrplan_laden(pfad=LEHRPLAN_DATEI, dialog_vorlage=None):
+    """Liest und prüft eine Lehrplan-Datei (.yaml/.yml oder .json)."""
+    try:
+        with open(pfad, 'rb') as f:
+            inhalt = f.read()
+    except OSError as e:
+        raise LehrplanFehler(f"Lehrplan nicht lesbar: {e}") from e
+
+    version = hashlib.blake2b(inhalt, digest_size=8).hexdigest()
+    # Geparste Rohdaten aus dem Schnappschuss zur selben Version, geprüft wird trotzdem
+    daten = schnappschuss.laden_oder_berechnen(
+        f"lehrplan-{os.path.basename(pfad)}", version, lambda: _parsen(pfad, inhalt)
+    )
+    return lehrplan_pruefen(daten, dialog_vorlage, version=version, datei=pfad)
+
+
+def _parsen(pfad, inhalt):
+    try:
+        if pfad.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise LehrplanFehler("Für YAML-Lehrpläne wird PyYAML benötigt")
+            return yaml.load(inhalt, Loader=YAML_LOADER)
+        return json.loads(inhalt)
+    except (ValueError, getattr(yaml, 'YAMLError', ValueError)) as e:
+        raise LehrplanFehler(f"{os.path.basename(pfad)}: {e}") from e
+
+
+class LehrplanQuelle:
+    """Hält den aktuellen Lehrplan und lädt die Datei neu, sobald sie sich ändert."""
+
+    def __init__(self, pfad=LEHRPLAN_DATEI, dialog_vorlage=None, pruef_intervall=2.0):
+        self.pfad = pfad
+        self.dialog_vorlage = dialog_vorlage
+        self.pruef_intervall = pruef_intervall
+        self._beobachter = []
+        self._lock = threading.Lock()
+        self._stand = self._aenderungszeit()
+        self._lehrplan = lehrplan_laden(pfad, dialog_vorlage)
+        self._naechste_pruefung = time.monotonic() + pruef_intervall
+
+    def _aenderungszeit(self):
+        try:
+            stat = os.stat(self.pfad)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def bei_wechsel(self, funktion):
+        """funktion(lehrplan) wird nach jedem erfolgreichen Neuladen aufgerufen."""
+        self._beobachter.append(funktion)
+        return funktion
+
+    def aktuell(self):
+        """Aktueller Lehrplan; prüft höchstens alle pruef_intervall Sekunden auf Änderungen."""
+        if self.pruef_intervall and time.monotonic() >= self._naechste_pruefung:
+            self.pruefen()
+        return self._lehrplan
+
+    def pruefen(self):
+        """
+        Lädt die Datei neu, falls sie sich geändert hat.
+
+        Returns:
+            bool: True, wenn ein neuer Lehrplan aktiv ist
+        """
+        with self._lock:
+            self._naechste_pruefung = time.monotonic() + self.pruef_intervall
+            stand = self._aenderungszeit()
+            if stand is None or stand == self._stand:
+                return False
+            self._stand = stand
+            try:
+                lehrplan = lehrplan_laden(self.pfad, self.dialog_vorlage)
+            except LehrplanFehler as e:
+                print(f"Lehrplan nicht übernommen, alter Stand bleibt aktiv: {str(e)}")
+                return False
+            if lehrplan.version == self._lehrplan.version:
+                return False
+            self._lehrplan = lehrplan
+        for funktion in self._beobachter:
+            try:
+                funktion(lehrplan)
+            except Exception as e:
+                print(f"Fehler nach dem Neuladen des Lehrplans: {str(e)}")
+        print(f"Lehrplan neu geladen: {len(lehrplan)} Themen (Version {lehrplan.version})")
+        return True
@@ -0,0 +1,345 @@
+# llm_client.py
+# Gemeinsamer Zugang zur OpenAI-API für alle Routen
+
+"""
+Alle Routen rufen das Sprachmodell über LLMClient auf statt direkt über
+das modulglobale openai.chat.completions.create. Der Client kümmert sich um:
+
+- einen eigenen OpenAI-Client (mit Keep-Alive-Verbindungspool) pro Worker-Prozess
+- Zeitlimits pro Versuch und eine Gesamtfrist pro Aufruf
+- Wiederholungen bei 429/5xx mit exponentiellem Backoff + Jitter (Retry-After wird beachtet)
+- einen Circuit Breaker, der bei anhaltenden Fehlern sofort abbricht und
+  halb offen nur einen Probeaufruf durchlässt (bei Streams zählt erst das Ende)
+- optional den Scheduler (scheduler.py), der die Ratenlimits einhält
+- das Bündeln gleicher Aufrufe: läuft dieselbe Anfrage (ohne Stream) schon,
+  wartet ein zweiter Aufrufer auf deren Antwort statt erneut zu fragen
+
+Über OPENAI_BASE_URL lässt sich ein lokaler Stub-Server einsetzen.
+
+Das openai-Paket wird erst mit dem ersten Client importiert (allein das
+dauert mehrere hundert Millisekunden); vorladen() holt das beim Start
+nach, vorwaermen() zusätzlich mit einer ersten Verbindung zum Upstream.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+
+from kontext_fenster import zaehle_tokens
+from scheduler import PRIORITAET_CHAT, SchedulerUeberlastet, erstelle_scheduler
+
+
+class LLMNichtVerfuegbar(Exception):
+    """Das Sprachmodell ist gerade nicht erreichbar (Circuit Breaker offen oder Frist abgelaufen)."""
+
+
+# Sokratische Ersatz-Antwort, wenn das Modell nicht erreichbar ist
+FALLBACK_ANTWORT = {
+    "nachricht": "Lass uns kurz innehalten: Was weißt du selbst schon über dieses Thema? "
+                 "Schreib mir deine Gedanken, auch wenn du unsicher bist!",
+    "hilfe_stufe": 1,
+    "zeige_bild": False,
+    "bild_thema": None,
+    "konzept_verstanden": False,
+    "gebe_quellen": False,
+    "frustration_erkannt": False,
+    "fallback": True
+}
+
+openai = None
+WIEDERHOLBARE_FEHLER = ()
+
+
+def _openai_laden():
+    global openai, WIEDERHOLBARE_FEHLER
+    if openai is None:
+        import openai as modul
+        WIEDERHOLBARE_FEHLER = (
+            modul.RateLimitError,
+            modul.InternalServerError,
+            modul.APIConnectionError,  # schließt APITimeoutError ein
+        )
+        openai = modul
+    return openai
+
+
+class CircuitBreaker:
+    """Öffnet nach `schwelle` Fehlern in Folge für `pause` Sekunden."""
+
+    def __init__(self, schwelle=5, pause=30.0):
+        self.schwelle = schwelle
+        self.pause = pause
+        self.fehler_in_folge = 0
+        self.offen_bis = 0.0
+        self.probe_bis = 0.0  # > jetzt: ein Probeaufruf läuft (verfällt, falls er nie zurückmeldet)
+        self._lock = threading.Lock()
+
+    def erlaubt(self):
+        """True, wenn ein Aufruf raus darf; halb offen nur ein Probeaufruf, bis erfolg()/fehler() kommt."""
+        with self._lock:
+            if self.fehler_in_folge < self.schwelle:
+                return True
+            jetzt = time.monotonic()
+            if jetzt < self.offen_bis or jetzt < self.probe_bis:
+                return False
+            self.probe_bis = jetzt + self.pause
+            return True
+
+    def erfolg(self):
+        with self._lock:
+            self.fehler_in_folge = 0
+            self.offen_bis = 0.0
+            self.probe_bis = 0.0
+
+    def fehler(self):
+        with self._lock:
+            self.fehler_in_folge += 1
+            if self.fehler_in_folge >= self.schwelle:
+                self.offen_bis = time.monotonic() + self.pause
+            self.probe_bis = 0.0
+
+    def freigeben(self):
+        """Der Aufruf endete ohne Urteil (z.B. 400, Stream abgebrochen): nächste Probe zulassen."""
+        with self._lock:
+            self.probe_bis = 0.0
+
+    @property
+    def zustand(self):
+        if self.fehler_in_folge >= self.schwelle:
+            return 'offen' if time.monotonic() < self.offen_bis else 'halb_offen'
+        return 'geschlossen'
+
+
+class _Laufend:
+    __slots__ = ('fertig', 'response', 'fehler')
+
+    def __init__(self):
+        self.fertig = threading.Event()
+        self.response = None
+        self.fehler = None
+
+
+class _BegleiteterStream:
+    """
+    Reicht die Chunks eines Streams durch und meldet das Ergebnis erst am Ende
+    an den Breaker, die tatsächlichen Tokens (letzter Chunk, include_usage)
+    an den Scheduler.
+    """
+
+    def __init__(self, stream, breaker, scheduler=None, geschaetzt=0):
+        self._stream = stream
+        self._breaker = breaker
+        self._scheduler = scheduler
+        self._geschaetzt = geschaetzt
+
+    def __iter__(self):
+        usage = None
+        try:
+            for chunk in self._stream:
+                usage = getattr(chunk, 'usage', None) or usage
+                yield chunk
+        except WIEDERHOLBARE_FEHLER:
+            self._breaker.fehler()
+            raise
+        else:
+            self._breaker.erfolg()
+            if self._scheduler is not None and usage is not None:
+                self._scheduler.korrigieren(self._geschaetzt, usage.total_tokens)
+        finally:
+            self._breaker.freigeben()
+
+
+class LLMClient:
+    """Wrapper um chat.completions.create mit Timeouts, Retries und Circuit Breaker."""
+
+    def __init__(self, api_key=None, base_url=None, modell="gpt-4o-mini", timeout=20.0,
+                 frist=45.0, max_versuche=3, basis_wartezeit=0.5, max_wartezeit=8.0,
+                 breaker=None, scheduler=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.modell = modell
+        self.timeout = timeout
+        self.frist = frist
+        self.max_versuche = max_versuche
+        self.basis_wartezeit = basis_wartezeit
+        self.max_wartezeit = max_wartezeit
+        self.breaker = breaker or CircuitBreaker()
+        self.scheduler = scheduler
+        self._client = None
+        self._lock = threading.Lock()
+        self._laufend = {}  # Anfrage (JSON) -> _Laufend
+        self.gebuendelt = 0
+        # Nach einem fork darf der Verbindungspool des Elternprozesses nicht weiterbenutzt werden
+        os.register_at_fork(after_in_child=self._zuruecksetzen)
+
+    def _zuruecksetzen(self):
+        self._client = None
+        self._lock = threading.Lock()
+        self._laufend = {}
+
+    @property
+    def client(self):
+        """Der OpenAI-Client dieses Prozesses (hält den Keep-Alive-Pool)."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = _openai_laden().OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        max_retries=0  # Wiederholungen macht dieser Wrapper selbst
+                    )
+        return self._client
+
+    def vorladen(self):
+        """Importiert openai jetzt statt beim ersten Aufruf (z.B. im gunicorn-Master vor dem fork)."""
+        _openai_laden()
+
+    def vorwaermen(self):
+        """Baut den Client und eine erste Keep-Alive-Verbindung zum Upstream auf; Fehler nur im Log."""
+        start = time.perf_counter()
+        try:
+            # Leichter GET ohne Tokenverbrauch; die Verbindung bleibt danach im Pool
+            self.client.models.list(timeout=self.timeout)
+        except Exception as e:
+            if not isinstance(e, getattr(openai, 'APIStatusError', ())):
+                print(f"LLM-Verbindung nicht vorgewärmt: {str(e)}")
+                return
+        print(f"LLM-Verbindung vorgewärmt in {1000 * (time.perf_counter() - start):.0f} ms")
+
+    def _wartezeit(self, versuch, fehler):
+        """Exponentieller Backoff mit vollem Jitter; Retry-After hat Vorrang."""
+        antwort = getattr(fehler, 'response', None)
+        if antwort is not None:
+            retry_after = antwort.headers.get('retry-after')
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.max_wartezeit)
+                except ValueError:
+                    pass
+        return random.uniform(0, min(self.max_wartezeit, self.basis_wartezeit * 2 ** versuch))
+
+    def erstelle(self, messages, max_tokens=500, temperature=0.7, frist=None,
+                 session_id=None, prioritaet=PRIORITAET_CHAT, **kwargs):
+        """
+        Ruft chat.completions.create auf. Gleiche Aufrufe, die gerade laufen,
+        werden gebündelt (nicht bei stream=True): alle bekommen dieselbe Antwort.
+
+        Args:
+            session_id (str): Für die faire Warteschlange des Schedulers
+            prioritaet (int): PRIORITAET_START / _CHAT / _HINTERGRUND
+
+        Raises:
+            LLMNichtVerfuegbar: Circuit Breaker offen, Warteschlange überlastet
+                oder alle Versuche gescheitert
+        """
+        if kwargs.get('stream'):
+            return self._erstelle(messages, max_tokens, temperature, frist, session_id, prioritaet, **kwargs)
+
+        schluessel = json.dumps([kwargs.get('model', self.modell), messages, max_tokens, temperature, kwargs],
+                                sort_keys=True, default=str)
+        with self._lock:
+            laufend = self._laufend.get(schluessel)
+            eigener = laufend is None
+            if eigener:
+                laufend = self._laufend[schluessel] = _Laufend()
+            else:
+                self.gebuendelt += 1
+        if not eigener:
+            # Der erste Aufrufer wartet evtl. noch im Scheduler, dann gilt seine Frist
+            warten = (frist or self.frist) + (self.scheduler.max_wartezeit if self.scheduler else 0)
+            if not laufend.fertig.wait(warten):
+                raise LLMNichtVerfuegbar('Frist abgelaufen')
+            if laufend.fehler is not None:
+                raise laufend.fehler
+            return laufend.response
+        try:
+            laufend.response = self._erstelle(messages, max_tokens, temperature, frist, session_id,
+                                              prioritaet, **kwargs)
+            return laufend.response
+        except Exception as e:
+            laufend.fehler = e
+            raise
+        finally:
+            with self._lock:
+                del self._laufend[schluessel]
+            laufend.fertig.set()
+
+    def _erstelle(self, messages, max_tokens, temperature, frist, session_id, prioritaet, **kwargs):
+        if not self.breaker.erlaubt():
+            raise LLMNichtVerfuegbar('Circuit Breaker offen')
+        stream = None
+        try:
+            stream = self._versuchen(messages, max_tokens, temperature, frist, session_id, prioritaet, **kwargs)
+            return stream
+        finally:
+            # Ohne Urteil (Scheduler, 400, ...) ist die Probe vorbei; ein Stream gibt sie erst am Ende frei
+            if not isinstance(stream, _BegleiteterStream):
+                self.breaker.freigeben()
+
+    def _versuchen(self, messages, max_tokens, temperature, frist, session_id, prioritaet, **kwargs):
+        geschaetzt = 0
+        if self.scheduler is not None:
+            geschaetzt = sum(zaehle_tokens(n['content']) for n in messages) + max_tokens
+            try:
+                self.scheduler.warten(session_id, prioritaet, geschaetzt)
+            except SchedulerUeberlastet as e:
+                raise LLMNichtVerfuegbar(str(e))
+
+        modell = kwargs.pop('model', self.modell)
+        if kwargs.get('stream'):
+            # Nur so kennt der Scheduler am Ende die tatsächlichen Tokens
+            kwargs.setdefault('stream_options', {'include_usage': True})
+        ende = time.monotonic() + (frist or self.frist)
+        letzter_fehler = None
+        for versuch in range(self.max_versuche):
+            rest = ende - time.monotonic()
+            if rest <= 0:
+                break
+            try:
+                response = self.client.chat.completions.create(
+                    model=modell,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    timeout=min(self.timeout, rest),
+                    **kwargs
+                )
+                if kwargs.get('stream'):
+                    # Erfolg oder Fehler zählt erst, wenn der Stream ganz gelesen ist
+                    return _BegleiteterStream(response, self.breaker, self.scheduler, geschaetzt)
+                self.breaker.erfolg()
+                usage = getattr(response, 'usage', None)
+                if self.scheduler is not None and usage is not None:
+                    self.scheduler.korrigieren(geschaetzt, usage.total_tokens)
+                return response
+            except WIEDERHOLBARE_FEHLER as e:
+                letzter_fehler = e
+                self.breaker.fehler()
+                if self.breaker.zustand == 'offen':
+                    break
+                warten = self._wartezeit(versuch, e)
+                if time.monotonic() + warten >= ende or versuch == self.max_versuche - 1:
+                    break
+                time.sleep(warten)
+
+        raise LLMNichtVerfuegbar(str(letzter_fehler) if letzter_fehler else 'Frist abgelaufen')
+
+
+def erstelle_llm_client():
+    """Konfiguriert den Client über Umgebungsvariablen (OPENAI_API_KEY, OPENAI_BASE_URL, LLM_*)."""
+    return LLMClient(
+        api_key=os.environ.get('OPENAI_API_KEY'),
+        base_url=os.environ.get('OPENAI_BASE_URL') or None,
+        modell=os.environ.get('LLM_MODELL', 'gpt-4o-mini'),
+        timeout=float(os.environ.get('LLM_TIMEOUT', 20)),
+        frist=float(os.environ.get('LLM_FRIST', 45)),
+        max_versuche=int(os.environ.get('LLM_MAX_VERSUCHE', 3)),
+        breaker=CircuitBreaker(
+            schwelle=int(os.environ.get('LLM_BREAKER_SCHWELLE', 5)),
+            pause=float(os.environ.get('LLM_BREAKER_PAUSE', 30))
+        ),
+        scheduler=erstelle_scheduler() if os.environ.get('SCHEDULER', '1') != '0' else None
+    )
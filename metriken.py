@@ -0,0 +1,300 @@
+# metriken.py
+# Messpunkte für den Tutor-Hot-Path und Export im Prometheus-Format
+
+"""
+Pro Anfrage werden die Zeiten der einzelnen Phasen (Session laden, Prompt
+bauen, Upstream warten, Antwort parsen, serialisieren ...) gesammelt, dazu
+Token-Verbrauch aus response.usage, Verlaufslänge und Cache-Trefferquoten.
+
+- /metrics liefert Histogramme, Zähler und Messwerte im Prometheus-Textformat
+- mit JSON_LOG=1 wird pro Anfrage eine strukturierte JSON-Zeile geloggt
+- Chat-Züge über eine langlebige Verbindung (WebSocket) werden mit
+  zug_erfassen() einzeln gemessen, als wären es eigene Anfragen
+- startphase() misst die Initialisierung beim Import der App (Lehrplan,
+  Modelle, Assets), exportiert als tutor_start_phase_sekunden
+- mit METRIKEN=0 ist alles abgeschaltet; phase() gibt dann einen
+  geteilten No-Op-Kontextmanager zurück, der Overhead ist praktisch null
+
+Bewusst ohne prometheus_client, das Textformat ist simpel genug.
+"""
+
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+from flask import g, has_app_context, request
+
+AKTIV = os.environ.get('METRIKEN', '1') != '0'
+JSON_LOG = os.environ.get('JSON_LOG', '0') == '1'
+
+# Sekunden; deckt Cache-Treffer (ms) bis langsame Completions (10s+) ab
+ZEIT_GRENZEN = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+GROESSEN_GRENZEN = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_REGISTRY = []
+_NULL = contextlib.nullcontext()
+
+
+def _labels_text(namen, werte):
+    if not namen:
+        return ''
+    teile = []
+    for name, wert in zip(namen, werte):
+        wert = str(wert).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        teile.append(f'{name}="{wert}"')
+    return '{' + ','.join(teile) + '}'
+
+
+class Zaehler:
+    typ = 'counter'
+
+    def __init__(self, name, hilfe, labels=()):
+        self.name = name
+        self.hilfe = hilfe
+        self.labels = tuple(labels)
+        self._werte = {}
+        self._lock = threading.Lock()
+
+    def erhoehen(self, wert=1, **labels):
+        schluessel = tuple(labels.get(n, '') for n in self.labels)
+        with self._lock:
+            self._werte[schluessel] = self._werte.get(schluessel, 0) + wert
+
+    def zeilen(self):
+        with self._lock:
+            werte = dict(self._werte)
+        for schluessel, wert in sorted(werte.items()):
+            yield f"{self.name}{_labels_text(self.labels, schluessel)} {wert}"
+
+
+class Histogramm:
+    typ = 'histogram'
+
+    def __init__(self, name, hilfe, labels=(), grenzen=ZEIT_GRENZEN):
+        self.name = name
+        self.hilfe = hilfe
+        self.labels = tuple(labels)
+        self.grenzen = tuple(grenzen)
+        self._daten = {}  # schluessel -> [zaehler pro grenze..., +Inf, summe]
+        self._lock = threading.Lock()
+
+    def beobachten(self, wert, **labels):
+        schluessel = tuple(labels.get(n, '') for n in self.labels)
+        with self._lock:
+            daten = self._daten.get(schluessel)
+            if daten is None:
+                daten = self._daten[schluessel] = [0] * (len(self.grenzen) + 1) + [0.0]
+            for i, grenze in enumerate(self.grenzen):
+                if wert <= grenze:
+                    daten[i] += 1
+            daten[len(self.grenzen)] += 1
+            daten[-1] += wert
+
+    def zeilen(self):
+        with self._lock:
+            kopie = {k: list(v) for k, v in self._daten.items()}
+        for schluessel, daten in sorted(kopie.items()):
+            for i, grenze in enumerate(self.grenzen):
+                yield (f"{self.name}_bucket"
+                       f"{_labels_text(self.labels + ('le',), schluessel + (grenze,))} {daten[i]}")
+            anzahl = daten[len(self.grenzen)]
+            yield f"{self.name}_bucket{_labels_text(self.labels + ('le',), schluessel + ('+Inf',))} {anzahl}"
+            yield f"{self.name}_sum{_labels_text(self.labels, schluessel)} {daten[-1]}"
+            yield f"{self.name}_count{_labels_text(self.labels, schluessel)} {anzahl}"
+
+
+class Messwert:
+    """Gauge, dessen Wert(e) beim Abruf von /metrics über eine Funktion ermittelt werden."""
+
+    typ = 'gauge'
+
+    def __init__(self, name, hilfe, funktion, labels=()):
+        self.name = name
+        self.hilfe = hilfe
+        self.funktion = funktion
+        self.labels = tuple(labels)
+
+    def zeilen(self):
+        try:
+            wert = self.funktion()
+        except Exception as e:
+            print(f"Fehler beim Messwert {self.name}: {str(e)}")
+            return
+        if isinstance(wert, dict):
+            for schluessel, w in sorted(wert.items(), key=lambda e: str(e[0])):
+                if not isinstance(schluessel, tuple):
+                    schluessel = (schluessel,)
+                yield f"{self.name}{_labels_text(self.labels, schluessel)} {float(w)}"
+        else:
+            yield f"{self.name} {float(wert)}"
+
+
+def _registrieren(metrik):
+    _REGISTRY.append(metrik)
+    return metrik
+
+
+def zaehler(name, hilfe, labels=()):
+    return _registrieren(Zaehler(name, hilfe, labels))
+
+
+def histogramm(name, hilfe, labels=(), grenzen=ZEIT_GRENZEN):
+    return _registrieren(Histogramm(name, hilfe, labels, grenzen))
+
+
+def messwert(name, hilfe, funktion, labels=()):
+    return _registrieren(Messwert(name, hilfe, funktion, labels))
+
+
+def prometheus_text():
+    """Alle registrierten Metriken im Prometheus-Textformat (Version 0.0.4)."""
+    zeilen = []
+    for metrik in _REGISTRY:
+        zeilen.append(f"# HELP {metrik.name} {metrik.hilfe}")
+        zeilen.append(f"# TYPE {metrik.name} {metrik.typ}")
+        zeilen.extend(metrik.zeilen())
+    return '\n'.join(zeilen) + '\n'
+
+
+# Metriken des Hot-Paths
+ANFRAGE_DAUER = histogramm('tutor_anfrage_dauer_sekunden', 'Gesamtdauer pro Anfrage',
+                           labels=('route', 'status'))
+PHASE_DAUER = histogramm('tutor_phase_dauer_sekunden', 'Dauer einzelner Phasen einer Anfrage',
+                         labels=('route', 'phase'))
+TOKENS = zaehler('tutor_llm_tokens_total', 'Tokens laut response.usage', labels=('route', 'art'))
+VERLAUF_LAENGE = histogramm('tutor_verlauf_nachrichten', 'Nachrichten im Verlauf pro Chat-Zug',
+                            grenzen=GROESSEN_GRENZEN)
+CACHE = zaehler('tutor_cache_zugriffe_total', 'Cache-Zugriffe nach Ergebnis', labels=('cache', 'ergebnis'))
+
+
+class _Phase:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        dauer = time.perf_counter() - self.start
+        if has_app_context():
+            phasen = g.setdefault('_metrik_phasen', {})
+            phasen[self.name] = phasen.get(self.name, 0.0) + dauer
+        return False
+
+
+# Dauer der Start-Phasen (einmal pro Prozess, Sekunden)
+STARTPHASEN = {}
+
+
+@contextlib.contextmanager
+def startphase(name):
+    """Misst einen Initialisierungsschritt beim Start; läuft auch mit METRIKEN=0 (einmalig, billig)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTPHASEN[name] = STARTPHASEN.get(name, 0.0) + time.perf_counter() - start
+
+
+def phase(name):
+    """Kontextmanager, der die Dauer einer Phase der laufenden Anfrage misst."""
+    if not AKTIV:
+        return _NULL
+    return _Phase(name)
+
+
+def tokens_erfassen(usage):
+    """Übernimmt prompt/completion tokens aus response.usage."""
+    if not AKTIV or usage is None:
+        return
+    route = _route()
+    TOKENS.erhoehen(usage.prompt_tokens, route=route, art='prompt')
+    TOKENS.erhoehen(usage.completion_tokens, route=route, art='completion')
+    if has_app_context():
+        bisher = g.setdefault('_metrik_tokens', {'prompt': 0, 'completion': 0})
+        bisher['prompt'] += usage.prompt_tokens
+        bisher['completion'] += usage.completion_tokens
+
+
+def verlauf_erfassen(anzahl_nachrichten):
+    if not AKTIV:
+        return
+    VERLAUF_LAENGE.beobachten(anzahl_nachrichten)
+    if has_app_context():
+        g._metrik_verlauf = anzahl_nachrichten
+
+
+def cache_erfassen(cache, treffer):
+    if AKTIV:
+        CACHE.erhoehen(cache=cache, ergebnis='treffer' if treffer else 'fehlschlag')
+
+
+def _route():
+    if not has_app_context():
+        return 'hintergrund'
+    try:
+        return request.url_rule.rule if request.url_rule else 'unbekannt'
+    except RuntimeError:
+        return 'hintergrund'
+
+
+def _anfrage_erfassen(dauer, status):
+    route = _route()
+    ANFRAGE_DAUER.beobachten(dauer, route=route, status=status)
+    phasen = g.get('_metrik_phasen', {})
+    for name, wert in phasen.items():
+        PHASE_DAUER.beobachten(wert, route=route, phase=name)
+    if JSON_LOG:
+        print(json.dumps({
+            'ts': round(time.time(), 3),
+            'route': route,
+            'status': status,
+            'dauer_ms': round(dauer * 1000, 2),
+            'phasen_ms': {n: round(w * 1000, 2) for n, w in phasen.items()},
+            'tokens': g.get('_metrik_tokens'),
+            'verlauf': g.get('_metrik_verlauf')
+        }, ensure_ascii=False), file=sys.stdout, flush=True)
+
+
+def zug_erfassen(start, status=200):
+    """Misst einen Zug innerhalb einer langlebigen Anfrage und setzt deren Phasen zurück."""
+    if not AKTIV:
+        return
+    _anfrage_erfassen(time.perf_counter() - start, status)
+    for name in ('_metrik_phasen', '_metrik_tokens', '_metrik_verlauf'):
+        g.pop(name, None)
+
+
+def einrichten(app, routen=None):
+    """
+    Hängt die Messung an die App.
+
+    Args:
+        routen (set): Nur diese Endpunkte messen (None = alle außer /metrics und static)
+    """
+    if not AKTIV:
+        return
+
+    @app.before_request
+    def _metrik_start():
+        g._metrik_start = time.perf_counter()
+
+    @app.teardown_request
+    def _metrik_ende(fehler=None):
+        start = g.get('_metrik_start')
+        if start is None or request.endpoint in (None, 'static', 'metrics'):
+            return
+        if routen is not None and request.endpoint not in routen:
+            return
+        _anfrage_erfassen(time.perf_counter() - start, g.get('_metrik_status', 500 if fehler else 200))
+
+    @app.after_request
+    def _metrik_status(response):
+        g._metrik_status = response.status_code
+        return response
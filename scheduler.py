@@ -0,0 +1,267 @@
+# scheduler.py
+# Ratenlimit-bewusster Scheduler vor den Aufrufen des Sprachmodells
+
+"""
+Wenn eine ganze Klasse gleichzeitig schreibt, überschreiten wir schnell die
+OpenAI-Limits pro Minute (Anfragen und Tokens) - und alle bekommen zugleich
+Fehler. Der Scheduler lässt Aufrufe nur durch, solange beide Token-Buckets
+Kapazität haben, und reiht die übrigen ein:
+
+- Priorität: /start und Themenwechsel vor Folge-Zügen vor Hintergrundarbeit
+- Fairness: innerhalb einer Priorität reihum pro Session (Round Robin),
+  ein einzelner Schüler kann die anderen nicht aushungern
+
+Die Buckets liegen im Prozess oder optional in einer SQLite-Datei, die sich
+mehrere Worker teilen.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+PRIORITAET_START = 0
+PRIORITAET_CHAT = 1
+PRIORITAET_HINTERGRUND = 2
+
+
+class SchedulerUeberlastet(Exception):
+    """Die maximale Wartezeit in der Warteschlange wurde überschritten."""
+
+
+class TokenBucket:
+    """Klassischer Token-Bucket: `kapazitaet` Einheiten, Nachfüllen mit `rate` pro Sekunde."""
+
+    def __init__(self, pro_minute):
+        self.kapazitaet = float(pro_minute)
+        self.rate = pro_minute / 60.0
+        self.stand = float(pro_minute)
+        self.zeit = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _nachfuellen(self):
+        jetzt = time.monotonic()
+        self.stand = min(self.kapazitaet, self.stand + (jetzt - self.zeit) * self.rate)
+        self.zeit = jetzt
+
+    def _wartezeit(self, menge):
+        self._nachfuellen()
+        menge = min(menge, self.kapazitaet)
+        if self.stand >= menge:
+            return 0.0
+        return (menge - self.stand) / self.rate
+
+    def wartezeit(self, menge):
+        """Sekunden bis `menge` verfügbar ist (0 = sofort)."""
+        with self._lock:
+            return self._wartezeit(menge)
+
+    def entnehmen(self, menge):
+        with self._lock:
+            self._nachfuellen()
+            self.stand -= min(menge, self.kapazitaet)
+
+    def versuche_entnehmen(self, menge):
+        """Entnimmt `menge`, wenn verfügbar; gibt sonst die Wartezeit zurück (0 = entnommen)."""
+        with self._lock:
+            pause = self._wartezeit(menge)
+            if pause == 0:
+                self.stand -= min(menge, self.kapazitaet)
+            return pause
+
+    def gutschreiben(self, menge):
+        with self._lock:
+            self._nachfuellen()
+            self.stand = min(self.kapazitaet, self.stand + min(menge, self.kapazitaet))
+
+
+class SQLiteTokenBucket:
+    """Token-Bucket, dessen Stand in SQLite liegt und von mehreren Workern geteilt wird."""
+
+    def __init__(self, pro_minute, pfad, name):
+        self.kapazitaet = float(pro_minute)
+        self.rate = pro_minute / 60.0
+        self.pfad = pfad
+        self.name = name
+        self._lokal = threading.local()
+        # SQLite-Verbindungen dürfen einen fork nicht überleben (z.B. gunicorn --preload)
+        os.register_at_fork(after_in_child=self._zuruecksetzen)
+        db = self._db()
+        db.execute('CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, stand REAL, zeit REAL)')
+        db.execute('INSERT OR IGNORE INTO buckets VALUES (?, ?, ?)', (name, self.kapazitaet, time.time()))
+
+    def _zuruecksetzen(self):
+        self._lokal = threading.local()
+
+    def _db(self):
+        db = getattr(self._lokal, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.pfad, timeout=10, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            self._lokal.db = db
+        return db
+
+    def _stand(self, db):
+        stand, zeit = db.execute('SELECT stand, zeit FROM buckets WHERE name = ?', (self.name,)).fetchone()
+        jetzt = time.time()
+        return min(self.kapazitaet, stand + (jetzt - zeit) * self.rate), jetzt
+
+    def wartezeit(self, menge):
+        stand, _ = self._stand(self._db())
+        menge = min(menge, self.kapazitaet)
+        return 0.0 if stand >= menge else (menge - stand) / self.rate
+
+    def _aendern(self, menge, nur_wenn_verfuegbar=False):
+        # Prüfen und Buchen in einer Transaktion, sonst entnehmen zwei Worker dieselben Tokens
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            stand, jetzt = self._stand(db)
+            if nur_wenn_verfuegbar and stand < menge:
+                db.execute('ROLLBACK')
+                return (menge - stand) / self.rate
+            db.execute('UPDATE buckets SET stand = ?, zeit = ? WHERE name = ?',
+                       (min(self.kapazitaet, stand - menge), jetzt, self.name))
+            db.execute('COMMIT')
+            return 0.0
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+
+    def entnehmen(self, menge):
+        self._aendern(min(menge, self.kapazitaet))
+
+    def versuche_entnehmen(self, menge):
+        """Entnimmt `menge`, wenn verfügbar; gibt sonst die Wartezeit zurück (0 = entnommen)."""
+        return self._aendern(min(menge, self.kapazitaet), nur_wenn_verfuegbar=True)
+
+    def gutschreiben(self, menge):
+        self._aendern(-min(menge, self.kapazitaet))
+
+
+class _Ticket:
+    __slots__ = ('session_id', 'prioritaet', 'tokens', 'eingereiht')
+
+    def __init__(self, session_id, prioritaet, tokens):
+        self.session_id = session_id
+        self.prioritaet = prioritaet
+        self.tokens = tokens
+        self.eingereiht = time.monotonic()
+
+
+class Scheduler:
+    """Faire, priorisierte Warteschlange vor den Upstream-Aufrufen."""
+
+    def __init__(self, anfragen_pro_minute=500, tokens_pro_minute=200000, max_wartezeit=30.0,
+                 bucket_datei=None):
+        if bucket_datei:
+            self.anfragen = SQLiteTokenBucket(anfragen_pro_minute, bucket_datei, 'anfragen')
+            self.tokens = SQLiteTokenBucket(tokens_pro_minute, bucket_datei, 'tokens')
+        else:
+            self.anfragen = TokenBucket(anfragen_pro_minute)
+            self.tokens = TokenBucket(tokens_pro_minute)
+        self.max_wartezeit = max_wartezeit
+        # prioritaet -> OrderedDict(session_id -> deque[_Ticket]); Reihenfolge = Round Robin
+        self._warteschlangen = {}
+        self._cond = threading.Condition()
+        self.statistik = {
+            'durchgelassen': 0,
+            'abgewiesen': 0,
+            'wartezeit_summe': 0.0,
+            'wartezeit_max': 0.0
+        }
+
+    def _naechstes(self):
+        for prioritaet in sorted(self._warteschlangen):
+            sessions = self._warteschlangen[prioritaet]
+            if sessions:
+                return next(iter(sessions.values()))[0]
+        return None
+
+    def _entfernen(self, ticket, bedient):
+        sessions = self._warteschlangen[ticket.prioritaet]
+        schlange = sessions[ticket.session_id]
+        schlange.remove(ticket)
+        if not schlange:
+            del sessions[ticket.session_id]
+        elif bedient:
+            # Session ans Ende der Runde stellen
+            sessions.move_to_end(ticket.session_id)
+
+    def warten(self, session_id, prioritaet=PRIORITAET_CHAT, tokens=0):
+        """
+        Blockiert, bis der Aufruf an der Reihe ist und die Limits ihn zulassen.
+
+        Returns:
+            float: Wartezeit in Sekunden
+
+        Raises:
+            SchedulerUeberlastet: max_wartezeit überschritten
+        """
+        ticket = _Ticket(session_id or '-', prioritaet, tokens)
+        frist = ticket.eingereiht + self.max_wartezeit
+        with self._cond:
+            self._warteschlangen.setdefault(prioritaet, OrderedDict()) \
+                .setdefault(ticket.session_id, deque()).append(ticket)
+        while True:
+            with self._cond:
+                vorne = self._naechstes() is ticket
+            # Die Buckets (evtl. eine SQLite-Transaktion, die auf andere Worker wartet)
+            # ohne die Bedingung: sonst stünden auch korrigieren() und /metrics still
+            pause = 0.5
+            if vorne:
+                pause = self.anfragen.versuche_entnehmen(1)
+                if pause == 0:
+                    pause = self.tokens.versuche_entnehmen(tokens)
+                    if pause > 0:
+                        # Ohne Tokens zählt auch die Anfrage nicht
+                        self.anfragen.gutschreiben(1)
+            with self._cond:
+                jetzt = time.monotonic()
+                if vorne and pause == 0:
+                    self._entfernen(ticket, bedient=True)
+                    gewartet = jetzt - ticket.eingereiht
+                    self.statistik['durchgelassen'] += 1
+                    self.statistik['wartezeit_summe'] += gewartet
+                    self.statistik['wartezeit_max'] = max(self.statistik['wartezeit_max'], gewartet)
+                    self._cond.notify_all()
+                    return gewartet
+                if not vorne and self._naechstes() is ticket:
+                    continue  # inzwischen an der Reihe, das notify kam zwischen den Sperren
+                if jetzt + pause > frist:
+                    self._entfernen(ticket, bedient=False)
+                    self.statistik['abgewiesen'] += 1
+                    self._cond.notify_all()
+                    raise SchedulerUeberlastet(f'Wartezeit über {self.max_wartezeit}s')
+                self._cond.wait(timeout=min(pause, 0.5))
+
+    def korrigieren(self, geschaetzt, tatsaechlich):
+        """Gleicht die Schätzung nachträglich mit response.usage ab."""
+        differenz = tatsaechlich - geschaetzt
+        if differenz > 0:
+            self.tokens.entnehmen(differenz)
+
+    def warteschlangen_tiefe(self):
+        """Anzahl wartender Aufrufe pro Priorität."""
+        with self._cond:
+            return {
+                prioritaet: sum(len(schlange) for schlange in sessions.values())
+                for prioritaet, sessions in self._warteschlangen.items()
+            }
+
+    def metriken(self):
+        s = dict(self.statistik)
+        s['wartezeit_mittel'] = s['wartezeit_summe'] / s['durchgelassen'] if s['durchgelassen'] else 0.0
+        s['warteschlange'] = self.warteschlangen_tiefe()
+        return s
+
+
+def erstelle_scheduler():
+    """Konfiguration über Umgebungsvariablen (LIMIT_ANFRAGEN_PRO_MINUTE, LIMIT_TOKENS_PRO_MINUTE, ...)."""
+    return Scheduler(
+        anfragen_pro_minute=int(os.environ.get('LIMIT_ANFRAGEN_PRO_MINUTE', 500)),
+        tokens_pro_minute=int(os.environ.get('LIMIT_TOKENS_PRO_MINUTE', 200000)),
+        max_wartezeit=float(os.environ.get('SCHEDULER_MAX_WARTEZEIT', 30)),
+        bucket_datei=os.environ.get('SCHEDULER_DB')
+    )
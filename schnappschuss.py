@@ -0,0 +1,89 @@
+# schnappschuss.py
+# Vorberechnete Startdaten (Lehrplan, Schnellpfad-Modell) für einen schnellen Kaltstart
+
+"""
+Was beim Start aus Quelldateien berechnet wird (YAML parsen, Modell
+trainieren), liegt nach dem ersten Mal als JSON in SNAPSHOT_VERZEICHNIS.
+Der Dateiname enthält einen Hash der Quellen: ändert sich eine Quelle,
+passt kein Schnappschuss mehr, es wird neu berechnet und der alte ersetzt.
+Ein fehlender oder kaputter Schnappschuss ist nie ein Fehler, dann wird
+eben gerechnet. SNAPSHOT=0 schaltet ab.
+
+Beim Deploy einmal vorab erzeugen (render.yaml):
+    python schnappschuss.py
+"""
+
+import contextlib
+import glob
+import hashlib
+import json
+import os
+
+AKTIV = os.environ.get('SNAPSHOT', '1') != '0'
+SNAPSHOT_VERZEICHNIS = os.environ.get(
+    'SNAPSHOT_VERZEICHNIS',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.snapshot')
+)
+
+
+def schluessel(*quellen):
+    """Kurzer Hash über Bytes/Texte, z.B. Dateiinhalt und Quelltext des Erzeugers."""
+    h = hashlib.blake2b(digest_size=8)
+    for quelle in quellen:
+        h.update(quelle if isinstance(quelle, bytes) else str(quelle).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def _pfad(name, schluessel):
+    return os.path.join(SNAPSHOT_VERZEICHNIS, f"{name}.{schluessel}.json")
+
+
+def laden(name, schluessel):
+    """Gespeicherte Daten oder None"""
+    if not AKTIV:
+        return None
+    try:
+        with open(_pfad(name, schluessel), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def speichern(name, schluessel, daten):
+    """Schreibt atomar und räumt ältere Schnappschüsse desselben Namens weg; Fehler nur im Log."""
+    if not AKTIV:
+        return
+    ziel = _pfad(name, schluessel)
+    tmp = f"{ziel}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(SNAPSHOT_VERZEICHNIS, exist_ok=True)
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(daten, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp, ziel)
+        for alt in glob.glob(os.path.join(SNAPSHOT_VERZEICHNIS, f"{glob.escape(name)}.*.json")):
+            if alt != ziel:
+                with contextlib.suppress(FileNotFoundError):  # ein anderer Worker war schneller
+                    os.remove(alt)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"Schnappschuss {name} nicht gespeichert: {str(e)}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def laden_oder_berechnen(name, schluessel, berechnen):
+    daten = laden(name, schluessel)
+    if daten is None:
+        daten = berechnen()
+        speichern(name, schluessel, daten)
+    return daten
+
+
+if __name__ == '__main__':
+    from lehrplan import lehrplan_laden
+    from schnellpfad import modell_laden
+
+    lehrplan = lehrplan_laden()
+    print(f"Lehrplan: {len(lehrplan)} Themen (Version {lehrplan.version})")
+    print(f"Schnellpfad-Modell: {'bereit' if modell_laden() else 'keine Beispiele'}")
+    print(f"Schnappschüsse in {SNAPSHOT_VERZEICHNIS}")
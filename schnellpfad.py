@@ -0,0 +1,385 @@
+# schnellpfad.py
+# Lokaler Absicht-Klassifikator: triviale Chat-Züge ohne Sprachmodell beantworten
+
+"""
+Ein guter Teil der Schüler-Nachrichten ist "keine Ahnung", "sag's mir
+einfach", "das ist zu schwer" oder "zeig mir ein Bild". Wie der Tutor
+darauf reagiert, legt TUTOR_SYSTEM_PROMPT ohnehin fest (Frustration
+erkennen, nächste Hilfe-Stufe, ab Stufe 3 ein Bild) - dafür braucht es
+keinen Upstream-Aufruf.
+
+Erkennung in drei Schritten, alles reine CPU-Arbeit im Mikrosekundenbereich:
+
+1. Regeln: eindeutige Formulierungen (ganze Nachricht) -> Konfidenz 1.0
+2. Nachrichten mit einem Fachbegriff aus den Bild-Keywords ("keine Ahnung,
+   vielleicht Zucker") sind inhaltlich und gehen immer an das Sprachmodell
+3. ein kleines lineares Modell (Softmax-Regression über Zeichen-n-Gramme
+   und Wörter), aus schnellpfad_beispiele.yaml trainiert; die Gewichte
+   liegen als Schnappschuss vor, solange sich Beispiele und Code nicht ändern.
+   Kurze Nachrichten ("keine", "ich weiß es") verstehen sich nur mit der
+   Frage des Tutors und gehen am Modell vorbei an das Sprachmodell, und
+   "weiss_nicht" gilt nur mit Verneinung und Wissens-Wort ("nicht" + "weiß")
+
+Nur wenn die Absicht beantwortbar ist und die Konfidenz über der Schwelle
+liegt, gibt es eine Vorlagen-Antwort mit gestufter Hilfe passend zu den
+bisherigen Versuchen und mit Stichwort bzw. Bild aus BILDER. Alles andere
+(und jede längere Nachricht) geht wie bisher an das Sprachmodell.
+"""
+
+import math
+import os
+import random
+import re
+import threading
+import zlib
+
+try:
+    import yaml
+except ImportError:  # dann keine Beispiele, nur Regeln
+    yaml = None
+
+import image_resources
+import schnappschuss
+from semantik_cache import normalisieren, versuchs_stufe
+from vorauslader import ist_zustimmung
+
+BEISPIEL_DATEI = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schnellpfad_beispiele.yaml')
+
+ABSICHTEN = ('weiss_nicht', 'loesung_verlangt', 'frust', 'bild_wunsch', 'zustimmung', 'sonstiges')
+# "zustimmung" wird erkannt, aber nicht lokal beantwortet: ob "ja" reicht,
+# hängt von der Frage des Tutors ab
+BEANTWORTBAR = frozenset(('weiss_nicht', 'loesung_verlangt', 'frust', 'bild_wunsch'))
+
+# Längere Nachrichten enthalten fast immer Inhalt ("keine Ahnung, vielleicht Zucker?")
+MAX_WOERTER = 8
+# Kürzere Nachrichten ohne Regel-Treffer hängen von der Frage ab ("keine", "nicht"), wie im Semantik-Cache
+MIN_WOERTER = 3
+
+# Das Modell darf "weiss_nicht" nur vergeben, wenn beides vorkommt ("ich weiß es" ist eine Antwort)
+VERNEINUNG = frozenset('nicht nichts nix kein keine keinen null'.split())
+WISSEN = frozenset('weiss weis wei ahnung idee plan schimmer drauf faellt einfall'.split())
+
+# Füllwörter vor und nach den Regel-Formulierungen
+_VORNE = r'(?:(?:hmm+|aeh+|oh+|boah|naja|also|ehrlich gesagt|leider|echt|wirklich|einfach|bitte|doch|jetzt|mal|schon) )*'
+_HINTEN = r'(?: (?:leider|echt|wirklich|bitte|doch|jetzt|mal|schon))*'
+
+# Jedes Muster geklammert, sonst gelten Füllwörter bei Alternativen (a|b|c) nur für die äußeren
+REGELN = tuple((absicht, re.compile(_VORNE + '(?:' + muster + ')' + _HINTEN)) for absicht, muster in (
+    ('weiss_nicht', r'(?:ich )?(?:weiss|weis|wei) (?:es |ich |das )?(?:leider |echt |wirklich )?nicht'),
+    ('weiss_nicht', r'(?:das )?(?:weiss|weis) ich (?:leider |echt )?nicht'),
+    ('weiss_nicht', r'(?:ich )?(?:hab|habe)? ?(?:echt |wirklich )?'
+                    r'(?:keine ahnung|keine idee|keinen plan|keinen schimmer)'),
+    ('weiss_nicht', r'kein plan|null plan|kp|ka|k a'),
+    ('loesung_verlangt', r'(?:sag|sags|verrat|verrate|nenn|gib) (?:du )?(?:mir )?(?:(?:doch|bitte|einfach) )*'
+                         r'(?:die (?:richtige )?(?:antwort|loesung)|es|das)?(?: einfach)?'),
+    ('loesung_verlangt', r'(?:was|wie) (?:ist|lautet) (?:denn )?die (?:richtige )?(?:antwort|loesung)(?: denn)?'),
+    ('loesung_verlangt', r'wo (?:kann ich|finde ich) (?:das|es) (?:nachgucken|nachlesen|nachschauen|finden)?'),
+    ('frust', r'(?:das ist )?(?:mir )?(?:viel |echt |einfach )?zu (?:schwer|kompliziert)'),
+    ('frust', r'ich (?:versteh|verstehe|check|checke|kapier|kapiere|raff|raffe) (?:das|es|gar nichts|nichts)'
+              r'(?: (?:nicht|gar nicht|ueberhaupt nicht))?'),
+    ('frust', r'ich (?:geb|gebe) auf|(?:ich (?:hab|habe) )?keine lust mehr'),
+    ('bild_wunsch', r'(?:kannst du mir )?(?:zeig|zeige) (?:mir )?(?:bitte )?(?:ein |das |mal ein )?'
+                    r'(?:bild|schaubild|grafik|abbildung)(?: dazu)?'),
+    ('bild_wunsch', r'(?:hast du|gibt es) (?:ein|eine) (?:bild|schaubild|grafik|abbildung|zeichnung)(?: dazu)?'),
+    ('bild_wunsch', r'bild'),
+))
+
+# Einleitung je Absicht, danach der Hilfetext der Stufe
+EINLEITUNG = {
+    'weiss_nicht': (
+        "Kein Problem, dafür bin ich ja da!",
+        "Macht gar nichts, wir finden das zusammen heraus!",
+    ),
+    'frust': (
+        "Ich verstehe, das ist knifflig!",
+        "Das geht vielen so, du bist damit nicht allein!",
+    ),
+    'loesung_verlangt': (
+        "Die Lösung verrate ich dir nicht - aber ich helfe dir, selbst draufzukommen!",
+        "Wenn du selbst draufkommst, bleibt es viel besser hängen - ich helfe dir dabei!",
+    ),
+}
+
+HILFE = {
+    1: (
+        "Fang ganz klein an: Was fällt dir spontan zu „{konzept}“ ein - auch nur ein einzelnes Wort?",
+        "Hast du den Begriff „{konzept}“ schon mal gehört, vielleicht im Unterricht?",
+    ),
+    2: (
+        "Ein Tipp: Denk bei „{konzept}“ mal an „{stichwort}“. Was weißt du darüber?",
+        "Kleiner Hinweis: „{stichwort}“ spielt bei „{konzept}“ eine wichtige Rolle. "
+        "Was könnte das damit zu tun haben?",
+    ),
+    3: (
+        "Schau dir dieses Bild an: {beschreibung}. Was erkennst du darauf?",
+        "Ich zeige dir was: {beschreibung}. Was fällt dir daran zu „{konzept}“ auf?",
+    ),
+    4: (
+        "Lass uns „{konzept}“ anders angehen: Wie würdest du es einem jüngeren Geschwisterkind erklären? "
+        "Wenn du magst, erkläre ich dir das Konzept auch nochmal ganz neu.",
+        "Lass uns das Konzept anders angehen und Schritt für Schritt vorgehen. "
+        "Was ist das Erste, das du über „{konzept}“ sicher weißt?",
+    ),
+}
+
+BILD_WUNSCH = (
+    "Gute Idee, schau dir dieses Bild an: {beschreibung}. Was fällt dir darauf zu „{konzept}“ auf?",
+    "Klar, hier ist ein Bild: {beschreibung}. Beschreib mir mal, was du darauf siehst!",
+)
+
+
+def merkmale(text):
+    """Binäre Merkmale eines normalisierten Textes: Wörter und Zeichen-2/3/4-Gramme mit Wortgrenzen."""
+    gepolstert = f' {text} '
+    ergebnis = {f'w:{wort}' for wort in text.split()}
+    for n in (2, 3, 4):
+        ergebnis.update(gepolstert[i:i + n] for i in range(len(gepolstert) - n + 1))
+    return ergebnis
+
+
+def _softmax(werte):
+    groesster = max(werte)
+    exp = [math.exp(w - groesster) for w in werte]
+    summe = sum(exp)
+    return [e / summe for e in exp]
+
+
+class AbsichtModell:
+    """Softmax-Regression über binäre n-Gramm-Merkmale, mit SGD trainiert."""
+
+    def __init__(self, absichten, gewichte, bias):
+        self.absichten = tuple(absichten)
+        self.gewichte = gewichte   # merkmal -> [gewicht pro absicht]
+        self.bias = bias
+
+    @classmethod
+    def trainieren(cls, beispiele, absichten=ABSICHTEN, epochen=5, lernrate=0.1, seed=0):
+        """
+        Wenige Epochen mit kleiner Lernrate: das Modell bleibt vorsichtig und
+        seine Wahrscheinlichkeiten taugen als Konfidenz für die Schwelle.
+
+        Args:
+            beispiele: [(text, absicht), ...]; Texte werden hier normalisiert
+        """
+        index = {a: i for i, a in enumerate(absichten)}
+        daten = [(merkmale(normalisieren(text)), index[absicht]) for text, absicht in beispiele]
+        gewichte = {}
+        bias = [0.0] * len(absichten)
+        zufall = random.Random(seed)
+        modell = cls(absichten, gewichte, bias)
+        for epoche in range(epochen):
+            zufall.shuffle(daten)
+            rate = lernrate / (1 + epoche * 0.2)
+            for mm, ziel in daten:
+                p = modell._wahrscheinlichkeiten(mm)
+                p[ziel] -= 1.0
+                for k, g in enumerate(p):
+                    bias[k] -= rate * g
+                for m in mm:
+                    w = gewichte.get(m)
+                    if w is None:
+                        w = gewichte[m] = [0.0] * len(absichten)
+                    for k, g in enumerate(p):
+                        w[k] -= rate * g
+        return modell
+
+    def als_dict(self):
+        # 6 Nachkommastellen reichen für die Konfidenz und halbieren den Schnappschuss
+        return {
+            'absichten': list(self.absichten),
+            'gewichte': {m: [round(g, 6) for g in w] for m, w in self.gewichte.items()},
+            'bias': [round(b, 6) for b in self.bias]
+        }
+
+    @classmethod
+    def aus_dict(cls, daten):
+        return cls(daten['absichten'], daten['gewichte'], daten['bias'])
+
+    def _wahrscheinlichkeiten(self, mm):
+        werte = list(self.bias)
+        for m in mm:
+            w = self.gewichte.get(m)
+            if w is not None:
+                for k, g in enumerate(w):
+                    werte[k] += g
+        return _softmax(werte)
+
+    def vorhersagen(self, text):
+        """
+        Returns:
+            tuple: (absicht, wahrscheinlichkeit) für einen normalisierten Text
+        """
+        p = self._wahrscheinlichkeiten(merkmale(text))
+        k = max(range(len(p)), key=p.__getitem__)
+        return self.absichten[k], p[k]
+
+
+def beispiele_laden(pfad=BEISPIEL_DATEI):
+    """[(text, absicht), ...] aus der Beispieldatei; leer, wenn sie fehlt oder PyYAML nicht da ist."""
+    if yaml is None or not os.path.exists(pfad):
+        return []
+    with open(pfad, 'rb') as f:
+        return _beispiele_lesen(f.read())
+
+
+def _beispiele_lesen(inhalt):
+    daten = yaml.load(inhalt, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader)) or {}
+    return [(str(text), absicht) for absicht, texte in daten.items() if absicht in ABSICHTEN for text in texte]
+
+
+def modell_laden(pfad=BEISPIEL_DATEI):
+    """Modell zur Beispieldatei aus dem Schnappschuss, sonst frisch trainiert; None ohne Beispiele."""
+    if yaml is None or not os.path.exists(pfad):
+        return None
+    with open(pfad, 'rb') as f:
+        inhalt = f.read()
+    # Der eigene Quelltext gehört zum Schlüssel: neue Merkmale oder Trainingsparameter ergeben ein neues Modell
+    with open(__file__, 'rb') as f:
+        schluessel = schnappschuss.schluessel(inhalt, f.read(), ABSICHTEN)
+    name = f"schnellpfad-{os.path.basename(pfad)}"
+    daten = schnappschuss.laden(name, schluessel)
+    if daten is not None:
+        return AbsichtModell.aus_dict(daten)
+    beispiele = _beispiele_lesen(inhalt)
+    if not beispiele:
+        return None
+    modell = AbsichtModell.trainieren(beispiele)
+    schnappschuss.speichern(name, schluessel, modell.als_dict())
+    return modell
+
+
+def enthaelt_fachbegriff(text):
+    """True, wenn die Nachricht ein Keyword eines Bildes (aus irgendeinem Thema) enthält."""
+    return any(image_resources.finde_passende_bilder(text, thema_id, max_anzahl=1)
+               for thema_id in image_resources.BILDER)
+
+
+def _auswahl(text, versuche, optionen):
+    """Stabile, aber abwechslungsreiche Wahl einer Formulierung"""
+    return optionen[zlib.crc32(f'{versuche}:{text}'.encode('utf-8')) % len(optionen)]
+
+
+class Schnellpfad:
+    """Klassifiziert Schüler-Nachrichten und baut für triviale Züge die Tutor-Antwort lokal."""
+
+    def __init__(self, modell=None, schwelle=0.8, max_woerter=MAX_WOERTER, min_woerter=MIN_WOERTER):
+        self.modell = modell
+        self.schwelle = schwelle
+        self.max_woerter = max_woerter
+        self.min_woerter = min_woerter
+        self._lock = threading.Lock()
+        self.statistik = {'anfragen': 0, 'beantwortet': 0}
+        self.pro_absicht = dict.fromkeys(ABSICHTEN, 0)
+
+    def klassifizieren(self, text):
+        """
+        Returns:
+            tuple: (absicht, konfidenz, quelle) mit quelle in 'regel', 'fachbegriff', 'laenge',
+                'verneinung', 'modell'
+        """
+        norm = normalisieren(text)
+        if not norm:
+            # Nur Satzzeichen oder Emojis: "???" heißt keine Ahnung, der Rest geht ans Modell
+            return ('weiss_nicht', 1.0, 'regel') if '?' in text else ('sonstiges', 1.0, 'regel')
+        if ist_zustimmung(text):
+            return 'zustimmung', 1.0, 'regel'
+        for absicht, muster in REGELN:
+            if muster.fullmatch(norm):
+                return absicht, 1.0, 'regel'
+        if enthaelt_fachbegriff(text):
+            return 'sonstiges', 1.0, 'fachbegriff'
+        woerter = norm.split()
+        if not self.min_woerter <= len(woerter) <= self.max_woerter or self.modell is None:
+            return 'sonstiges', 1.0, 'laenge'
+        absicht, konfidenz = self.modell.vorhersagen(norm)
+        if absicht == 'weiss_nicht' and not (VERNEINUNG.intersection(woerter) and WISSEN.intersection(woerter)):
+            return 'sonstiges', 1.0, 'verneinung'
+        return absicht, konfidenz, 'modell'
+
+    def antwort(self, text, thema_id, konzept, versuche):
+        """
+        Vorlagen-Antwort im Format von parse_antwort, oder None (dann das Sprachmodell fragen).
+
+        Args:
+            versuche (int): Versuche zum aktuellen Konzept einschließlich dieser Nachricht
+        """
+        absicht, konfidenz, _ = self.klassifizieren(text)
+        with self._lock:
+            self.statistik['anfragen'] += 1
+        if absicht not in BEANTWORTBAR or konfidenz < self.schwelle:
+            return None
+        antwort = self._antwort_bauen(absicht, text, thema_id, konzept, versuche)
+        if antwort is not None:
+            with self._lock:
+                self.statistik['beantwortet'] += 1
+                self.pro_absicht[absicht] += 1
+        return antwort
+
+    @staticmethod
+    def _bild_zum_konzept(thema_id, konzept):
+        """(bild_id, bild_info) des am besten passenden Bildes, sonst (None, None)"""
+        treffer = image_resources.finde_passende_bilder(konzept, thema_id, max_anzahl=1)
+        if not treffer:
+            return None, None
+        bild_id = treffer[0]['bild_id']
+        return bild_id, image_resources.BILDER[thema_id][bild_id]
+
+    def _antwort_bauen(self, absicht, text, thema_id, konzept, versuche):
+        bild_id, bild = self._bild_zum_konzept(thema_id, konzept)
+        werte = {'konzept': konzept, 'beschreibung': bild['beschreibung'] if bild else ''}
+        antwort = {
+            'hilfe_stufe': 3,
+            'zeige_bild': False,
+            'bild_thema': None,
+            'konzept_verstanden': False,
+            'gebe_quellen': False,
+            'frustration_erkannt': absicht != 'bild_wunsch',
+            'schnellpfad': absicht
+        }
+
+        if absicht == 'bild_wunsch':
+            if bild is None:
+                return None
+            antwort.update(nachricht=_auswahl(text, versuche, BILD_WUNSCH).format(**werte),
+                           zeige_bild=True, bild_thema=bild_id)
+            return antwort
+
+        stufe = max(1, versuchs_stufe(versuche))
+        if stufe == 2:
+            # Stichwort aus den Bild-Keywords, das nicht schon im Konzeptnamen steckt
+            konzept_klein = konzept.lower()
+            stichworte = [k for k in (bild['keywords'] if bild else ())
+                          if k.isalpha() and len(k) >= 4 and k not in konzept_klein]
+            if stichworte:
+                werte['stichwort'] = _auswahl(text, versuche, stichworte).capitalize()
+            else:
+                stufe = 1
+        if stufe == 3:
+            if bild is None:
+                stufe = 4
+            else:
+                antwort.update(zeige_bild=True, bild_thema=bild_id)
+        if stufe == 4:
+            # Anhaltender Frust: Quellen "für später" (siehe TUTOR_SYSTEM_PROMPT)
+            antwort['gebe_quellen'] = True
+
+        antwort['hilfe_stufe'] = stufe
+        antwort['nachricht'] = (_auswahl(text, versuche, EINLEITUNG[absicht]) + ' '
+                                + _auswahl(text, versuche, HILFE[stufe]).format(**werte))
+        return antwort
+
+    def metriken(self):
+        s = dict(self.statistik)
+        s['quote'] = s['beantwortet'] / s['anfragen'] if s['anfragen'] else 0.0
+        s['pro_absicht'] = dict(self.pro_absicht)
+        return s
+
+
+def erstelle_schnellpfad():
+    """SCHNELLPFAD=0 schaltet ab, SCHNELLPFAD_SCHWELLE setzt die Mindest-Konfidenz des Modells."""
+    if os.environ.get('SCHNELLPFAD', '1') == '0':
+        return None
+    return Schnellpfad(
+        modell_laden(os.environ.get('SCHNELLPFAD_BEISPIELE', BEISPIEL_DATEI)),
+        schwelle=float(os.environ.get('SCHNELLPFAD_SCHWELLE', 0.8))
+    )
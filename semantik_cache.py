@@ -0,0 +1,179 @@
+# semantik_cache.py
+# Semantischer Antwort-Cache für wiederkehrende Schülerfragen
+
+"""
+Schüler einer Klasse stellen zum selben Konzept oft fast dieselbe Frage
+("Was ist ein Nukleotid?", "ich weiß es nicht"). Dieser Cache erkennt
+solche Fragen lokal und ohne GPU: Die normalisierte Schülernachricht wird
+als TF-IDF-Vektor über Zeichen-n-Gramme dargestellt und per Kosinus-
+Ähnlichkeit mit den gespeicherten Fragen derselben Partition verglichen.
+
+Partition = (Thema, Konzept, Versuchs-Stufe), damit die gestufte Hilfe
+erhalten bleibt. Nur kurze Nachrichten und nur Antworten ohne
+Zustandswechsel (konzept_verstanden) werden gespeichert - ob ein Konzept
+verstanden ist, entscheidet immer das Modell. Sehr kurze Antworten wie
+"ja", "ok" oder "nein" beziehen sich auf die vorige Tutor-Frage und
+laufen nie über den Cache. Namen in Antworten ersetzt der Aufrufer vor
+dem Ablegen durch einen Platzhalter (siehe app.py).
+"""
+
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+
+N_GRAMM = 3
+
+
+def normalisieren(text):
+    """Kleinschreibung, Umlaute/Akzente auflösen, Satzzeichen weg, Leerraum zusammenfassen."""
+    text = text.lower().replace('ß', 'ss')
+    text = text.replace('ä', 'ae').replace('ö', 'oe').replace('ü', 'ue')
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(z for z in text if not unicodedata.combining(z))
+    text = re.sub(r'[^a-z0-9 ]+', ' ', text)
+    return ' '.join(text.split())
+
+
+def n_gramme(text):
+    """Zeichen-n-Gramme mit Wortgrenzen, z.B. ' wa', 'was', 'as '."""
+    gepolstert = f' {text} '
+    return Counter(gepolstert[i:i + N_GRAMM] for i in range(len(gepolstert) - N_GRAMM + 1))
+
+
+def versuchs_stufe(versuche):
+    """Fasst die Versuchsanzahl zu Stufen zusammen, passend zur gestuften Hilfe."""
+    return min(versuche, 4)
+
+
+class _Eintrag:
+    __slots__ = ('partition', 'text', 'grams', 'antwort', 'erstellt', 'dauer_ms')
+
+    def __init__(self, partition, text, grams, antwort, dauer_ms):
+        self.partition = partition
+        self.text = text
+        self.grams = grams
+        self.antwort = antwort
+        self.erstellt = time.time()
+        self.dauer_ms = dauer_ms
+
+
+class SemantikCache:
+    """LRU-Cache mit TTL pro Eintrag und TF-IDF-Ähnlichkeitssuche pro Partition."""
+
+    def __init__(self, schwelle=0.85, max_eintraege=5000, ttl=24 * 3600, max_laenge=120,
+                 gesperrte_konzepte=(), min_woerter=3, kontextabhaengig=None):
+        """
+        Args:
+            min_woerter: kürzere Nachrichten ergeben nur mit der vorigen Tutor-Frage Sinn
+            kontextabhaengig: funktion(text) -> bool für weitere solche Nachrichten
+                (z.B. vorauslader.ist_zustimmung für "ok, weiter")
+        """
+        self.schwelle = schwelle
+        self.max_eintraege = max_eintraege
+        self.ttl = ttl
+        self.max_laenge = max_laenge
+        self.gesperrte_konzepte = set(gesperrte_konzepte)
+        self.min_woerter = min_woerter
+        self.kontextabhaengig = kontextabhaengig
+        self._eintraege = OrderedDict()      # (partition, text) -> _Eintrag
+        self._partitionen = {}               # partition -> set(schluessel)
+        self._dokument_frequenz = Counter()  # n-Gramm -> Anzahl Einträge, die es enthalten
+        self._lock = threading.Lock()
+        self.treffer = 0
+        self.fehlschlaege = 0
+        self.gesparte_ms = 0.0
+
+    def aktiv_fuer(self, konzept, text):
+        if konzept in self.gesperrte_konzepte or len(text) > self.max_laenge:
+            return False
+        if len(normalisieren(text).split()) < self.min_woerter:
+            return False
+        return not (self.kontextabhaengig and self.kontextabhaengig(text))
+
+    def _gewichte(self, grams):
+        """TF-IDF-Vektor (sublineares tf) als dict plus Norm."""
+        anzahl = len(self._eintraege) + 1
+        vektor = {}
+        for gramm, tf in grams.items():
+            idf = math.log((1 + anzahl) / (1 + self._dokument_frequenz.get(gramm, 0))) + 1
+            vektor[gramm] = (1 + math.log(tf)) * idf
+        norm = math.sqrt(sum(w * w for w in vektor.values())) or 1.0
+        return vektor, norm
+
+    def _entfernen(self, schluessel):
+        eintrag = self._eintraege.pop(schluessel)
+        self._partitionen[eintrag.partition].discard(schluessel)
+        if not self._partitionen[eintrag.partition]:
+            del self._partitionen[eintrag.partition]
+        for gramm in eintrag.grams:
+            self._dokument_frequenz[gramm] -= 1
+            if self._dokument_frequenz[gramm] <= 0:
+                del self._dokument_frequenz[gramm]
+
+    def suche(self, partition, text):
+        """
+        Sucht eine gespeicherte Antwort auf eine ähnliche Frage.
+
+        Returns:
+            dict oder None: Kopie der Tutor-Antwort
+        """
+        normal = normalisieren(text)
+        if not normal:
+            return None
+        grams = n_gramme(normal)
+        grenze = time.time() - self.ttl
+        with self._lock:
+            vektor, norm = self._gewichte(grams)
+            bester, beste_aehnlichkeit = None, 0.0
+            for schluessel in list(self._partitionen.get(partition, ())):
+                eintrag = self._eintraege[schluessel]
+                if eintrag.erstellt < grenze:
+                    self._entfernen(schluessel)
+                    continue
+                if eintrag.text == normal:
+                    bester, beste_aehnlichkeit = eintrag, 1.0
+                    break
+                anderer, andere_norm = self._gewichte(eintrag.grams)
+                skalar = sum(w * anderer.get(g, 0.0) for g, w in vektor.items())
+                aehnlichkeit = skalar / (norm * andere_norm)
+                if aehnlichkeit > beste_aehnlichkeit:
+                    bester, beste_aehnlichkeit = eintrag, aehnlichkeit
+
+            if bester is None or beste_aehnlichkeit < self.schwelle:
+                self.fehlschlaege += 1
+                return None
+            self.treffer += 1
+            self.gesparte_ms += bester.dauer_ms
+            self._eintraege.move_to_end((bester.partition, bester.text))
+            return dict(bester.antwort)
+
+    def ablegen(self, partition, text, antwort, dauer_ms=0.0):
+        """Speichert eine Tutor-Antwort, sofern sie keinen Zustandswechsel auslöst."""
+        if antwort.get('konzept_verstanden') or antwort.get('fallback'):
+            return
+        normal = normalisieren(text)
+        if not normal:
+            return
+        schluessel = (partition, normal)
+        grams = n_gramme(normal)
+        with self._lock:
+            if schluessel in self._eintraege:
+                self._entfernen(schluessel)
+            self._eintraege[schluessel] = _Eintrag(partition, normal, grams, dict(antwort), dauer_ms)
+            self._partitionen.setdefault(partition, set()).add(schluessel)
+            self._dokument_frequenz.update(grams.keys())
+            while len(self._eintraege) > self.max_eintraege:
+                self._entfernen(next(iter(self._eintraege)))
+
+    def metriken(self):
+        anfragen = self.treffer + self.fehlschlaege
+        return {
+            'eintraege': len(self._eintraege),
+            'treffer': self.treffer,
+            'fehlschlaege': self.fehlschlaege,
+            'trefferquote': self.treffer / anfragen if anfragen else 0.0,
+            'gesparte_ms': self.gesparte_ms
+        }
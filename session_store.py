@@ -0,0 +1,376 @@
+# session_store.py
+# Serverseitige Session-Speicher für das adaptive DNA-Lernsystem
+
+"""
+Statt den kompletten Gesprächsverlauf im signierten Flask-Cookie zu halten,
+liegt der Session-Zustand auf dem Server. Im Cookie steht nur noch eine
+signierte, zufällige Session-ID.
+
+Zwei Backends:
+- MemoryStore: begrenzter In-Process-Speicher (LRU + TTL), gut für einen Worker
+- SQLiteStore: Datei auf der Platte, von mehreren gunicorn-Workern nutzbar
+
+Der Verlauf wird pro Zug angehängt (O(1)), nicht jedes Mal komplett neu geschrieben.
+
+Mit sperre(sid) laufen Anfragen derselben Session nacheinander statt
+gleichzeitig (Doppelklick auf "Senden"); beim SQLiteStore gilt die Sperre
+über eine Zeile mit Ablaufzeit auch zwischen den Worker-Prozessen.
+"""
+
+import contextlib
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+import metriken
+
+
+class SitzungBelegt(RuntimeError):
+    """Die Session ist länger als erlaubt von einer anderen Anfrage belegt."""
+
+
+class _Sperren:
+    """Ein Lock pro Session-ID, nur solange jemand ihn hält oder darauf wartet."""
+
+    def __init__(self):
+        self._locks = {}  # sid -> [Lock, Anzahl Interessenten]
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def halten(self, sid, timeout):
+        with self._lock:
+            eintrag = self._locks.get(sid)
+            if eintrag is None:
+                eintrag = self._locks[sid] = [threading.Lock(), 0]
+            eintrag[1] += 1
+        try:
+            if not eintrag[0].acquire(timeout=timeout):
+                raise SitzungBelegt(sid)
+            try:
+                yield
+            finally:
+                eintrag[0].release()
+        finally:
+            with self._lock:
+                eintrag[1] -= 1
+                if eintrag[1] == 0:
+                    del self._locks[sid]
+
+
+class MemoryStore:
+    """Begrenzter In-Process-Speicher mit LRU-Verdrängung und TTL."""
+
+    def __init__(self, max_sessions=10000, ttl=4 * 3600):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._daten = OrderedDict()  # sid -> [zuletzt_benutzt, daten, verlauf]
+        self._lock = threading.Lock()
+        self._sperren = _Sperren()
+
+    def _eintrag(self, sid):
+        eintrag = self._daten.get(sid)
+        if eintrag is None:
+            return None
+        if time.time() - eintrag[0] > self.ttl:
+            del self._daten[sid]
+            return None
+        eintrag[0] = time.time()
+        self._daten.move_to_end(sid)
+        return eintrag
+
+    def _neuer_eintrag(self, sid):
+        eintrag = self._eintrag(sid)
+        if eintrag is None:
+            eintrag = [time.time(), {}, []]
+            self._daten[sid] = eintrag
+            while len(self._daten) > self.max_sessions:
+                self._daten.popitem(last=False)
+        return eintrag
+
+    def lade(self, sid):
+        with self._lock:
+            eintrag = self._eintrag(sid)
+            return dict(eintrag[1]) if eintrag else None
+
+    def speichere(self, sid, daten):
+        with self._lock:
+            self._neuer_eintrag(sid)[1] = dict(daten)
+
+    def loesche(self, sid):
+        with self._lock:
+            self._daten.pop(sid, None)
+
+    def verlauf(self, sid):
+        with self._lock:
+            eintrag = self._eintrag(sid)
+            return list(eintrag[2]) if eintrag else []
+
+    def verlauf_anhaengen(self, sid, nachricht):
+        with self._lock:
+            self._neuer_eintrag(sid)[2].append(nachricht)
+
+    def verlauf_setzen(self, sid, nachrichten):
+        with self._lock:
+            self._neuer_eintrag(sid)[2] = list(nachrichten)
+
+    def sperre(self, sid, timeout=60.0):
+        """
+        Kontextmanager: exklusiver Zugriff auf eine Session.
+
+        Raises:
+            SitzungBelegt: wenn die Sperre nicht innerhalb von timeout Sekunden frei wird
+        """
+        return self._sperren.halten(sid, timeout)
+
+    def aufraeumen(self):
+        """Entfernt abgelaufene Sessions, gibt die Anzahl zurück."""
+        grenze = time.time() - self.ttl
+        with self._lock:
+            abgelaufen = [sid for sid, e in self._daten.items() if e[0] < grenze]
+            for sid in abgelaufen:
+                del self._daten[sid]
+        return len(abgelaufen)
+
+    def bereit(self):
+        return True
+
+
+class SQLiteStore:
+    """SQLite-Speicher (WAL-Modus), den mehrere Worker-Prozesse teilen können."""
+
+    # Eine Sperre verfällt spätestens nach so vielen Sekunden, falls ihr
+    # Worker abstürzt (länger als gunicorns timeout)
+    sperre_dauer = 150
+
+    def __init__(self, pfad, ttl=4 * 3600):
+        self.pfad = pfad
+        self.ttl = ttl
+        self._lokal = threading.local()
+        self._sperren = _Sperren()
+        # SQLite-Verbindungen dürfen einen fork nicht überleben (z.B. gunicorn --preload)
+        os.register_at_fork(after_in_child=self._zuruecksetzen)
+        db = self._db()
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                sid TEXT PRIMARY KEY,
+                daten TEXT NOT NULL,
+                zuletzt REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS verlauf (
+                sid TEXT NOT NULL,
+                nr INTEGER NOT NULL,
+                rolle TEXT NOT NULL,
+                inhalt TEXT NOT NULL,
+                PRIMARY KEY (sid, nr)
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_zuletzt ON sessions (zuletzt);
+            CREATE TABLE IF NOT EXISTS sperren (
+                sid TEXT PRIMARY KEY,
+                token TEXT NOT NULL,
+                bis REAL NOT NULL
+            );
+        """)
+
+    def _zuruecksetzen(self):
+        self._lokal = threading.local()
+        self._sperren = _Sperren()
+
+    def _db(self):
+        # Eine Verbindung pro Thread, sqlite3-Verbindungen sind nicht threadsicher
+        db = getattr(self._lokal, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.pfad, timeout=10, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._lokal.db = db
+        return db
+
+    def lade(self, sid):
+        zeile = self._db().execute(
+            'SELECT daten, zuletzt FROM sessions WHERE sid = ?', (sid,)
+        ).fetchone()
+        if zeile is None:
+            return None
+        if time.time() - zeile[1] > self.ttl:
+            self.loesche(sid)
+            return None
+        return json.loads(zeile[0])
+
+    def speichere(self, sid, daten):
+        self._db().execute(
+            'INSERT INTO sessions (sid, daten, zuletzt) VALUES (?, ?, ?) '
+            'ON CONFLICT(sid) DO UPDATE SET daten = excluded.daten, zuletzt = excluded.zuletzt',
+            (sid, json.dumps(daten, ensure_ascii=False), time.time())
+        )
+
+    def loesche(self, sid):
+        db = self._db()
+        db.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+        db.execute('DELETE FROM verlauf WHERE sid = ?', (sid,))
+
+    def verlauf(self, sid):
+        zeilen = self._db().execute(
+            'SELECT rolle, inhalt FROM verlauf WHERE sid = ? ORDER BY nr', (sid,)
+        ).fetchall()
+        return [{"role": rolle, "content": inhalt} for rolle, inhalt in zeilen]
+
+    def verlauf_anhaengen(self, sid, nachricht):
+        self._db().execute(
+            'INSERT INTO verlauf (sid, nr, rolle, inhalt) '
+            'SELECT ?, COALESCE(MAX(nr), -1) + 1, ?, ? FROM verlauf WHERE sid = ?',
+            (sid, nachricht['role'], nachricht['content'], sid)
+        )
+
+    def verlauf_setzen(self, sid, nachrichten):
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('DELETE FROM verlauf WHERE sid = ?', (sid,))
+            db.executemany(
+                'INSERT INTO verlauf (sid, nr, rolle, inhalt) VALUES (?, ?, ?, ?)',
+                [(sid, nr, n['role'], n['content']) for nr, n in enumerate(nachrichten)]
+            )
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+
+    @contextlib.contextmanager
+    def sperre(self, sid, timeout=60.0):
+        """
+        Kontextmanager: exklusiver Zugriff auf eine Session, auch über Worker-Prozesse hinweg.
+
+        Innerhalb des Prozesses wartet ein Lock, zwischen Prozessen eine Zeile
+        in "sperren", die nur übernommen werden kann, wenn sie abgelaufen ist.
+
+        Raises:
+            SitzungBelegt: wenn die Sperre nicht innerhalb von timeout Sekunden frei wird
+        """
+        ende = time.monotonic() + timeout
+        with self._sperren.halten(sid, timeout):
+            db = self._db()
+            token = secrets.token_hex(8)
+            while True:
+                jetzt = time.time()
+                uebernommen = db.execute(
+                    'INSERT INTO sperren (sid, token, bis) VALUES (?, ?, ?) '
+                    'ON CONFLICT(sid) DO UPDATE SET token = excluded.token, bis = excluded.bis '
+                    'WHERE sperren.bis < ?',
+                    (sid, token, jetzt + self.sperre_dauer, jetzt)
+                ).rowcount
+                if uebernommen:
+                    break
+                if time.monotonic() >= ende:
+                    raise SitzungBelegt(sid)
+                time.sleep(0.02)
+            try:
+                yield
+            finally:
+                db.execute('DELETE FROM sperren WHERE sid = ? AND token = ?', (sid, token))
+
+    def bereit(self):
+        """Prüft, ob die Datenbank erreichbar ist."""
+        self._db().execute('SELECT 1').fetchone()
+        return True
+
+    def aufraeumen(self):
+        """Entfernt abgelaufene Sessions, gibt die Anzahl zurück."""
+        db = self._db()
+        grenze = time.time() - self.ttl
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(
+                'DELETE FROM verlauf WHERE sid IN (SELECT sid FROM sessions WHERE zuletzt < ?)',
+                (grenze,)
+            )
+            anzahl = db.execute('DELETE FROM sessions WHERE zuletzt < ?', (grenze,)).rowcount
+            db.execute('DELETE FROM sperren WHERE bis < ?', (time.time(),))
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        return anzahl
+
+
+def erstelle_store():
+    """Wählt das Backend über Umgebungsvariablen (SESSION_BACKEND, SESSION_DB, ...)."""
+    backend = os.environ.get('SESSION_BACKEND', 'memory')
+    ttl = int(os.environ.get('SESSION_TTL', 4 * 3600))
+    if backend == 'sqlite':
+        return SQLiteStore(os.environ.get('SESSION_DB', 'sessions.db'), ttl=ttl)
+    return MemoryStore(max_sessions=int(os.environ.get('SESSION_MAX', 10000)), ttl=ttl)
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session-Dict, dessen Inhalt im Store liegt; das Cookie trägt nur die ID."""
+
+    def __init__(self, daten=None, sid=None, neu=False):
+        def bei_aenderung(self):
+            self.modified = True
+        super().__init__(daten, bei_aenderung)
+        self.sid = sid
+        self.new = neu
+        self.modified = False
+
+
+class ServerSessionInterface(SessionInterface):
+    """Flask-SessionInterface, das Sessions in einem MemoryStore/SQLiteStore ablegt."""
+
+    # Alle N Speichervorgänge werden abgelaufene Sessions entfernt
+    aufraeumen_alle = 500
+
+    def __init__(self, store):
+        self.store = store
+        self._speicherungen = 0
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-session')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                with metriken.phase('session_laden'):
+                    daten = self.store.lade(sid)
+                if daten is not None:
+                    return ServerSession(daten, sid=sid)
+        return ServerSession(sid=secrets.token_urlsafe(32), neu=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if session.modified:
+                self.store.loesche(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if session.modified or self.should_set_cookie(app, session):
+            with metriken.phase('session_speichern'):
+                self.store.speichere(session.sid, dict(session))
+            self._speicherungen += 1
+            if self._speicherungen % self.aufraeumen_alle == 0:
+                self.store.aufraeumen()
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid).decode(),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
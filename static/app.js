@@ -0,0 +1,412 @@
+// static/app.js - Quelle; ausgeliefert wird die minifizierte Fassung aus static/build/
+
+// Startthema steht im data-Attribut, die Seite wird vorab gerendert
+let aktuellesThema = document.body.dataset.startThema;
+
+async function startLernen() {
+    const name = document.getElementById('nameInput').value.trim();
+    const klasse = document.getElementById('klasseInput').value.trim();
+    
+    if (!name) {
+        alert('Bitte gib deinen Namen ein! 😊');
+        return;
+    }
+
+    showLoading();
+
+    try {
+        const response = await fetch('/start', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ name: name, klasse: klasse })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            document.getElementById('schülerName').textContent = name;
+            document.getElementById('themaAnzeige').textContent = data.thema;
+            document.getElementById('konzeptText').textContent = data.konzept;
+            document.getElementById('punkteAnzeige').textContent = data.punkte + ' Punkte';
+
+            // Gespeicherter Fortschritt kann in einem anderen Thema weitergehen
+            aktuellesThema = data.thema_id;
+            document.querySelectorAll('.thema-btn').forEach(btn => {
+                btn.classList.toggle('aktiv', btn.dataset.thema === data.thema_id);
+            });
+
+            // Erste Tutor-Nachricht anzeigen
+            addMessage('tutor', data.nachricht, data.bild);
+            bilderVorladen(data.vorab_bilder);
+
+            // UI umschalten
+            document.getElementById('welcomeScreen').classList.add('hidden');
+            document.getElementById('statusBar').classList.remove('hidden');
+            document.getElementById('chatInterface').classList.remove('hidden');
+            hideLoading();
+            
+            document.getElementById('chatInput').focus();
+            kanalOeffnen();
+        }
+    } catch (error) {
+        console.error('Fehler:', error);
+        alert('Es gab einen Fehler. Bitte versuche es nochmal.');
+        hideLoading();
+    }
+}
+
+// Eine ID pro Nachricht: kommt dieselbe Nachricht doppelt beim Server an
+// (Doppelklick, erneutes Senden), beantwortet er sie nur einmal
+function nachrichtIdErzeugen() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + Math.random().toString(36).slice(2);
+}
+
+async function nachrichtSenden() {
+    const nachricht = document.getElementById('chatInput').value.trim();
+    
+    // Solange die vorige Antwort läuft, nicht noch einmal senden (Enter-Taste)
+    if (!nachricht || document.getElementById('sendBtn').disabled) {
+        return;
+    }
+
+    // Schüler-Nachricht anzeigen
+    addMessage('user', nachricht);
+    document.getElementById('chatInput').value = '';
+    document.getElementById('sendBtn').disabled = true;
+
+    showLoading();
+
+    const nachrichtId = nachrichtIdErzeugen();
+    let tutorDiv = null;
+    let text = '';
+    let data = null;
+
+    const beiEreignis = (name, payload) => {
+        if (name === 'token') {
+            if (!tutorDiv) {
+                hideLoading();
+                tutorDiv = addMessage('tutor', '');
+            }
+            text += payload.text;
+            tutorDiv.querySelector('.message-bubble').innerHTML = text.replace(/\n/g, '<br>');
+            scrollToBottom();
+        } else if (name === 'fertig') {
+            data = payload;
+        } else if (name === 'fehler') {
+            throw new Error(payload.error);
+        }
+    };
+
+    try {
+        let getrennt = false;
+        if (kanal.ws && kanal.ws.readyState === WebSocket.OPEN) {
+            getrennt = !(await kanalZug(nachricht, nachrichtId, beiEreignis));
+            if (getrennt) {
+                // Halb gestreamte Antwort verwerfen, der Server liefert sie gleich komplett
+                if (tutorDiv) tutorDiv.remove();
+                tutorDiv = null;
+                text = '';
+            }
+        }
+        if (!data) {
+            kanalOeffnen();
+            // Antwort per Server-Sent Events streamen, Token für Token; nach
+            // abgerissenem Kanal mit derselben ID, die Antwort kommt dann aus dem Speicher
+            const response = await fetch('/chat/stream', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ nachricht: nachricht, nachricht_id: nachrichtId })
+            });
+            await leseEreignisse(response, beiEreignis);
+        }
+
+        if (data && data.success) {
+            // Vollständige Antwort (inkl. Quellen, Bild) übernehmen
+            if (tutorDiv) tutorDiv.remove();
+            addMessage('tutor', data.nachricht, data.bild);
+            bilderVorladen(data.vorab_bilder);
+
+            // Update Punkte
+            document.getElementById('punkteAnzeige').textContent = data.punkte + ' Punkte';
+
+            // Update Konzept falls geändert
+            if (data.neues_konzept) {
+                document.getElementById('konzeptText').textContent = data.neues_konzept;
+            }
+
+            hideLoading();
+            document.getElementById('sendBtn').disabled = false;
+            document.getElementById('chatInput').focus();
+        }
+    } catch (error) {
+        console.error('Fehler:', error);
+        alert('Es gab einen Fehler. Bitte versuche es nochmal.');
+        hideLoading();
+        document.getElementById('sendBtn').disabled = false;
+    }
+}
+
+// WebSocket-Kanal (falls der Server ihn anbietet): eine Verbindung für alle
+// Chat-Züge statt einer Anfrage pro Nachricht; ohne Kanal /chat/stream
+const kanal = {
+    ws: null,
+    beiEreignis: null,
+    wartezeit: 1000,
+    aufgegeben: false
+};
+
+function kanalOeffnen() {
+    if (document.body.dataset.websocket !== '1' || !window.WebSocket || kanal.aufgegeben || kanal.ws) {
+        return;
+    }
+    const ws = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/kanal');
+    kanal.ws = ws;
+    ws.onopen = () => {
+        kanal.wartezeit = 1000;
+    };
+    ws.onmessage = (event) => {
+        const ereignis = JSON.parse(event.data);
+        if (ereignis.typ === 'ersetzt') {
+            // In einem anderen Tab geöffnet: dieser Tab nutzt wieder /chat/stream
+            kanal.aufgegeben = true;
+        } else if (kanal.beiEreignis) {
+            kanal.beiEreignis(ereignis.typ, ereignis.daten);
+        }
+    };
+    ws.onclose = (event) => {
+        kanal.ws = null;
+        if (kanal.beiEreignis) {
+            kanal.beiEreignis('getrennt', null);
+        }
+        // Nach Leerlauf erst beim nächsten Senden, sonst mit wachsendem Abstand neu verbinden
+        if (event.code !== 1001 && !kanal.aufgegeben) {
+            setTimeout(kanalOeffnen, kanal.wartezeit);
+            kanal.wartezeit = Math.min(kanal.wartezeit * 2, 30000);
+        }
+    };
+}
+
+function kanalZug(nachricht, nachrichtId, beiEreignis) {
+    // Erfüllt mit true nach "fertig", mit false, wenn der Kanal vorher abreißt
+    return new Promise((resolve, reject) => {
+        kanal.beiEreignis = (name, payload) => {
+            if (name === 'getrennt') {
+                kanal.beiEreignis = null;
+                resolve(false);
+                return;
+            }
+            try {
+                beiEreignis(name, payload);
+            } catch (error) {
+                kanal.beiEreignis = null;
+                reject(error);
+                return;
+            }
+            if (name === 'fertig') {
+                kanal.beiEreignis = null;
+                resolve(true);
+            }
+        };
+        kanal.ws.send(JSON.stringify({ typ: 'nachricht', nachricht: nachricht, nachricht_id: nachrichtId }));
+    });
+}
+
+async function leseEreignisse(response, beiEreignis) {
+    // Minimaler SSE-Parser für fetch-Antworten (EventSource kann kein POST)
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let puffer = '';
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        puffer += decoder.decode(value, { stream: true });
+
+        let ende;
+        while ((ende = puffer.indexOf('\n\n')) !== -1) {
+            const block = puffer.slice(0, ende);
+            puffer = puffer.slice(ende + 2);
+            let name = 'message';
+            let daten = '';
+            block.split('\n').forEach(zeile => {
+                if (zeile.startsWith('event: ')) name = zeile.slice(7);
+                else if (zeile.startsWith('data: ')) daten += zeile.slice(6);
+            });
+            beiEreignis(name, daten ? JSON.parse(daten) : null);
+        }
+    }
+}
+
+function addMessage(type, text, bild = null) {
+    const messagesDiv = document.getElementById('chatMessages');
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `message ${type}`;
+    
+    let content = `<div class="message-bubble">${text.replace(/\n/g, '<br>')}</div>`;
+    
+    // Bild hinzufügen falls vorhanden
+    if (bild && bild.url) {
+        content += `
+            <div class="bild-container">
+                ${bildHtml(bild)}
+                <div class="bild-beschreibung">
+                    📊 ${bild.beschreibung}
+                </div>
+            </div>
+        `;
+    }
+    
+    messageDiv.innerHTML = content;
+    messagesDiv.appendChild(messageDiv);
+    if (bild && bild.url) {
+        bildBeobachten(messageDiv.querySelector('.bild-container img'));
+    }
+    scrollToBottom();
+    return messageDiv;
+}
+
+function bildHtml(bild) {
+    // Optimierte Varianten (AVIF/WebP) per <picture>, PNG als Fallback;
+    // sizes wie BILD_GROESSEN in image_resources.py
+    const quellen = (bild.quellen || []).map(q =>
+        `<source type="${q.typ}" srcset="${q.srcset}" sizes="(max-width: 800px) 100vw, 760px">`
+    ).join('');
+    const masse = bild.breite ? `width="${bild.breite}" height="${bild.hoehe}"` : '';
+    return `<picture>${quellen}<img src="${bild.url}" alt="${bild.beschreibung}" ${masse} decoding="async"></picture>`;
+}
+
+// Vorab-Bilder: jede Antwort nennt die Bilder zum aktuellen und nächsten
+// Konzept, sie werden in Ruhezeiten geladen und liegen dann im Cache,
+// wenn der Tutor sie zeigt
+const vorab = {
+    angefragt: new Set(),
+    geladen: new Set()
+};
+
+function bilderVorladen(bilder) {
+    if (!bilder || !bilder.length) return;
+    const laden = () => bilder.forEach(bild => {
+        if (vorab.angefragt.has(bild.url)) return;
+        vorab.angefragt.add(bild.url);
+        // Nicht eingehängtes <picture> mit denselben Quellen: der Browser
+        // wählt dieselbe Variante, die er später im Chat anzeigt
+        const huelle = document.createElement('div');
+        huelle.innerHTML = bildHtml(bild);
+        const img = huelle.querySelector('img');
+        img.fetchPriority = 'low';
+        img.addEventListener('load', () => vorab.geladen.add(img.currentSrc), { once: true });
+    });
+    (window.requestIdleCallback || (f => setTimeout(f, 200)))(laden);
+}
+
+function bildBeobachten(img) {
+    // Trefferquote: lag das angezeigte Bild schon vorab im Cache? (Metrik bild_vorab)
+    const melden = () => {
+        if (!navigator.sendBeacon) return;
+        const daten = JSON.stringify({ vorab: vorab.geladen.has(img.currentSrc) });
+        navigator.sendBeacon('/bild_angezeigt', new Blob([daten], { type: 'application/json' }));
+    };
+    if (img.complete && img.currentSrc) {
+        melden();
+    } else {
+        img.addEventListener('load', melden, { once: true });
+    }
+}
+
+function scrollToBottom() {
+    const messagesDiv = document.getElementById('chatMessages');
+    messagesDiv.scrollTop = messagesDiv.scrollHeight;
+}
+
+async function themaWechseln(themaId) {
+    if (aktuellesThema === themaId) return;
+
+    const confirmed = confirm('Möchtest du wirklich das Thema wechseln?');
+    
+    if (!confirmed) return;
+
+    showLoading();
+    aktuellesThema = themaId;
+
+    // Update UI - markiere aktives Thema
+    document.querySelectorAll('.thema-btn').forEach(btn => {
+        btn.classList.remove('aktiv');
+    });
+    event.target.classList.add('aktiv');
+
+    try {
+        const response = await fetch('/thema_wechseln', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ thema_id: themaId })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            document.getElementById('themaAnzeige').textContent = data.thema;
+            document.getElementById('konzeptText').textContent = data.konzept;
+            
+            // Clear Chat
+            document.getElementById('chatMessages').innerHTML = `
+                <div id="konzeptAnzeige" class="konzept-badge">
+                    📖 Konzept: <span id="konzeptText">${data.konzept}</span>
+                </div>
+            `;
+            
+            // Erste Nachricht
+            addMessage('tutor', data.nachricht, data.bild);
+            bilderVorladen(data.vorab_bilder);
+            
+            hideLoading();
+            document.getElementById('chatInput').focus();
+        }
+    } catch (error) {
+        console.error('Fehler:', error);
+        alert('Es gab einen Fehler beim Themenwechsel.');
+        hideLoading();
+    }
+}
+
+function showLoading() {
+    document.getElementById('loadingIndicator').classList.remove('hidden');
+}
+
+function hideLoading() {
+    document.getElementById('loadingIndicator').classList.add('hidden');
+}
+
+// Enter-Taste im Namen- und Klassen-Feld
+['nameInput', 'klasseInput'].forEach(id => {
+    document.getElementById(id)?.addEventListener('keypress', function(e) {
+        if (e.key === 'Enter') {
+            startLernen();
+        }
+    });
+});
+
+// Enter-Taste im Chat
+document.getElementById('chatInput')?.addEventListener('keypress', function(e) {
+    if (e.key === 'Enter') {
+        nachrichtSenden();
+    }
+});
+
+// Verhindere Zoom bei Doppeltipp auf iOS
+let lastTouchEnd = 0;
+document.addEventListener('touchend', function(event) {
+    const now = (new Date()).getTime();
+    if (now - lastTouchEnd <= 300) {
+        event.preventDefault();
+    }
+    lastTouchEnd = now;
+}, false);
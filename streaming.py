@@ -0,0 +1,16 @@
+# streaming.py
+# Hilfen für das Streamen der Tutor-Antwort per Server-Sent Events
+
+"""
+Das Modell antwortet im JSON-Format. Damit der Schüler die Nachricht schon
+während der Generierung sieht, liest der NachrichtExtraktor (antwort_parser.py)
+fortlaufend das Feld "nachricht" aus dem unvollständigen JSON-Text; hier wird
+daraus ein Server-Sent Event.
+"""
+
+import json
+
+
+def sse_ereignis(name, daten):
+    """Formatiert ein Server-Sent Event mit JSON-Nutzlast."""
+    return f"event: {name}\ndata: {json.dumps(daten, ensure_ascii=False)}\n\n"
@@ -0,0 +1,157 @@
+# vorauslader.py
+# Spekulatives Vorausladen der Eröffnungsfrage zum nächsten Konzept
+
+"""
+Hat der Schüler ein Konzept verstanden, antwortet er auf "Lass uns zum
+nächsten Thema gehen" meist nur mit "ok" oder "ja, weiter". Für genau
+diesen Zug kann die Tutor-Antwort (die Eröffnungsfrage zum neuen Konzept)
+schon im Hintergrund erzeugt werden, während der Schüler liest.
+
+- pro Session höchstens ein Auftrag; ein neuer Auftrag, ein Themenwechsel
+  oder eine inhaltliche Schüler-Nachricht verwirft den alten
+- ein Token-Budget pro Stunde und eine Obergrenze offener Aufträge
+  begrenzen, was spekulativ verbraucht wird
+- die Ergebnisse liegen im Speicher des Worker-Prozesses; landet der
+  nächste Zug bei einem anderen Worker, gibt es einfach einen Live-Aufruf
+- der Pool übernimmt mit nebenbei() auch andere Hintergrundarbeit nach
+  einem Zug (z.B. die Zusammenfassung des Verlaufs), ohne Auftrag und Budget
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from semantik_cache import normalisieren
+
+# Nachrichten aus nur diesen Wörtern gelten als "weiter" und passen zur vorab erzeugten Antwort
+ZUSTIMMUNG = frozenset("""
+    ok okay okey oki k jo ja jaa jap jep yes yep klar alles gut gern gerne weiter los
+    lass uns gehts geht es mach machen super cool top prima toll danke passt verstanden
+    naechstes naechste thema konzept bitte und dann
+""".split())
+
+
+def ist_zustimmung(text, max_woerter=5):
+    """True für kurze Bestätigungen wie "ok", "ja gerne", "alles klar, weiter" oder nur Emojis."""
+    if not text.strip():
+        return False
+    woerter = normalisieren(text).split()
+    return len(woerter) <= max_woerter and all(w in ZUSTIMMUNG for w in woerter)
+
+
+class _Auftrag:
+    __slots__ = ('schluessel', 'future', 'abgebrochen', 'erstellt')
+
+    def __init__(self, schluessel):
+        self.schluessel = schluessel
+        self.future = None
+        self.abgebrochen = threading.Event()
+        self.erstellt = time.monotonic()
+
+
+class Vorauslader:
+    """Hintergrund-Pool für vorab erzeugte Tutor-Antworten, eine pro Session."""
+
+    def __init__(self, max_parallel=4, max_offen=50, budget_tokens_pro_stunde=100000, ttl=900):
+        self.max_offen = max_offen
+        self.budget = budget_tokens_pro_stunde
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix='vorausladen')
+        self._auftraege = {}  # sid -> _Auftrag
+        self._lock = threading.Lock()
+        self._fenster_start = time.monotonic()
+        self._verbraucht = 0
+        self.statistik = {'gestartet': 0, 'genutzt': 0, 'verworfen': 0, 'uebersprungen': 0, 'tokens': 0}
+
+    def _budget_frei(self, tokens):
+        jetzt = time.monotonic()
+        if jetzt - self._fenster_start >= 3600:
+            self._fenster_start = jetzt
+            self._verbraucht = 0
+        return self._verbraucht + tokens <= self.budget
+
+    def _aufraeumen(self):
+        grenze = time.monotonic() - self.ttl
+        for sid in [s for s, a in self._auftraege.items() if a.erstellt < grenze]:
+            self._verwerfen(sid)
+
+    def _verwerfen(self, sid):
+        auftrag = self._auftraege.pop(sid, None)
+        if auftrag is not None:
+            auftrag.abgebrochen.set()
+            auftrag.future.cancel()
+            self.statistik['verworfen'] += 1
+
+    def starten(self, sid, schluessel, funktion, tokens):
+        """
+        Startet funktion(abgebrochen) im Hintergrund, sofern Budget und Plätze frei sind.
+
+        Args:
+            schluessel: Wofür die Antwort gilt, z.B. (thema_id, konzept)
+            funktion: Erzeugt die Antwort; abgebrochen (threading.Event) vor
+                teuren Schritten prüfen und dann None zurückgeben
+            tokens (int): Geschätzte Kosten (Prompt + max_tokens) fürs Budget
+
+        Returns:
+            bool: False, wenn der Auftrag wegen Budget/Obergrenze nicht gestartet wurde
+        """
+        with self._lock:
+            self._verwerfen(sid)
+            self._aufraeumen()
+            if len(self._auftraege) >= self.max_offen or not self._budget_frei(tokens):
+                self.statistik['uebersprungen'] += 1
+                return False
+            self._verbraucht += tokens
+            self.statistik['gestartet'] += 1
+            self.statistik['tokens'] += tokens
+            auftrag = _Auftrag(schluessel)
+            auftrag.future = self._pool.submit(funktion, auftrag.abgebrochen)
+            self._auftraege[sid] = auftrag
+        return True
+
+    def abholen(self, sid, schluessel, warten=0.0):
+        """
+        Holt die vorab erzeugte Antwort, wartet höchstens `warten` Sekunden.
+
+        Returns:
+            dict oder None: None, wenn nichts passt, nichts fertig ist oder die Erzeugung scheiterte
+        """
+        with self._lock:
+            auftrag = self._auftraege.pop(sid, None)
+        if auftrag is None:
+            return None
+        if auftrag.schluessel != schluessel:
+            auftrag.abgebrochen.set()
+            auftrag.future.cancel()
+            self.statistik['verworfen'] += 1
+            return None
+        try:
+            antwort = auftrag.future.result(timeout=warten)
+        except FutureTimeout:
+            # Nicht rechtzeitig fertig: der Live-Aufruf übernimmt, das Ergebnis wird verworfen
+            auftrag.abgebrochen.set()
+            auftrag.future.cancel()
+            self.statistik['verworfen'] += 1
+            return None
+        except Exception as e:
+            print(f"Fehler beim Vorausladen: {str(e)}")
+            return None
+        if antwort is None:
+            return None
+        self.statistik['genutzt'] += 1
+        return antwort
+
+    def nebenbei(self, funktion, *args):
+        """Führt funktion(*args) im Pool aus; Fehler muss funktion selbst behandeln."""
+        return self._pool.submit(funktion, *args)
+
+    def verwerfen(self, sid):
+        """Bricht den Auftrag einer Session ab (z.B. beim Themenwechsel)."""
+        with self._lock:
+            self._verwerfen(sid)
+
+    def metriken(self):
+        s = dict(self.statistik)
+        s['offen'] = len(self._auftraege)
+        s['trefferquote'] = s['genutzt'] / s['gestartet'] if s['gestartet'] else 0.0
+        return s